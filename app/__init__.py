@@ -5,6 +5,8 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager 
 from config import config
+from .cache import cache
+from .refdata import refdata
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -19,16 +21,23 @@ def load_user(id):
     # Use session.get() instead of deprecated query.get() for SQLAlchemy 2.0+
     return db.session.get(User, int(id))
 
-def create_app(config_name='default'):
+def create_app(config_name='default', config_overrides=None):
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_object(config[config_name])
+    app.config['CONFIG_NAME'] = config_name
     
     # Initialize app-specific configuration (logging, etc.)
     config[config_name].init_app(app)
     
+    # Values set by the caller (e.g. a worker process started with its parent's settings)
+    if config_overrides:
+        app.config.update(config_overrides)
+    
     db.init_app(app)
     migrate.init_app(app, db, directory=app.config.get('MIGRATION_DIR'))
     login.init_app(app)
+    cache.init_app(app)
+    refdata.init_app(app)
     
     # --- Ensure upload folder exists ---
     upload_folder = app.config.get('UPLOAD_FOLDER')
@@ -57,9 +66,18 @@ def create_app(config_name='default'):
     from .attendance import bp as attendance_bp
     app.register_blueprint(attendance_bp)
     
+    # --- CLI: startup warmup and import-time budget ---
+    from .startup import startup_cli
+    app.cli.add_command(startup_cli)
+    
+    # --- Jinja bytecode cache: compiled templates survive worker and process restarts ---
+    from .startup import LazyBytecodeCache
+    bytecode_dir = app.config.get('JINJA_BYTECODE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja-bytecode')
+    app.jinja_env.bytecode_cache = LazyBytecodeCache(bytecode_dir)
+    
     # --- Register Template Filters for Time Formatting ---
     from datetime import datetime
-    import pytz
+    from .timezone import DEFAULT_TIMEZONE, get_timezone, localize
     
     @app.template_filter('localtime')
     def localtime_filter(dt, format='%b %d, %Y at %I:%M:%S %p'):
@@ -67,20 +85,8 @@ def create_app(config_name='default'):
         if dt is None:
             return 'N/A'
         try:
-            # Get timezone from config (default to Asia/Manila)
-            tz_name = app.config.get('TIMEZONE', 'Asia/Manila')
-            if tz_name == 'UTC':
-                local_tz = pytz.UTC
-            else:
-                local_tz = pytz.timezone(tz_name)
-            
-            # If datetime is naive, assume it's UTC
-            if dt.tzinfo is None:
-                dt = pytz.UTC.localize(dt)
-            
-            # Convert to local timezone
-            local_dt = dt.astimezone(local_tz)
-            return local_dt.strftime(format)
+            # Naive datetimes are UTC; the configured timezone is resolved once per process
+            return localize(dt, get_timezone(app.config.get('TIMEZONE', DEFAULT_TIMEZONE))).strftime(format)
         except Exception as e:
             # Fallback to original format if timezone conversion fails
             return dt.strftime(format) if isinstance(dt, datetime) else str(dt)
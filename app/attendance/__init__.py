@@ -5,4 +5,4 @@ from flask import Blueprint
 bp = Blueprint('attendance', __name__, template_folder='templates', url_prefix='/attendance')
 
 # This line is CRITICAL for discovering routes
-from . import routes
\ No newline at end of file
+from . import routes, commands
\ No newline at end of file
@@ -0,0 +1,36 @@
+# app/attendance/commands.py
+
+import time as _time
+
+import click
+
+from app.attendance import bp
+from .daily_hours import METRIC_FIELDS, compare_with_python
+
+DATE = click.DateTime(formats=['%Y-%m-%d'])
+
+
+@bp.cli.command('hours-check')
+@click.option('--start', required=True, type=DATE, help='First work date (YYYY-MM-DD).')
+@click.option('--end', required=True, type=DATE, help='Last work date (YYYY-MM-DD).')
+@click.option('--limit', default=20, show_default=True, type=click.IntRange(min=0),
+              help='Differences to print.')
+def hours_check_command(start, end, limit):
+    """Compare the SQL daily hours with iter_shifts(), the payroll pairing, over a date range."""
+    started = _time.perf_counter()
+    differences = compare_with_python(start.date(), end.date())
+    if not differences:
+        click.echo(f'SQL daily hours match the calculator ({_time.perf_counter() - started:,.1f}s).')
+        return
+
+    click.echo(f'SQL daily hours differ from the calculator on {len(differences)} employee-day(s):')
+    for employee_id, work_date, sql, python in differences[:limit]:
+        click.echo(f'  employee #{employee_id} {work_date}:')
+        for name in METRIC_FIELDS:
+            have = sql.get(name) if sql else None
+            want = python.get(name) if python else None
+            if have != want:
+                click.echo(f'    {name}: sql {have}, calculator {want}')
+    if len(differences) > limit:
+        click.echo(f'  ... and {len(differences) - limit} more.')
+    raise click.ClickException('Daily hours differ.')
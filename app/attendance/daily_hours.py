@@ -0,0 +1,181 @@
+# app/attendance/daily_hours.py
+
+"""
+Daily worked hours computed in the database, for reports and dashboards.
+
+Punches are paired the way payroll pairs them (calculator.iter_shifts()): each OUT is
+paired with the employee's punch before it using the LAG() window function (SQLite >=
+3.25, PostgreSQL), whatever the calendar day, and the pair is dated by the IN's shift
+anchor date (its scheduled start nearest within 12 hours), so an overnight shift stays
+one shift. An OUT counts only right after an IN (the latest IN when there are several)
+and at most MAX_SHIFT_LENGTH after it; other OUTs are orphans. The database then sums
+the paired time and finds the first IN per employee and shift date, so only one row
+per employee-day leaves the database instead of every punch. Hours, overtime and
+lateness are derived from the daily totals with the same calculator.attendance_metrics().
+
+Other databases, and time zones whose UTC offset changes within the range, use
+iter_shifts() itself (daily_hours_python()), which is also the reference the
+hours-check command compares against.
+"""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from sqlalchemy import Date, Integer, Interval, Time, and_, case, cast, func, literal, select, type_coerce
+
+from app import db
+from app.models.user import AttendanceLog, EmployeeSchedule
+from app.payroll.calculator import (MAX_SHIFT_LENGTH, SHIFT_ANCHOR_WINDOW, attendance_metrics, iter_shifts,
+                                    local_punches, shift_log_window)
+from app.refdata import refdata
+from app.timezone import fixed_offset, local_tz
+
+WINDOW_FUNCTION_DIALECTS = ('sqlite', 'postgresql')
+DEFAULT_START_TIME = time(9, 0, 0)
+DEFAULT_SCHEDULED_HOURS = Decimal('8.00')
+METRIC_FIELDS = ('total_hours', 'regular_hours', 'overtime_hours', 'late_minutes', 'is_present')
+# SQLite reads a bare time of day as that time on 2000-01-01
+SQLITE_TIME_EPOCH = 946684800
+# Slack for the float error of julianday() when comparing a pair's length with MAX_SHIFT_LENGTH
+PAIR_LENGTH_TOLERANCE = 0.001
+
+
+def _seconds_between(later, earlier, dialect):
+    if dialect == 'postgresql':
+        return func.extract('epoch', later - earlier)
+    return (func.julianday(later) - func.julianday(earlier)) * 86400.0
+
+
+def _anchor_date(timestamp, start_time, offset, dialect):
+    """calculator.shift_anchor_date() of a UTC timestamp column, for a fixed local UTC offset."""
+    shift = int((offset + SHIFT_ANCHOR_WINDOW).total_seconds())
+    if dialect == 'postgresql':
+        return cast(timestamp + timedelta(seconds=shift) - cast(start_time, Interval), Date)
+    # Whole-second modifiers keep SQLite's date arithmetic exact at the anchor boundaries
+    start_seconds = cast(func.strftime('%s', start_time), Integer) - SQLITE_TIME_EPOCH
+    return func.date(timestamp, func.printf('%+d seconds', shift - start_seconds))
+
+
+def daily_totals_statement(start, end, dialect, offset, employee_ids=None):
+    """
+    SELECT employee_id, work_date, worked_seconds, first_in (UTC) per employee and shift
+    date in [start, end] with punches, ordered by employee and date. offset is the local
+    UTC offset, which must be the same over the range.
+    """
+    logs = AttendanceLog.__table__
+    schedules = EmployeeSchedule.__table__
+    window_start, window_end = shift_log_window(start, end)
+    ordering = {'partition_by': logs.c.employee_id, 'order_by': (logs.c.timestamp, logs.c.id)}
+    start_time = func.coalesce(schedules.c.start_time, literal(DEFAULT_START_TIME, Time))
+    anchor = _anchor_date(logs.c.timestamp, start_time, offset, dialect)
+    conditions = [logs.c.work_date.between(window_start, window_end), logs.c.event_type.in_(('IN', 'OUT'))]
+    if employee_ids is not None:
+        conditions.append(logs.c.employee_id.in_(employee_ids))
+
+    punches = select(
+        logs.c.employee_id, logs.c.event_type, logs.c.timestamp, anchor.label('anchor'),
+        func.lag(logs.c.event_type).over(**ordering).label('previous_event'),
+        func.lag(logs.c.timestamp).over(**ordering).label('previous_timestamp'),
+        func.lag(anchor).over(**ordering).label('previous_anchor'),
+    ).select_from(logs.outerjoin(schedules, schedules.c.employee_id == logs.c.employee_id))\
+        .where(*conditions).subquery()
+
+    # A pair belongs to the shift its IN started; every other punch to its own anchor date
+    length = _seconds_between(punches.c.timestamp, punches.c.previous_timestamp, dialect)
+    closes_pair = and_(punches.c.event_type == 'OUT', punches.c.previous_event == 'IN',
+                       length <= MAX_SHIFT_LENGTH.total_seconds() + PAIR_LENGTH_TOLERANCE)
+    dated = select(
+        punches.c.employee_id, punches.c.event_type, punches.c.timestamp,
+        case((closes_pair, punches.c.previous_anchor), else_=punches.c.anchor).label('work_date'),
+        case((closes_pair, length), else_=0).label('worked_seconds'),
+    ).subquery()
+
+    work_date = type_coerce(dated.c.work_date, Date)
+    return select(
+        dated.c.employee_id, work_date.label('work_date'),
+        func.sum(dated.c.worked_seconds).label('worked_seconds'),
+        func.min(case((dated.c.event_type == 'IN', dated.c.timestamp))).label('first_in'),
+    ).where(work_date.between(start, end))\
+        .group_by(dated.c.employee_id, dated.c.work_date)\
+        .order_by(dated.c.employee_id, dated.c.work_date)
+
+
+def daily_hours(start, end, employee_ids=None):
+    """
+    Yields (employee_id, work_date, metrics) for every employee-day with punches in
+    [start, end], metrics being the METRIC_FIELDS of iter_shifts().
+    """
+    dialect = db.session.get_bind().dialect.name
+    window_start, window_end = shift_log_window(start, end)
+    tz = local_tz()
+    offset = fixed_offset(datetime.combine(window_start, time.min) - timedelta(days=1),
+                          datetime.combine(window_end, time.max) + timedelta(days=1), tz)
+    if dialect not in WINDOW_FUNCTION_DIALECTS or offset is None:
+        yield from daily_hours_python(start, end, employee_ids)
+        return
+
+    reference = refdata.current()
+    rows = db.session.execute(daily_totals_statement(start, end, dialect, offset, employee_ids))
+    for employee_id, work_date, worked_seconds, first_in in rows:
+        schedule = reference.schedule(employee_id)
+        if first_in is not None:
+            first_in = first_in + offset
+        metrics = attendance_metrics(
+            # Microsecond rounding absorbs the float error of the database's date arithmetic
+            timedelta(seconds=round(float(worked_seconds or 0), 6)), first_in,
+            datetime.combine(work_date, schedule.start_time if schedule else DEFAULT_START_TIME),
+            schedule.work_hours_per_day if schedule else DEFAULT_SCHEDULED_HOURS
+        )
+        yield employee_id, work_date, metrics
+
+
+def daily_hours_python(start, end, employee_ids=None):
+    """daily_hours() from the raw punches, with iter_shifts() per employee as payroll pairs them."""
+    window_start, window_end = shift_log_window(start, end)
+    query = AttendanceLog.query.filter(AttendanceLog.work_date.between(window_start, window_end),
+                                       AttendanceLog.event_type.in_(('IN', 'OUT')))
+    if employee_ids is not None:
+        query = query.filter(AttendanceLog.employee_id.in_(employee_ids))
+    punches = defaultdict(list)
+    for log in query.order_by(AttendanceLog.employee_id, AttendanceLog.timestamp, AttendanceLog.id):
+        punches[log.employee_id].append(log)
+
+    tz = local_tz()
+    reference = refdata.current()
+    for employee_id, logs in sorted(punches.items()):
+        for work_date, metrics in iter_shifts(local_punches(logs, tz), reference.schedule(employee_id)):
+            if start <= work_date <= end:
+                yield employee_id, work_date, {name: metrics[name] for name in METRIC_FIELDS}
+
+
+def period_totals(start, end, employee_ids=None):
+    """
+    Per employee: days present and total, regular and overtime hours and late minutes
+    over [start, end] (punches only; leave and holiday credit are payroll concerns).
+    """
+    totals = {}
+    for employee_id, _, metrics in daily_hours(start, end, employee_ids):
+        entry = totals.get(employee_id)
+        if entry is None:
+            entry = totals[employee_id] = {
+                'days_present': 0, 'total_hours': Decimal('0.00'), 'regular_hours': Decimal('0.00'),
+                'overtime_hours': Decimal('0.00'), 'late_minutes': 0,
+            }
+        if metrics['is_present']:
+            entry['days_present'] += 1
+        entry['total_hours'] += metrics['total_hours']
+        entry['regular_hours'] += metrics['regular_hours']
+        entry['overtime_hours'] += metrics['overtime_hours']
+        entry['late_minutes'] += metrics['late_minutes']
+    return totals
+
+
+def compare_with_python(start, end, employee_ids=None):
+    """(employee_id, work_date, sql_metrics, python_metrics) for every employee-day where the two paths differ."""
+    sql = {(employee_id, work_date): metrics for employee_id, work_date, metrics in daily_hours(start, end, employee_ids)}
+    python = {(employee_id, work_date): metrics
+              for employee_id, work_date, metrics in daily_hours_python(start, end, employee_ids)}
+    return [(employee_id, work_date, sql.get((employee_id, work_date)), python.get((employee_id, work_date)))
+            for employee_id, work_date in sorted(sql.keys() | python.keys())
+            if sql.get((employee_id, work_date)) != python.get((employee_id, work_date))]
@@ -0,0 +1,235 @@
+# app/attendance/exceptions.py
+
+"""
+Attendance exceptions engine.
+
+Finds missing clock-outs, orphan clock-outs, duplicate punches, unscheduled
+absences and excessive lateness for the whole workforce over a date range.
+The logs are read once, in one query ordered by (employee_id, timestamp) and
+fetched in batches, and merged against the employee list (same order) in a
+single pass; schedules, approved leaves and holidays are loaded up front in
+one query each. Punches are dated like the payroll calculator dates shifts
+(calculator.shift_anchor_date), so both agree on which day a punch belongs to.
+"""
+
+import time as _time
+from collections import defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import select
+
+from app import db
+from app.models.user import AttendanceLog, Employee, EmployeeSchedule, LeaveRequest
+from app.payroll.calculator import MAX_SHIFT_LENGTH, SHIFT_ANCHOR_WINDOW, period_holiday_map, shift_log_window
+from app.timezone import fixed_offset, local_tz, to_local
+
+EXCEPTION_KINDS = (
+    ('missing_out', 'Missing clock-out'),
+    ('orphan_out', 'Clock-out without clock-in'),
+    ('duplicate_punch', 'Duplicate punch'),
+    ('absence', 'Unscheduled absence'),
+    ('excessive_late', 'Excessive lateness'),
+)
+
+# Default threshold (overridable from the report page)
+EXCESSIVE_LATE_MINUTES = 30
+MAX_LISTED = 500            # exceptions listed per kind
+LOG_BATCH_SIZE = 5000       # log rows fetched per round trip
+
+AttendanceException = namedtuple(
+    'AttendanceException', 'kind employee_id work_date timestamp detail'
+)
+
+
+def scan_punches(employee_id, punches, start_time, late_threshold, now):
+    """
+    Walks one employee's punches (local time, in order) once.
+    Returns (exceptions, punched_dates), punched_dates being every work date with a punch.
+    """
+    exceptions = []
+    punched = set()
+    late_checked = set()
+    open_in = open_date = None
+    last_out_date = None
+    # calculator.shift_anchor_date(), with the constant part worked out once
+    anchor_shift = SHIFT_ANCHOR_WINDOW - timedelta(hours=start_time.hour, minutes=start_time.minute,
+                                                   seconds=start_time.second)
+
+    for timestamp, event_type in punches:
+        if open_in and timestamp - open_in > MAX_SHIFT_LENGTH:
+            exceptions.append(AttendanceException('missing_out', employee_id, open_date, open_in,
+                                                  'No clock-out after this clock-in'))
+            open_in = None
+
+        work_date = (timestamp + anchor_shift).date()
+        if event_type == 'IN':
+            if open_in and work_date != open_date:
+                # A clock-in for another work date: the open one was never closed
+                exceptions.append(AttendanceException('missing_out', employee_id, open_date, open_in,
+                                                      'No clock-out after this clock-in'))
+                open_in = None
+            if open_in:
+                exceptions.append(AttendanceException('duplicate_punch', employee_id, open_date, timestamp,
+                                                      f'Clock-in while clocked in since {open_in:%H:%M}'))
+            else:
+                open_date = work_date
+                if work_date not in late_checked:
+                    late_checked.add(work_date)
+                    late = (timestamp - datetime.combine(work_date, start_time)).total_seconds() / 60
+                    if late > late_threshold:
+                        exceptions.append(AttendanceException('excessive_late', employee_id, work_date, timestamp,
+                                                              f'{int(late)} minutes late'))
+            open_in = timestamp
+            punched.add(open_date)
+            last_out_date = None
+        elif event_type == 'OUT':
+            if open_in:
+                last_out_date = open_date
+                open_in = None
+            elif last_out_date == work_date:
+                exceptions.append(AttendanceException('duplicate_punch', employee_id, work_date, timestamp,
+                                                      'Clock-out after the shift was already closed'))
+            else:
+                exceptions.append(AttendanceException('orphan_out', employee_id, work_date, timestamp,
+                                                      'Clock-out without a clock-in'))
+                punched.add(work_date)
+
+    # An IN still open now is a shift in progress, not a forgotten clock-out
+    if open_in and now - open_in > MAX_SHIFT_LENGTH:
+        exceptions.append(AttendanceException('missing_out', employee_id, open_date, open_in,
+                                              'No clock-out after this clock-in'))
+    return exceptions, punched
+
+
+def _leave_ranges(start, end):
+    ranges = defaultdict(list)
+    rows = db.session.query(LeaveRequest.employee_id, LeaveRequest.start_date, LeaveRequest.end_date).filter(
+        LeaveRequest.status == 'Approved',
+        LeaveRequest.start_date <= end,
+        LeaveRequest.end_date >= start
+    )
+    for employee_id, leave_start, leave_end in rows:
+        ranges[employee_id].append((leave_start, leave_end))
+    return ranges
+
+
+def _scheduled_days(start, end, today):
+    """Working days of the range (weekdays that are not holidays), up to today."""
+    holidays = period_holiday_map(start, end)
+    days = []
+    day = start
+    while day <= min(end, today):
+        if day.weekday() < 5 and day not in holidays:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def _local_time_converter(window_start, window_end, tz):
+    # Adding a constant offset is much cheaper than a tz conversion per punch
+    offset = fixed_offset(datetime.combine(window_start, time.min) - timedelta(days=1),
+                          datetime.combine(window_end, time.max) + timedelta(days=1), tz)
+    if offset is None:
+        return lambda timestamp: to_local(timestamp, tz)
+    return lambda timestamp: timestamp + offset
+
+
+def _log_groups(window_start, window_end, tz):
+    """
+    (employee_id, [(local timestamp, event_type), ...]) per employee, from one ordered Core
+    query fetched in batches (no ORM objects are built).
+    """
+    logs = AttendanceLog.__table__
+    statement = select(logs.c.employee_id, logs.c.timestamp, logs.c.event_type)\
+        .where(logs.c.work_date.between(window_start, window_end))\
+        .order_by(logs.c.employee_id, logs.c.timestamp, logs.c.id)\
+        .execution_options(yield_per=LOG_BATCH_SIZE)
+    local = _local_time_converter(window_start, window_end, tz)
+
+    current_id, punches = None, []
+    for employee_id, timestamp, event_type in db.session.execute(statement):
+        if employee_id != current_id:
+            if current_id is not None:
+                yield current_id, punches
+            current_id, punches = employee_id, []
+        punches.append((local(timestamp), event_type))
+    if current_id is not None:
+        yield current_id, punches
+
+
+def iter_exceptions(start, end, late_threshold=EXCESSIVE_LATE_MINUTES):
+    """
+    Yields (employee, exception) for every exception with a work date in [start, end],
+    employee by employee. employee is a row of id, employee_id_number, first_name,
+    last_name, status.
+    """
+    tz = local_tz()
+    now = to_local(datetime.utcnow(), tz)
+    scheduled_days = _scheduled_days(start, end, now.date())
+    leaves = _leave_ranges(start, end)
+
+    employees = db.session.query(
+        Employee.id, Employee.employee_id_number, Employee.first_name, Employee.last_name,
+        Employee.status, Employee.date_hired, EmployeeSchedule.start_time
+    ).outerjoin(EmployeeSchedule, EmployeeSchedule.employee_id == Employee.id)\
+        .order_by(Employee.id)\
+        .execution_options(yield_per=LOG_BATCH_SIZE)
+
+    # Both streams are in employee id order: merge them
+    groups = _log_groups(*shift_log_window(start, end), tz)
+    next_group = next(groups, None)
+    for employee in employees:
+        punches = []
+        while next_group is not None and next_group[0] <= employee.id:
+            if next_group[0] == employee.id:
+                punches = next_group[1]
+            next_group = next(groups, None)
+
+        start_time = employee.start_time or time(9, 0, 0)
+        found, punched = scan_punches(employee.id, punches, start_time, late_threshold, now)
+        for exception in found:
+            if start <= exception.work_date <= end:
+                yield employee, exception
+
+        if employee.status != 'Active':
+            continue
+        on_leave = leaves.get(employee.id, ())
+        for day in scheduled_days:
+            if day in punched or (employee.date_hired and day < employee.date_hired):
+                continue
+            if any(leave_start <= day <= leave_end for leave_start, leave_end in on_leave):
+                continue
+            yield employee, AttendanceException('absence', employee.id, day, None,
+                                                'No punches and no approved leave')
+
+
+def exception_report(start, end, late_threshold=EXCESSIVE_LATE_MINUTES, max_listed=MAX_LISTED):
+    """
+    Counts per kind and the first max_listed exceptions of each kind (in employee order).
+    Returns a dict; exceptions are {kind: {'count': n, 'rows': [...]}}.
+    """
+    started = _time.perf_counter()
+    report = {kind: {'count': 0, 'rows': []} for kind, _ in EXCEPTION_KINDS}
+    employees = set()
+    for employee, exception in iter_exceptions(start, end, late_threshold):
+        entry = report[exception.kind]
+        entry['count'] += 1
+        employees.add(employee.id)
+        if len(entry['rows']) < max_listed:
+            entry['rows'].append({
+                'employee_id': employee.id,
+                'employee_id_number': employee.employee_id_number,
+                'name': f'{employee.first_name} {employee.last_name}',
+                'work_date': exception.work_date,
+                'timestamp': exception.timestamp,
+                'detail': exception.detail,
+            })
+    return {
+        'start': start,
+        'end': end,
+        'late_threshold': late_threshold,
+        'employees_with_exceptions': len(employees),
+        'total': sum(entry['count'] for entry in report.values()),
+        'exceptions': report,
+        'elapsed_ms': round((_time.perf_counter() - started) * 1000, 1),
+    }
@@ -1,9 +1,12 @@
 # app/attendance/forms.py
 
 from flask_wtf import FlaskForm
-from wtforms import StringField, SubmitField, SelectField, TimeField, DateTimeField, HiddenField, DecimalField
-from wtforms.validators import DataRequired, Optional, NumberRange
+from wtforms import StringField, SubmitField, SelectField, TimeField, DateTimeField, HiddenField, DecimalField, IntegerField
+from wtforms.validators import DataRequired, Optional, NumberRange, ValidationError
+from wtforms.widgets import HiddenInput
 from datetime import datetime, time
+from app import db
+from app.models.user import Employee
 
 # --- Schedule Management Forms ---
 
@@ -23,7 +26,9 @@ class EmployeeScheduleForm(FlaskForm):
 
 class ManualAttendanceLogForm(FlaskForm):
     """Form for manually adding a clock event for an employee."""
-    employee_id = SelectField('Employee', coerce=int, validators=[DataRequired()])
+    # Picked via the /hr/employees/search typeahead; only the chosen id is posted and checked
+    employee_search = StringField('Employee', render_kw={'autocomplete': 'off', 'placeholder': 'Type a name or employee ID...'})
+    employee_id = IntegerField('Employee', widget=HiddenInput(), validators=[DataRequired(message='Please select an employee.')])
     # Keep timestamp field for backend, but we'll use separate date/time inputs in frontend
     timestamp = DateTimeField('Date and Time', format='%Y-%m-%d %H:%M:%S', default=datetime.now, validators=[DataRequired()])
     event_type = SelectField('Event Type', choices=[
@@ -33,6 +38,10 @@ class ManualAttendanceLogForm(FlaskForm):
     ], validators=[DataRequired()])
     source = HiddenField('Source', default='HR Manual')
     submit = SubmitField('Log Event')
+
+    def validate_employee_id(self, field):
+        if db.session.get(Employee, field.data) is None:
+            raise ValidationError('Selected employee does not exist.')
     
 # --- NEW FORM ---
 class EditAttendanceLogForm(FlaskForm):
@@ -6,9 +6,15 @@ from app import db
 from app.models.user import Employee, AttendanceLog, EmployeeSchedule 
 from app.hr.routes import role_required 
 from app.hr.routes import log_admin_action
+from app.hr.routes import get_staff_filters, apply_staff_filters, paginate_staff, get_position_choices
+from app.streaming import StreamedQuery, stream_page
+from app.timezone import local_timestamps, to_local, to_utc
 from .forms import EmployeeScheduleForm, ManualAttendanceLogForm, EditAttendanceLogForm
+from . import exceptions
+from .daily_hours import period_totals
 from datetime import datetime, time, date 
 from sqlalchemy import func
+from sqlalchemy.orm import contains_eager, joinedload
 from decimal import Decimal
 
 # --- Schedule Management ---
@@ -16,8 +22,17 @@ from decimal import Decimal
 @bp.route('/schedule', methods=['GET'])
 @role_required('Payroll_Admin')
 def manage_schedules():
-    employees = Employee.query.outerjoin(EmployeeSchedule).all()
-    return render_template('manage_schedules.html', employees=employees)
+    filters = get_staff_filters(request.args)
+    query = Employee.query.outerjoin(EmployeeSchedule)\
+        .options(contains_eager(Employee.schedules))
+    pagination = paginate_staff(apply_staff_filters(query, filters))
+    return render_template(
+        'manage_schedules.html',
+        employees=pagination.items,
+        pagination=pagination,
+        filters=filters,
+        positions=get_position_choices()
+    )
 
 @bp.route('/schedule/edit/<int:employee_id>', methods=['GET', 'POST'])
 @role_required('Payroll_Admin')
@@ -63,20 +78,19 @@ def edit_schedule(employee_id):
 @role_required('Payroll_Admin')
 def manual_log():
     form = ManualAttendanceLogForm()
-    form.employee_id.choices = [(e.id, f"{e.first_name} {e.last_name} ({e.employee_id_number})")
-                                for e in Employee.query.order_by(Employee.last_name).all()]
     if form.validate_on_submit():
         try:
             new_log = AttendanceLog(
                 employee_id=form.employee_id.data,
-                timestamp=form.timestamp.data,
+                # The form is filled in local time; timestamps are stored as UTC
+                timestamp=to_utc(form.timestamp.data),
                 event_type=form.event_type.data,
                 source=form.source.data
             )
             db.session.add(new_log)
             log_admin_action(
                 action='CREATE_ATTENDANCE_LOG',
-                details=f"Manual log for Employee ID: {form.employee_id.data}. Event: {new_log.event_type} at {new_log.timestamp}."
+                details=f"Manual log for Employee ID: {form.employee_id.data}. Event: {new_log.event_type} at {form.timestamp.data} (local)."
             )
             db.session.commit()
             flash(f"Attendance event '{new_log.event_type}' logged successfully.", 'success')
@@ -89,8 +103,9 @@ def manual_log():
 @bp.route('/log/history')
 @role_required('Payroll_Admin')
 def log_history():
-    recent_logs = AttendanceLog.query.order_by(AttendanceLog.timestamp.desc()).limit(50).all()
-    return render_template('log_history.html', logs=recent_logs)
+    recent_logs = AttendanceLog.query.options(joinedload(AttendanceLog.employee))\
+        .order_by(AttendanceLog.timestamp.desc()).limit(50)
+    return stream_page('log_history.html', logs=local_timestamps(StreamedQuery(recent_logs)))
 
 @bp.route('/log/edit/<int:log_id>', methods=['GET', 'POST'])
 @role_required('Payroll_Admin')
@@ -101,18 +116,18 @@ def edit_log(log_id):
     form = EditAttendanceLogForm()
     if request.method == 'GET':
         form.employee_name.data = f"{log.employee.first_name} {log.employee.last_name}"
-        form.timestamp.data = log.timestamp
+        form.timestamp.data = to_local(log.timestamp)
         form.event_type.data = log.event_type
         form.source.data = log.source
     if form.validate_on_submit():
         try:
-            old_timestamp = log.timestamp
+            old_timestamp = to_local(log.timestamp)
             old_event_type = log.event_type
-            log.timestamp = form.timestamp.data
+            log.timestamp = to_utc(form.timestamp.data)
             log.event_type = form.event_type.data
             log_admin_action(
                 action='EDIT_ATTENDANCE_LOG',
-                details=f"Edited Log ID #{log_id} for {log.employee.last_name}. Old: {old_event_type} at {old_timestamp}. New: {log.event_type} at {log.timestamp}."
+                details=f"Edited Log ID #{log_id} for {log.employee.last_name}. Old: {old_event_type} at {old_timestamp}. New: {log.event_type} at {form.timestamp.data} (local)."
             )
             db.session.commit()
             flash(f"Log entry #{log_id} updated successfully.", 'success')
@@ -148,17 +163,81 @@ def delete_log(log_id):
 @bp.route('/events')
 @role_required('Payroll_Admin')
 def get_attendance_events():
-    logs = AttendanceLog.query.all()
+    query = AttendanceLog.query.options(joinedload(AttendanceLog.employee))
+    # FullCalendar asks for the visible range only (start/end as ISO datetimes)
+    try:
+        if request.args.get('start'):
+            query = query.filter(AttendanceLog.work_date >= date.fromisoformat(request.args['start'][:10]))
+        if request.args.get('end'):
+            query = query.filter(AttendanceLog.work_date < date.fromisoformat(request.args['end'][:10]))
+    except ValueError:
+        abort(400)
+    logs = query.all()
     events = []
-    for log in logs:
+    # Local wall-clock times, so each event lands on the work_date the range filter matched
+    for log, local_time in local_timestamps(logs):
         color = '#28a745' if log.event_type == 'IN' else '#dc3545'
         if log.event_type == 'ADJUST':
             color = '#ffc107'
         events.append({
             'id': log.id,
             'title': f"{log.employee.first_name} ({log.event_type})",
-            'start': log.timestamp.isoformat(),
+            'start': local_time.isoformat(),
             'color': color,
             'allDay': False
         })
-    return jsonify(events)
\ No newline at end of file
+    return jsonify(events)
+
+# --- EXCEPTIONS REPORT ---
+MAX_REPORT_RANGE_DAYS = 62
+
+@bp.route('/exceptions')
+@role_required('Payroll_Admin')
+def attendance_exceptions():
+    """Missing/orphan/duplicate punches, absences and lateness for everyone over a date range."""
+    today = date.today()
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else today.replace(day=1)
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else today
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format.', 'danger')
+        return redirect(url_for('attendance.attendance_exceptions'))
+    if end < start or (end - start).days >= MAX_REPORT_RANGE_DAYS:
+        flash(f'Choose an end date on or after the start date, at most {MAX_REPORT_RANGE_DAYS} days apart.', 'danger')
+        return redirect(url_for('attendance.attendance_exceptions'))
+
+    late_threshold = request.args.get('late_minutes', type=int)
+    if late_threshold is None or late_threshold < 0:
+        late_threshold = exceptions.EXCESSIVE_LATE_MINUTES
+    result = exceptions.exception_report(start, end, late_threshold)
+    return render_template('exceptions.html', result=result, kinds=exceptions.EXCEPTION_KINDS,
+                           max_listed=exceptions.MAX_LISTED)
+
+
+# --- HOURS REPORT (JSON) ---
+@bp.route('/hours')
+@role_required('Payroll_Admin')
+def hours_report():
+    """Worked hours per employee over ?start=&end= (optionally &employee_id=), totalled in the database."""
+    try:
+        start = date.fromisoformat(request.args.get('start', ''))
+        end = date.fromisoformat(request.args.get('end', ''))
+    except ValueError:
+        return jsonify({'error': 'start and end must be dates in YYYY-MM-DD format.'}), 400
+    if end < start or (end - start).days >= MAX_REPORT_RANGE_DAYS:
+        return jsonify({'error': f'end must be on or after start, at most {MAX_REPORT_RANGE_DAYS} days apart.'}), 400
+
+    employee_ids = request.args.getlist('employee_id', type=int) or None
+    totals = period_totals(start, end, employee_ids)
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'employees': [{
+            'employee_id': employee_id,
+            'days_present': entry['days_present'],
+            'total_hours': str(entry['total_hours']),
+            'regular_hours': str(entry['regular_hours']),
+            'overtime_hours': str(entry['overtime_hours']),
+            'late_minutes': entry['late_minutes'],
+        } for employee_id, entry in sorted(totals.items())],
+    })
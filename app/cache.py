@@ -0,0 +1,549 @@
+# app/cache.py
+
+"""
+Application cache: an in-process LRU tier in front of an optional shared tier.
+
+- Local tier: one per worker process. An LRU bounded by entry count
+  (CACHE_MAX_ENTRIES) and by the pickled size of its values (CACHE_MAX_BYTES),
+  every entry with its own TTL.
+- Shared tier (CACHE_SHARED_PATH): a SQLite file in WAL mode that every worker
+  on the host reads and writes, so a value computed by one gunicorn worker is
+  a hit for the others. Bounded by CACHE_SHARED_MAX_BYTES.
+- Invalidation is by tag. invalidate_on() maps ORM inserts, updates and deletes
+  of a model to tags, which are invalidated when the session commits (and
+  forgotten on rollback). With a shared tier each invalidation is also logged
+  in the file, and the other workers replay the log at most
+  CACHE_SYNC_INTERVAL seconds later.
+
+Values must be picklable, and callers share them: treat them as read-only.
+Hits (per tier), misses, sets, evictions and invalidations are counted per
+namespace; see Cache.stats().
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time as _time
+from collections import Counter, OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'CACHE_MAX_ENTRIES': 10000,
+    'CACHE_MAX_BYTES': 32 * 1024 * 1024,
+    'CACHE_DEFAULT_TTL': 300,
+    'CACHE_SHARED_PATH': None,
+    'CACHE_SHARED_MAX_BYTES': 256 * 1024 * 1024,
+    'CACHE_SYNC_INTERVAL': 1.0,
+}
+
+# Session.info key for tags waiting on the surrounding commit
+PENDING_KEY = 'cache_pending_tags'
+# Invalidating this tag clears the whole cache
+ALL = '*'
+SHARED_PRUNE_EVERY = 200        # shared sets between expiry / size sweeps
+INVALIDATION_LOG_KEEP = 10000   # invalidations kept in the shared log
+
+_MISSING = object()
+
+LocalEntry = namedtuple('LocalEntry', 'value size expires tags namespace')
+
+
+def _namespace_of(key):
+    return key.split(':', 1)[0]
+
+
+# --- LOCAL TIER ---
+
+class LocalTier:
+    """LRU of live values, bounded by entry count and by the pickled size of the values."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_tag = {}        # tag -> keys carrying it
+        self._bytes = 0
+        self._sequence = 0       # bumped by every invalidation
+        self._invalidated = {}   # tag -> sequence of its last invalidation
+
+    def mark(self):
+        """Invalidation sequence to pass back to set() as `since`."""
+        with self._lock:
+            return self._sequence
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry.expires <= now:
+                self._remove(key)
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def set(self, key, entry, since=None):
+        """
+        Stores entry and returns the namespaces of the entries evicted to make room, or None
+        if it was not stored: too large, or one of its tags was invalidated after `since`.
+        """
+        if entry.size > self.max_bytes:
+            return None
+        with self._lock:
+            if since is not None and any(self._invalidated.get(tag, 0) > since for tag in (*entry.tags, ALL)):
+                return None
+            self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            evicted = Counter()
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                evicted[self._remove(next(iter(self._entries))).namespace] += 1
+        return evicted
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def invalidate(self, tags):
+        """Drops every entry carrying one of tags; returns the number dropped per namespace."""
+        dropped = Counter()
+        with self._lock:
+            self._sequence += 1
+            for tag in tags:
+                self._invalidated[tag] = self._sequence
+                if tag == ALL:
+                    dropped.update(entry.namespace for entry in self._entries.values())
+                    self._entries.clear()
+                    self._by_tag.clear()
+                    self._bytes = 0
+                    continue
+                for key in self._by_tag.pop(tag, ()):
+                    entry = self._remove(key)
+                    if entry is not None:
+                        dropped[entry.namespace] += 1
+        return dropped
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'max_entries': self.max_entries, 'max_bytes': self.max_bytes}
+
+
+# --- SHARED TIER ---
+
+class SharedTier:
+    """
+    Entries in a SQLite file shared by the worker processes of one host.
+    Each process and thread opens its own connection (connections do not survive fork()).
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS cache_entry ('
+        'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+        'expires REAL NOT NULL, tags TEXT NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS ix_cache_entry_expires ON cache_entry (expires)',
+        'CREATE TABLE IF NOT EXISTS cache_entry_tag ('
+        'tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key))',
+        'CREATE INDEX IF NOT EXISTS ix_cache_entry_tag_key ON cache_entry_tag (key)',
+        'CREATE TABLE IF NOT EXISTS cache_invalidation ('
+        'id INTEGER PRIMARY KEY AUTOINCREMENT, tag TEXT NOT NULL)',
+    )
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._sets = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def _write(self):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def get(self, key, now):
+        """(pickled value, size, expires, tags) or None."""
+        row = self._connection().execute(
+            'SELECT value, size, expires, tags FROM cache_entry WHERE key = ? AND expires > ?', (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        value, size, expires, tags = row
+        return value, size, expires, tuple(tags.split('\n')) if tags else ()
+
+    def set(self, key, value, expires, tags, since=None, now=None):
+        """
+        Stores the pickled value. Returns False without storing when one of its tags was
+        invalidated after log id `since` (the value may predate that change).
+        """
+        evicted = Counter()
+        with self._write() as connection:
+            if since is not None:
+                checked = (*tags, ALL)
+                stale = connection.execute(
+                    'SELECT 1 FROM cache_invalidation WHERE id > ? AND tag IN (%s) LIMIT 1'
+                    % ','.join('?' * len(checked)), (since, *checked)
+                ).fetchone()
+                if stale:
+                    return False, evicted
+            connection.execute('DELETE FROM cache_entry_tag WHERE key = ?', (key,))
+            connection.execute(
+                'INSERT OR REPLACE INTO cache_entry (key, value, size, expires, tags) VALUES (?, ?, ?, ?, ?)',
+                (key, value, len(value), expires, '\n'.join(tags))
+            )
+            connection.executemany('INSERT INTO cache_entry_tag (tag, key) VALUES (?, ?)',
+                                   [(tag, key) for tag in tags])
+        self._sets += 1
+        if self._sets % SHARED_PRUNE_EVERY == 0:
+            evicted = self.prune(now if now is not None else _time.time())
+        return True, evicted
+
+    def delete(self, key):
+        with self._write() as connection:
+            connection.execute('DELETE FROM cache_entry_tag WHERE key = ?', (key,))
+            connection.execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+
+    def invalidate(self, tags):
+        """Deletes the tagged entries and logs the tags; returns the log ids written."""
+        ids = []
+        with self._write() as connection:
+            for tag in tags:
+                ids.append(connection.execute('INSERT INTO cache_invalidation (tag) VALUES (?)', (tag,)).lastrowid)
+                if tag == ALL:
+                    connection.execute('DELETE FROM cache_entry_tag')
+                    connection.execute('DELETE FROM cache_entry')
+                    continue
+                keys = 'SELECT key FROM cache_entry_tag WHERE tag = ?'
+                connection.execute(f'DELETE FROM cache_entry WHERE key IN ({keys})', (tag,))
+                connection.execute(f'DELETE FROM cache_entry_tag WHERE key IN ({keys})', (tag,))
+        return ids
+
+    def last_invalidation(self):
+        return self._connection().execute('SELECT coalesce(max(id), 0) FROM cache_invalidation').fetchone()[0]
+
+    def invalidations_since(self, last_id):
+        """
+        (truncated, [(id, tag), ...]) logged after last_id; truncated is True when
+        older entries were pruned before this process read them.
+        """
+        rows = self._connection().execute(
+            'SELECT id, tag FROM cache_invalidation WHERE id > ? ORDER BY id', (last_id,)
+        ).fetchall()
+        return bool(rows) and rows[0][0] > last_id + 1, rows
+
+    def prune(self, now):
+        """Drops expired entries, then the entries closest to expiry while over max_bytes."""
+        evicted = Counter()
+        with self._write() as connection:
+            expired = 'SELECT key FROM cache_entry WHERE expires <= ?'
+            connection.execute(f'DELETE FROM cache_entry_tag WHERE key IN ({expired})', (now,))
+            connection.execute('DELETE FROM cache_entry WHERE expires <= ?', (now,))
+
+            total = connection.execute('SELECT coalesce(sum(size), 0) FROM cache_entry').fetchone()[0]
+            if total > self.max_bytes:
+                victims = []
+                for key, size in connection.execute('SELECT key, size FROM cache_entry ORDER BY expires'):
+                    if total <= self.max_bytes:
+                        break
+                    victims.append((key,))
+                    total -= size
+                    evicted[_namespace_of(key)] += 1
+                connection.executemany('DELETE FROM cache_entry_tag WHERE key = ?', victims)
+                connection.executemany('DELETE FROM cache_entry WHERE key = ?', victims)
+
+            connection.execute(
+                'DELETE FROM cache_invalidation WHERE id <= (SELECT max(id) FROM cache_invalidation) - ?',
+                (INVALIDATION_LOG_KEEP,)
+            )
+        return evicted
+
+    def stats(self):
+        entries, size = self._connection().execute(
+            'SELECT count(*), coalesce(sum(size), 0) FROM cache_entry'
+        ).fetchone()
+        return {'path': self.path, 'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes}
+
+
+# --- CACHE ---
+
+class Namespace:
+    """Keys, default TTL and stats of one kind of cached value; see Cache.namespace()."""
+
+    def __init__(self, cache, name, ttl=None):
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+        # Carried by every entry of the namespace, so clear() can find them
+        self.tag = f'namespace:{name}'
+
+    def _key(self, key):
+        return f'{self.name}:{key}'
+
+    def _tags(self, tags):
+        return (self.tag, *tags)
+
+    def get(self, key, default=None):
+        value = self.cache._get(self.name, self._key(key))
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl=None, tags=()):
+        self.cache._set(self.name, self._key(key), value, ttl or self.ttl, self._tags(tags))
+
+    def get_or_set(self, key, factory, ttl=None, tags=()):
+        """
+        The cached value for key, else factory() stored with tags. A value whose tags are
+        invalidated while factory() runs is returned but not stored.
+        """
+        full_key = self._key(key)
+        value = self.cache._get(self.name, full_key)
+        if value is _MISSING:
+            marks = self.cache._marks()
+            value = factory()
+            self.cache._set(self.name, full_key, value, ttl or self.ttl, self._tags(tags), marks)
+        return value
+
+    def delete(self, key):
+        self.cache._delete(self._key(key))
+
+    def clear(self):
+        self.cache.invalidate(self.tag)
+
+
+class Cache:
+    """
+    The application cache. Configured from app.config by init_app() (DEFAULTS until then).
+    Values are read and written through namespaces:
+
+        holidays = cache.namespace('holidays', ttl=3600)
+        holidays.get_or_set(key, load, tags=('holidays',))
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._namespaces = {}
+        self._subscribers = []   # (tags, callback)
+        self.configure(DEFAULTS)
+
+    def init_app(self, app):
+        for name, value in DEFAULTS.items():
+            app.config.setdefault(name, value)
+        self.configure(app.config)
+        app.extensions['cache'] = self
+
+    def configure(self, config):
+        self.default_ttl = config['CACHE_DEFAULT_TTL']
+        self.sync_interval = config['CACHE_SYNC_INTERVAL']
+        self.local = LocalTier(config['CACHE_MAX_ENTRIES'], config['CACHE_MAX_BYTES'])
+        self.shared = None
+        self._shared_seen = 0
+        self._own_invalidations = set()
+        self._synced_at = 0.0
+        path = config['CACHE_SHARED_PATH']
+        if path:
+            try:
+                self.shared = SharedTier(path, config['CACHE_SHARED_MAX_BYTES'])
+                self._shared_seen = self.shared.last_invalidation()
+            except (OSError, sqlite3.Error) as e:
+                logger.warning('Shared cache %s unavailable, using the local tier only: %s', path, e)
+                self.shared = None
+
+    def namespace(self, name, ttl=None):
+        with self._lock:
+            namespace = self._namespaces.get(name)
+            if namespace is None:
+                namespace = self._namespaces[name] = Namespace(self, name, ttl)
+                self._stats[name] = Counter()
+        return namespace
+
+    def _count(self, name, stat, amount=1):
+        with self._lock:
+            self._stats.setdefault(name, Counter())[stat] += amount
+
+    def _count_evictions(self, evicted):
+        if evicted:
+            for name, amount in evicted.items():
+                self._count(name, 'evictions', amount)
+
+    def _shared_call(self, method, *args, default=None):
+        """Shared tier call; a failing shared file degrades to the local tier instead of failing the request."""
+        try:
+            return getattr(self.shared, method)(*args)
+        except sqlite3.Error as e:
+            logger.warning('Shared cache %s failed: %s', method, e)
+            return default
+
+    def _sync(self):
+        """Replays invalidations logged by other processes, at most once per sync interval."""
+        now = _time.monotonic()
+        if now - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = now
+        changes = self._shared_call('invalidations_since', self._shared_seen)
+        if not changes or not changes[1]:
+            return
+        truncated, rows = changes
+        self._shared_seen = max(self._shared_seen, rows[-1][0])
+        if truncated:
+            tags = {ALL}
+        else:
+            tags = {tag for log_id, tag in rows if log_id not in self._own_invalidations}
+        self._own_invalidations.difference_update(log_id for log_id, _ in rows)
+        if tags:
+            for name, amount in self.local.invalidate(tags).items():
+                self._count(name, 'invalidations', amount)
+
+    def _marks(self):
+        return self.local.mark(), self._shared_seen
+
+    def _get(self, name, key):
+        if self.shared is not None:
+            self._sync()
+        now = _time.time()
+        value = self.local.get(key, now)
+        if value is not _MISSING:
+            self._count(name, 'hits_local')
+            return value
+        if self.shared is not None:
+            row = self._shared_call('get', key, now)
+            if row is not None:
+                blob, size, expires, tags = row
+                value = pickle.loads(blob)
+                self._count_evictions(self.local.set(key, LocalEntry(value, size, expires, tags, name)))
+                self._count(name, 'hits_shared')
+                return value
+        self._count(name, 'misses')
+        return _MISSING
+
+    def _set(self, name, key, value, ttl, tags, marks=(None, None)):
+        try:
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.warning('Not caching %s: value is not picklable (%s)', key, e)
+            return
+        now = _time.time()
+        expires = now + (ttl or self.default_ttl)
+        local_since, shared_since = marks
+        if self.shared is not None:
+            stored, evicted = self._shared_call('set', key, blob, expires, tags, shared_since, now,
+                                                default=(True, None))
+            self._count_evictions(evicted)
+            if not stored:
+                return
+        evicted = self.local.set(key, LocalEntry(value, len(blob), expires, tags, name), local_since)
+        if evicted is not None:
+            self._count(name, 'sets')
+            self._count_evictions(evicted)
+
+    def _delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self._shared_call('delete', key)
+
+    def invalidate(self, *tags):
+        """Drops every entry carrying one of tags, in this process now and in the others on their next sync."""
+        tags = set(tags)
+        if not tags:
+            return
+        for name, amount in self.local.invalidate(tags).items():
+            self._count(name, 'invalidations', amount)
+        if self.shared is not None:
+            self._own_invalidations.update(self._shared_call('invalidate', tags, default=()))
+        for subscribed, callback in self._subscribers:
+            if ALL in tags or not subscribed.isdisjoint(tags):
+                callback()
+
+    def subscribe(self, tags, callback):
+        """
+        Calls callback() after this process invalidates any of tags, for data kept outside
+        the cache (invalidations replayed from other workers do not call it).
+        """
+        self._subscribers.append((frozenset(tags), callback))
+
+    def clear(self):
+        self.invalidate(ALL)
+
+    def invalidate_on(self, model, tags):
+        """
+        Invalidates tags whenever an instance of model is inserted, updated or deleted,
+        once the session commits. tags is a tuple of tags or a function(instance) returning one.
+        """
+        tags_for = tags if callable(tags) else (lambda target, fixed=tuple(tags): fixed)
+
+        def queue(mapper, connection, target):
+            session = object_session(target)
+            if session is None:
+                self.invalidate(*tags_for(target))
+                return
+            session.info.setdefault(PENDING_KEY, set()).update(tags_for(target))
+
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(model, name, queue)
+
+    def stats(self):
+        with self._lock:
+            namespaces = {name: dict(counter) for name, counter in sorted(self._stats.items())}
+        for counters in namespaces.values():
+            hits = counters.get('hits_local', 0) + counters.get('hits_shared', 0)
+            lookups = hits + counters.get('misses', 0)
+            counters['hit_ratio'] = round(hits / lookups, 3) if lookups else None
+        shared = self._shared_call('stats') if self.shared is not None else None
+        return {'local': self.local.stats(), 'shared': shared, 'namespaces': namespaces}
+
+
+cache = Cache()
+
+
+# --- ORM EVENTS: invalidate the tags collected by invalidate_on() once committed ---
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_tags(session):
+    tags = session.info.pop(PENDING_KEY, None)
+    if tags:
+        cache.invalidate(*tags)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_tags(session):
+    session.info.pop(PENDING_KEY, None)
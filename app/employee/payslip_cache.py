@@ -0,0 +1,140 @@
+# app/employee/payslip_cache.py
+
+import hashlib
+import threading
+import time as _time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import current_app, g, request, session, make_response
+from flask_login import current_user
+from sqlalchemy import event
+
+from app.models.user import Employee, Payslip
+
+CachedPage = namedtuple('CachedPage', 'user_id employee_id etag body expires')
+
+
+class RenderedPageCache:
+    """
+    Size-bounded LRU of rendered pages (bounded by entry count and by total body bytes).
+
+    Payslips of a Processed run never change, so their pages can be served straight
+    from here with a strong ETag. Entries are dropped when this process sees the
+    employee or their payslips change; PAYSLIP_CACHE_TTL bounds how long a page
+    cached by another worker process can outlive such a change. Run status and
+    date changes are part of the keys (see employee.routes), so every worker sees them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires < _time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, user_id, employee_id, body):
+        config = current_app.config
+        etag = hashlib.sha256(body).hexdigest()
+        entry = CachedPage(user_id, employee_id, etag, body, _time.monotonic() + config['PAYSLIP_CACHE_TTL'])
+        if len(body) > config['PAYSLIP_CACHE_MAX_BYTES']:
+            return entry
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while (len(self._entries) > config['PAYSLIP_CACHE_MAX_ENTRIES']
+                   or self._bytes > config['PAYSLIP_CACHE_MAX_BYTES']):
+                self._remove(next(iter(self._entries)))
+        return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.body)
+
+    def discard_employee(self, employee_id):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry.employee_id == employee_id]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+payslip_page_cache = RenderedPageCache()
+
+
+def page_response(entry):
+    """200 (or 304 on a matching If-None-Match) for a cached page, with its strong ETag."""
+    if request.if_none_match.contains(entry.etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(entry.body)
+    response.set_etag(entry.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def serve_cached_page(key_func):
+    """
+    Answers from payslip_page_cache before the wrapped view runs. Apply it below
+    login_required, so the user is loaded (and still exists) before a page is served.
+    key_func(user_id, **view_args) returns the cache key, or None to skip the cache.
+    The key is computed once per request and kept in g.payslip_cache_key for cache_page().
+    Requests with pending flash messages always render, so the messages are shown.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = current_user.get_id()
+            g.payslip_cache_key = None
+            if user_id is not None and '_flashes' not in session:
+                g.payslip_cache_key = key_func(user_id, **kwargs)
+                entry = payslip_page_cache.get(g.payslip_cache_key) if g.payslip_cache_key is not None else None
+                if entry is not None and entry.user_id == user_id:
+                    return page_response(entry)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def can_cache_page():
+    """
+    False when serve_cached_page() computed no key, or while flash messages are pending:
+    they would be rendered into the page.
+    """
+    return g.get('payslip_cache_key') is not None and '_flashes' not in session
+
+
+def cache_page(employee_id, html):
+    """Stores a freshly rendered page under this request's key and returns it as a response carrying the ETag."""
+    entry = payslip_page_cache.put(g.payslip_cache_key, current_user.get_id(), employee_id, html.encode('utf-8'))
+    return page_response(entry)
+
+
+# --- INVALIDATION ---
+
+@event.listens_for(Employee, 'after_update')
+def _employee_changed(mapper, connection, target):
+    payslip_page_cache.discard_employee(target.id)
+
+@event.listens_for(Employee, 'after_delete')
+def _employee_removed(mapper, connection, target):
+    payslip_page_cache.discard_employee(target.id)
+
+@event.listens_for(Payslip, 'after_update')
+@event.listens_for(Payslip, 'after_delete')
+def _payslip_changed(mapper, connection, target):
+    payslip_page_cache.discard_employee(target.employee_id)
@@ -3,13 +3,15 @@
 from flask import render_template, redirect, url_for, flash
 from flask_login import login_required, current_user
 from app.employee import bp
-from app.models.user import Payslip, PayrollRun, LeaveRequest, AttendanceLog, LeaveBalance 
+from app.models.user import Employee, Payslip, PayrollRun, LeaveRequest, AttendanceLog, LeaveBalance 
 from app import db
 from .forms import LeaveRequestForm 
+from .payslip_cache import serve_cached_page, can_cache_page, cache_page
 from datetime import datetime
+import hashlib
 from sqlalchemy import desc
 from sqlalchemy.orm import joinedload
-import pytz
+from app.timezone import localize
 
 def get_current_clock_status(employee_id):
     """Get the current clock status for an employee based on their most recent log entry."""
@@ -59,24 +61,41 @@ def clock():
         # Refresh the session to ensure we get fresh data on next query
         db.session.expire_all()
         
-        # Convert UTC to local time for display (default to Asia/Manila, can be configured)
-        from flask import current_app
-        tz_name = current_app.config.get('TIMEZONE', 'Asia/Manila')
-        local_tz = pytz.timezone(tz_name) if tz_name != 'UTC' else pytz.UTC
-        # Ensure timestamp is timezone-aware (assume UTC if naive)
-        if new_log.timestamp.tzinfo is None:
-            utc_time = pytz.UTC.localize(new_log.timestamp)
-        else:
-            utc_time = new_log.timestamp
-        local_time = utc_time.astimezone(local_tz)
+        # Convert UTC to local time for display (the configured TIMEZONE, Asia/Manila by default)
+        local_time = localize(new_log.timestamp)
         flash(f"Successfully clocked {new_event_type.lower()} at {local_time.strftime('%b %d, %Y at %I:%M:%S %p')}.", 'success')
     except Exception as e:
         db.session.rollback()
         flash(f"Error processing clock action: {e}", 'danger')
     return redirect(url_for('employee.dashboard'))
 
+def _run_signature(rows):
+    return hashlib.sha1(repr([tuple(row) for row in rows]).encode('utf-8')).hexdigest()
+
+def payslip_list_key(user_id):
+    """
+    Changes whenever a payslip is added to or removed from the user's list, or one of its
+    runs changes status or dates. Every worker derives the same key from one narrow query.
+    """
+    rows = db.session.query(Payslip.id, PayrollRun.status, PayrollRun.pay_period_start,
+                            PayrollRun.pay_period_end, PayrollRun.pay_date)\
+        .join(Employee, Payslip.employee_id == Employee.id)\
+        .join(PayrollRun, Payslip.payroll_run_id == PayrollRun.id)\
+        .filter(Employee.user_id == int(user_id)).order_by(Payslip.id).all()
+    return ('list', user_id, _run_signature(rows))
+
+def payslip_detail_key(user_id, slip_id):
+    """Changes when the payslip's run changes status or dates (e.g. un-finalized and re-run)."""
+    rows = db.session.query(PayrollRun.id, PayrollRun.status, PayrollRun.pay_period_start,
+                            PayrollRun.pay_period_end, PayrollRun.pay_date)\
+        .join(Payslip, Payslip.payroll_run_id == PayrollRun.id)\
+        .filter(Payslip.id == slip_id).all()
+    return ('detail', slip_id, _run_signature(rows))
+
+
 @bp.route('/my_payslips')
 @login_required
+@serve_cached_page(payslip_list_key)
 def my_payslips():
     payslips = Payslip.query.filter_by(employee_id=current_user.employee.id)\
         .options(joinedload(Payslip.payroll_run))\
@@ -88,17 +107,23 @@ def my_payslips():
         ) \
         .order_by(PayrollRun.pay_date.desc())\
         .all()
-    return render_template('my_payslips.html', payslips=payslips)
+    if not can_cache_page():
+        return render_template('my_payslips.html', payslips=payslips)
+    return cache_page(current_user.employee.id, render_template('my_payslips.html', payslips=payslips))
 
 @bp.route('/my_payslips/<int:slip_id>')
 @login_required
+@serve_cached_page(payslip_detail_key)
 def view_payslip_detail(slip_id):
     employee = current_user.employee
     slip = db.session.get(Payslip, slip_id)
     if slip is None or slip.employee_id != employee.id:
         flash('Payslip not found or access denied.', 'danger')
         return redirect(url_for('employee.my_payslips'))
-    return render_template('payslip_detail.html', slip=slip)
+    # Payslips of a processed run are final, so the rendered page can be reused
+    if slip.payroll_run.status != 'Processed' or not can_cache_page():
+        return render_template('payslip_detail.html', slip=slip)
+    return cache_page(employee.id, render_template('payslip_detail.html', slip=slip))
 
 @bp.route('/file_leave', methods=['GET', 'POST'])
 @login_required
@@ -0,0 +1,153 @@
+# app/hr/leave_queue.py
+
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from flask import current_app
+from sqlalchemy import bindparam, insert
+from sqlalchemy.orm import contains_eager
+
+from app import db, cache
+from app.models.user import Employee, LeaveRequest, LeaveBalance, AuditLog, Holiday, count_working_days_excluding
+
+LEAVE_STATUSES = ['Pending', 'Approved', 'Rejected']
+
+
+def leave_queue_base_query():
+    """Leave requests with the employee populated from the same JOIN."""
+    return LeaveRequest.query.join(Employee, LeaveRequest.employee_id == Employee.id)\
+        .options(contains_eager(LeaveRequest.employee))
+
+
+def leave_queue_query(status):
+    """
+    Leave requests for one status, employee eagerly loaded.
+    Ordered to match the (status, requested_on) index: oldest Pending first (FIFO review),
+    most recent first for decided requests.
+    """
+    query = leave_queue_base_query().filter(LeaveRequest.status == status)
+    if status == 'Pending':
+        return query.order_by(LeaveRequest.requested_on.asc(), LeaveRequest.id.asc())
+    return query.order_by(LeaveRequest.requested_on.desc(), LeaveRequest.id.desc())
+
+
+# --- CACHED PENDING COUNT ---
+# Shown on every admin page load; dropped when a leave request is saved (see models.user),
+# the TTL covers other workers when the cache has no shared tier.
+leave_queue_cache = cache.namespace('leave_queue')
+
+
+def _count_pending():
+    return db.session.query(db.func.count(LeaveRequest.id))\
+        .filter(LeaveRequest.status == 'Pending').scalar() or 0
+
+
+def get_pending_leave_count():
+    """Number of Pending leave requests, cached for PENDING_LEAVE_COUNT_TTL seconds."""
+    return leave_queue_cache.get_or_set('pending_count', _count_pending, tags=('leave_requests',),
+                                        ttl=current_app.config['PENDING_LEAVE_COUNT_TTL'])
+
+
+def invalidate_pending_leave_count():
+    """For writes that bypass the ORM events (Core UPDATEs)."""
+    cache.invalidate('leave_requests')
+
+
+# --- BULK APPROVE / REJECT ---
+
+def balance_delta(old_status, new_status, days):
+    """Change to LeaveBalance.used for a status transition (mirrors update_balance_on_leave_change)."""
+    if new_status == 'Approved' and old_status != 'Approved':
+        return days
+    if old_status == 'Approved' and new_status != 'Approved':
+        return -days
+    return Decimal('0.00')
+
+
+def apply_bulk_leave_decision(request_ids, new_status, user_id):
+    """
+    Approves or rejects many leave requests in one transaction.
+
+    Balances are validated in a single pass (requests are taken oldest first and
+    each one draws down the running remaining balance), then applied with one
+    grouped UPDATE per (employee, leave_type). The status change goes through
+    Core, so the per-row leave balance trigger does not fire a second time.
+    Returns (number of requests updated, [(leave request id, reason)] skipped).
+    """
+    requests = leave_queue_base_query()\
+        .filter(LeaveRequest.id.in_(request_ids))\
+        .order_by(LeaveRequest.requested_on.asc(), LeaveRequest.id.asc())\
+        .all()
+    skipped = [(req.id, 'already ' + new_status.lower()) for req in requests if req.status == new_status]
+    requests = [req for req in requests if req.status != new_status]
+    if not requests:
+        return 0, skipped
+
+    # One holiday query for the whole batch
+    holidays = {
+        row[0] for row in db.session.query(Holiday.date).filter(
+            Holiday.date >= min(req.start_date for req in requests),
+            Holiday.date <= max(req.end_date for req in requests)
+        )
+    }
+
+    # One balance query for every (employee, leave_type) involved
+    pairs = {(req.employee_id, req.leave_type) for req in requests}
+    remaining = {
+        (bal.employee_id, bal.leave_type): bal.entitlement - bal.used
+        for bal in LeaveBalance.query.filter(
+            db.tuple_(LeaveBalance.employee_id, LeaveBalance.leave_type).in_(list(pairs))
+        )
+    }
+
+    processed = []
+    deltas = defaultdict(Decimal)
+    for req in requests:
+        key = (req.employee_id, req.leave_type)
+        days = count_working_days_excluding(req.start_date, req.end_date, holidays)
+        delta = balance_delta(req.status, new_status, days)
+        if delta > 0:
+            if key not in remaining:
+                skipped.append((req.id, f"no {req.leave_type} balance"))
+                continue
+            if remaining[key] < delta:
+                skipped.append((req.id, f"insufficient balance ({remaining[key]} days remaining, {delta} days requested)"))
+                continue
+        if key in remaining:
+            remaining[key] -= delta
+        if delta:
+            deltas[key] += delta
+        processed.append(req)
+
+    if not processed:
+        return 0, skipped
+
+    lr_table = LeaveRequest.__table__
+    lb_table = LeaveBalance.__table__
+    db.session.execute(
+        lr_table.update()
+        .where(lr_table.c.id.in_([req.id for req in processed]))
+        .values(status=new_status)
+    )
+    if deltas:
+        db.session.execute(
+            lb_table.update()
+            .where((lb_table.c.employee_id == bindparam('b_employee_id')) & (lb_table.c.leave_type == bindparam('b_leave_type')))
+            .values(used=lb_table.c.used + bindparam('b_delta')),
+            [{'b_employee_id': emp_id, 'b_leave_type': leave_type, 'b_delta': delta}
+             for (emp_id, leave_type), delta in deltas.items()]
+        )
+    now = datetime.utcnow()
+    db.session.execute(
+        insert(AuditLog),
+        [{
+            'timestamp': now,
+            'user_id': user_id,
+            'action': 'UPDATE_LEAVE_STATUS',
+            'details': f"Status changed to {new_status} for Leave ID #{req.id} ({req.leave_type}). Employee: {req.employee.last_name}. (Bulk)"
+        } for req in processed]
+    )
+    db.session.commit()
+    invalidate_pending_leave_count()
+    return len(processed), skipped
@@ -1,16 +1,20 @@
 # app/hr/routes.py
 
-from flask import render_template, redirect, url_for, flash, request, abort, current_app
+from flask import render_template, redirect, url_for, flash, request, abort, current_app, jsonify
 from flask_login import login_required, current_user
 from app.hr import bp
 from app import db
 from app.models.user import User, Employee, LeaveRequest, LeaveBalance, AuditLog, Holiday 
 from functools import wraps
 from app.hr.forms import AddEmployeeForm, EditEmployeeForm, LeaveBalanceForm, PasswordResetForm, HolidayForm
+from app.hr.search import employee_index
+from app.hr.leave_queue import LEAVE_STATUSES, leave_queue_query, get_pending_leave_count, apply_bulk_leave_decision
+from app.streaming import StreamedQuery, stream_page
 from datetime import date, timedelta
 from decimal import Decimal
 import os
-import uuid
+import hashlib
+import tempfile
 from werkzeug.utils import secure_filename
 
 # --- AUDIT LOG HELPER FUNCTION ---
@@ -57,7 +61,10 @@ def count_working_days_for_validation(start_date, end_date):
     return total_days
 
 def save_picture(form_picture):
-    """Securely save uploaded picture with validation."""
+    """
+    Securely save uploaded picture under its content hash.
+    Identical uploads resolve to the same file, so it is only written once.
+    """
     # Validate file extension
     filename = secure_filename(form_picture.filename)
     if not filename:
@@ -71,18 +78,51 @@ def save_picture(form_picture):
     if f_ext not in allowed_extensions:
         raise ValueError(f"File type .{f_ext} not allowed. Allowed types: {', '.join(allowed_extensions)}")
     
-    # Generate secure filename
-    random_hex = uuid.uuid4().hex
-    picture_fn = f"{random_hex}.{f_ext}"
-    picture_path = os.path.join(current_app.config['UPLOAD_FOLDER'], picture_fn)
+    upload_folder = current_app.config['UPLOAD_FOLDER']
     
     # Ensure upload directory exists
-    os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(upload_folder, exist_ok=True)
     
-    # Save file
-    form_picture.save(picture_path)
+    # Hash while streaming to a temp file in the same folder (so the final rename is atomic)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            for chunk in iter(lambda: form_picture.stream.read(64 * 1024), b''):
+                digest.update(chunk)
+                tmp_file.write(chunk)
+        
+        picture_fn = f"{digest.hexdigest()}.{f_ext}"
+        picture_path = os.path.join(upload_folder, picture_fn)
+        
+        # Deduplicate: an existing file with the same hash already has these bytes
+        if os.path.exists(picture_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, picture_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
     return picture_fn
 
+def remove_picture(photo_filename, employee_id):
+    """
+    Delete a stored picture unless another employee still references it.
+    Needed because identical uploads share one content-addressed file.
+    """
+    if not photo_filename or photo_filename == 'default.png':
+        return
+    still_used = Employee.query.filter(
+        Employee.photo_filename == photo_filename,
+        Employee.id != employee_id
+    ).first()
+    if still_used:
+        return
+    photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], photo_filename)
+    if os.path.exists(photo_path):
+        os.remove(photo_path)
+
 # --- DECORATOR ---
 def role_required(role):
     def decorator(f):
@@ -144,13 +184,142 @@ def add_new_employee():
     return render_template('add_employee.html', form=form)
 
 
+# --- STAFF DIRECTORY: FILTERING / SORTING / PAGINATION ---
+# Whitelisted sort keys -> indexed columns (Employee.id is appended as a stable tie-breaker)
+STAFF_SORT_COLUMNS = {
+    'name': (Employee.last_name, Employee.first_name),
+    'employee_id': (Employee.employee_id_number,),
+    'position': (Employee.position,),
+    'status': (Employee.status,),
+    'date_hired': (Employee.date_hired,),
+}
+
+def fold_case(text, dialect):
+    """Lower-cases text the way the database's lower() does (SQLite only folds ASCII)."""
+    if dialect == 'sqlite':
+        return ''.join(char.lower() if char.isascii() else char for char in text)
+    return text.lower()
+
+def prefix_condition(column, text, dialect):
+    """
+    Case-insensitive "column starts with text" as a range on lower(column), so it is served
+    by the ix_employee_lower_* expression indexes (LIKE/ILIKE with ESCAPE cannot use them).
+    """
+    low = fold_case(text, dialect)
+    high = low[:-1] + chr(ord(low[-1]) + 1)  # smallest string above every value starting with low
+    lowered = db.func.lower(column)
+    # The substr() recheck keeps the match exact under non-binary collations
+    return db.and_(lowered >= low, lowered < high, db.func.substr(lowered, 1, len(low)) == low)
+
+def get_staff_filters(args):
+    """Reads the directory filter/sort options (and the chosen page size) from the query string."""
+    sort = args.get('sort', 'name')
+    if sort not in STAFF_SORT_COLUMNS:
+        sort = 'name'
+    return {
+        'q': args.get('q', '').strip(),
+        'status': args.get('status', '').strip(),
+        'position': args.get('position', '').strip(),
+        'sort': sort,
+        'direction': 'desc' if args.get('direction') == 'desc' else 'asc',
+        # Kept in the sort and filter links; paginate_staff() reads and bounds it
+        'per_page': args.get('per_page', type=int),
+    }
+
+def apply_staff_filters(query, filters):
+    """Applies status/position/name-prefix filters and the requested ordering to an Employee query."""
+    if filters['status']:
+        query = query.filter(Employee.status == filters['status'])
+    if filters['position']:
+        query = query.filter(Employee.position == filters['position'])
+    if filters['q']:
+        dialect = db.session.get_bind().dialect.name
+        query = query.filter(db.or_(
+            prefix_condition(Employee.last_name, filters['q'], dialect),
+            prefix_condition(Employee.first_name, filters['q'], dialect),
+            prefix_condition(Employee.employee_id_number, filters['q'], dialect)
+        ))
+    columns = STAFF_SORT_COLUMNS[filters['sort']] + (Employee.id,)
+    if filters['direction'] == 'desc':
+        columns = tuple(col.desc() for col in columns)
+    return query.order_by(*columns)
+
+def paginate_staff(query):
+    """Paginates a directory query using ?page= and ?per_page= (bounded by STAFF_MAX_PER_PAGE)."""
+    return query.paginate(
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', current_app.config['STAFF_PER_PAGE'], type=int),
+        max_per_page=current_app.config['STAFF_MAX_PER_PAGE'],
+        error_out=False
+    )
+
+def staff_directory_query(filters):
+    """Non-admin employees with their login eagerly loaded, filtered and sorted."""
+    query = Employee.query.join(User, Employee.user_id == User.id)\
+        .options(db.contains_eager(Employee.user))\
+        .filter(User.role != 'Admin')
+    return apply_staff_filters(query, filters)
+
+def get_position_choices():
+    """Distinct positions for the filter dropdown (served from the position index)."""
+    rows = db.session.query(Employee.position).filter(Employee.position.isnot(None))\
+        .distinct().order_by(Employee.position).all()
+    return [row[0] for row in rows]
+
+
 @bp.route('/manage_staff')
 @role_required('Payroll_Admin')
 def manage_all_staff():
-    employees = db.session.query(Employee).join(User, Employee.user_id == User.id)\
-        .filter(User.role != 'Admin')\
-        .all()
-    return render_template('manage_staff.html', employees=employees)
+    filters = get_staff_filters(request.args)
+    pagination = paginate_staff(staff_directory_query(filters))
+    return render_template(
+        'manage_staff.html',
+        employees=pagination.items,
+        pagination=pagination,
+        filters=filters,
+        positions=get_position_choices()
+    )
+
+
+@bp.route('/manage_staff/data')
+@role_required('Payroll_Admin')
+def manage_all_staff_data():
+    """JSON feed for the staff data table; returns only the requested page."""
+    filters = get_staff_filters(request.args)
+    pagination = paginate_staff(staff_directory_query(filters))
+    return jsonify({
+        'page': pagination.page,
+        'per_page': pagination.per_page,
+        'pages': pagination.pages,
+        'total': pagination.total,
+        'sort': filters['sort'],
+        'direction': filters['direction'],
+        'items': [{
+            'id': emp.id,
+            'employee_id_number': emp.employee_id_number,
+            'first_name': emp.first_name,
+            'last_name': emp.last_name,
+            'position': emp.position,
+            'status': emp.status,
+            'date_hired': emp.date_hired.isoformat() if emp.date_hired else None,
+            'email': emp.user.username if emp.user else None,
+            'photo_url': emp.photo_url,
+        } for emp in pagination.items]
+    })
+
+
+@bp.route('/employees/search')
+@role_required('Payroll_Admin')
+def search_employees():
+    """Typeahead lookup by name or employee ID prefix, served from the in-memory index."""
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    results = employee_index.search(
+        request.args.get('q', ''),
+        limit=limit,
+        ttl=current_app.config['EMPLOYEE_SEARCH_TTL'],
+        status=request.args.get('status') or None
+    )
+    return jsonify(results)
 
 
 @bp.route('/employee/reset_password/<int:id>', methods=['GET', 'POST'])
@@ -194,11 +363,10 @@ def edit_staff_member(id):
     form = EditEmployeeForm() 
     if form.validate_on_submit():
         if form.photo.data:
-            if employee.photo_filename != 'default.png':
-                old_photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], employee.photo_filename)
-                if os.path.exists(old_photo_path):
-                    os.remove(old_photo_path)
-            employee.photo_filename = save_picture(form.photo.data)
+            new_photo_filename = save_picture(form.photo.data)
+            if new_photo_filename != employee.photo_filename:
+                remove_picture(employee.photo_filename, employee.id)
+            employee.photo_filename = new_photo_filename
         employee.employee_id_number = form.employee_id_number.data
         employee.first_name = form.first_name.data
         employee.last_name = form.last_name.data
@@ -244,10 +412,7 @@ def delete_staff_member(id):
 
     try:
         user = db.session.get(User, employee.user_id)
-        if employee.photo_filename != 'default.png':
-            photo_path = os.path.join(current_app.config['UPLOAD_FOLDER'], employee.photo_filename)
-            if os.path.exists(photo_path):
-                os.remove(photo_path)
+        remove_picture(employee.photo_filename, employee.id)
                 
         log_admin_action(
             action='DELETE_EMPLOYEE',
@@ -268,10 +433,22 @@ def delete_staff_member(id):
 @bp.route('/leave_requests')
 @role_required('Payroll_Admin')
 def manage_all_leave_requests():
-    all_requests = LeaveRequest.query.join(Employee, LeaveRequest.employee_id == Employee.id)\
-        .order_by(LeaveRequest.status.asc(), LeaveRequest.requested_on.desc())\
-        .all()
-    return render_template('manage_leave_requests.html', all_requests=all_requests)
+    status = request.args.get('status', 'Pending')
+    if status not in LEAVE_STATUSES:
+        status = 'Pending'
+    pagination = leave_queue_query(status).paginate(
+        page=request.args.get('page', 1, type=int),
+        per_page=current_app.config['LEAVE_REQUESTS_PER_PAGE'],
+        error_out=False
+    )
+    return render_template(
+        'manage_leave_requests.html',
+        all_requests=pagination.items,
+        pagination=pagination,
+        status=status,
+        statuses=LEAVE_STATUSES,
+        pending_count=get_pending_leave_count()
+    )
 
 
 @bp.route('/leave_requests/update/<int:request_id>/<string:new_status>', methods=['POST'])
@@ -325,11 +502,41 @@ def update_leave_request_final_status(request_id, new_status):
     return redirect(url_for('hr.manage_all_leave_requests'))
 
 
+@bp.route('/leave_requests/bulk_update', methods=['POST'])
+@role_required('Payroll_Admin')
+def bulk_update_leave_requests():
+    """Approves or rejects all selected leave requests in one transaction."""
+    new_status = request.form.get('new_status')
+    request_ids = request.form.getlist('request_ids', type=int)
+    if new_status not in ['Approved', 'Rejected']:
+        flash('Invalid status.', 'danger')
+        return redirect(url_for('hr.manage_all_leave_requests'))
+    if not request_ids:
+        flash('No leave requests selected.', 'warning')
+        return redirect(url_for('hr.manage_all_leave_requests'))
+
+    try:
+        updated, skipped = apply_bulk_leave_decision(request_ids, new_status, current_user.id)
+        if updated:
+            flash(f'{updated} leave request(s) {new_status.lower()}.', 'success')
+        if skipped:
+            reasons = '; '.join(f"#{req_id}: {reason}" for req_id, reason in skipped[:10])
+            more = f" (and {len(skipped) - 10} more)" if len(skipped) > 10 else ''
+            flash(f'Skipped {len(skipped)} request(s): {reasons}{more}.', 'warning')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'An error occurred: {e}', 'danger')
+
+    return redirect(url_for('hr.manage_all_leave_requests'))
+
+
 @bp.route('/leave_balances')
 @role_required('Payroll_Admin')
 def manage_leave_balances():
-    employees = Employee.query.options(db.joinedload(Employee.leave_balances)).all()
-    return render_template('manage_leave_balances.html', employees=employees)
+    employees = Employee.query.options(db.selectinload(Employee.leave_balances)).order_by(Employee.id)
+    first_employee_id = db.session.query(db.func.min(Employee.id)).scalar()
+    return stream_page('manage_leave_balances.html', employees=StreamedQuery(employees),
+                       first_employee_id=first_employee_id)
 
 
 @bp.route('/leave_balances/edit/<int:employee_id>/<string:leave_type>', methods=['GET', 'POST'])
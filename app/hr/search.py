@@ -0,0 +1,209 @@
+# app/hr/search.py
+
+import threading
+import time as _time
+from bisect import bisect_left, insort
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from app.models.user import Employee
+
+# Session.info key for employee changes waiting on the surrounding commit
+PENDING_KEY = 'employee_search_pending'
+
+
+def _normalize(text):
+    return ' '.join((text or '').lower().split())
+
+
+class EmployeeSearchIndex:
+    """
+    In-memory prefix index over employee names and ID numbers.
+
+    Every employee contributes a few lowercase keys (last name, first name,
+    "first last", "last first", ID number) to one sorted list, so a prefix
+    lookup is a bisect plus a short forward scan: O(log n + limit).
+    Commits made in this process are applied incrementally via ORM events;
+    changes made by other worker processes are picked up when the TTL expires.
+    A rebuild replays the incremental changes that arrive while its query runs,
+    so a change committed by another thread is never lost to an older snapshot.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []       # sorted [(key, employee pk)]
+        self._records = {}    # employee pk -> display record
+        self._built_at = None
+        self._sequence = 0          # bumped by every incremental change
+        self._builds_in_flight = 0
+        self._changes = []          # [(sequence, employee pk, record or None)] while a build runs
+        self._invalidated_at = 0    # sequence of the last invalidate()
+
+    @staticmethod
+    def _make_record(emp_id, id_number, first_name, last_name, position, status):
+        return {
+            'id': emp_id,
+            'employee_id_number': id_number,
+            'first_name': first_name,
+            'last_name': last_name,
+            'position': position,
+            'status': status,
+            'label': f"{first_name} {last_name} ({id_number})",
+        }
+
+    @staticmethod
+    def _keys_for(record):
+        first = _normalize(record['first_name'])
+        last = _normalize(record['last_name'])
+        keys = {first, last, f"{first} {last}", f"{last} {first}", _normalize(record['employee_id_number'])}
+        keys.discard('')
+        return [(key, record['id']) for key in keys]
+
+    def build(self):
+        """Rebuilds the whole index with a single narrow query."""
+        with self._lock:
+            started_at = self._sequence
+            self._builds_in_flight += 1
+        try:
+            rows = db.session.query(
+                Employee.id, Employee.employee_id_number, Employee.first_name,
+                Employee.last_name, Employee.position, Employee.status
+            ).all()
+            records = {row[0]: self._make_record(*row) for row in rows}
+            keys = []
+            for record in records.values():
+                keys.extend(self._keys_for(record))
+            keys.sort()
+            with self._lock:
+                self._records = records
+                self._keys = keys
+                self._built_at = _time.monotonic()
+                # The snapshot may predate changes committed while the query ran
+                for sequence, emp_id, record in self._changes:
+                    if sequence > started_at:
+                        self._apply(emp_id, record)
+                if self._invalidated_at > started_at:
+                    self._built_at = None  # invalidated mid-build: the next search builds again
+        finally:
+            with self._lock:
+                self._builds_in_flight -= 1
+                if not self._builds_in_flight:
+                    self._changes = []
+
+    def invalidate(self):
+        with self._lock:
+            self._sequence += 1
+            self._invalidated_at = self._sequence
+            self._built_at = None
+
+    def _ensure_fresh(self, ttl):
+        with self._lock:
+            built_at = self._built_at
+        if built_at is None or (ttl and _time.monotonic() - built_at > ttl):
+            self.build()
+
+    def upsert(self, record):
+        self._change(record['id'], record)
+
+    def remove(self, emp_id):
+        self._change(emp_id, None)
+
+    def _change(self, emp_id, record):
+        with self._lock:
+            self._sequence += 1
+            if self._builds_in_flight:
+                self._changes.append((self._sequence, emp_id, record))
+            if self._built_at is None:
+                return  # Next search rebuilds from the database anyway
+            self._apply(emp_id, record)
+
+    def _apply(self, emp_id, record):
+        self._remove_keys(emp_id)
+        if record is None:
+            self._records.pop(emp_id, None)
+            return
+        self._records[emp_id] = record
+        for entry in self._keys_for(record):
+            insort(self._keys, entry)
+
+    def _remove_keys(self, emp_id):
+        old = self._records.get(emp_id)
+        if not old:
+            return
+        for entry in self._keys_for(old):
+            pos = bisect_left(self._keys, entry)
+            if pos < len(self._keys) and self._keys[pos] == entry:
+                del self._keys[pos]
+
+    def search(self, query, limit=10, ttl=None, status=None):
+        """Returns up to `limit` records whose name or ID number starts with `query`."""
+        needle = _normalize(query)
+        if not needle:
+            return []
+        self._ensure_fresh(ttl)
+        results = []
+        seen = set()
+        with self._lock:
+            pos = bisect_left(self._keys, (needle,))
+            while pos < len(self._keys) and len(results) < limit:
+                key, emp_id = self._keys[pos]
+                if not key.startswith(needle):
+                    break
+                pos += 1
+                if emp_id in seen:
+                    continue
+                seen.add(emp_id)
+                record = self._records[emp_id]
+                if status and record['status'] != status:
+                    continue
+                results.append(record)
+        return results
+
+
+employee_index = EmployeeSearchIndex()
+
+
+# --- ORM EVENTS: keep the index in step with committed changes ---
+
+def _queue_change(target, action):
+    session = object_session(target)
+    if session is None:
+        employee_index.invalidate()
+        return
+    pending = session.info.setdefault(PENDING_KEY, {})
+    if action == 'remove':
+        pending[target.id] = None
+    else:
+        pending[target.id] = EmployeeSearchIndex._make_record(
+            target.id, target.employee_id_number, target.first_name,
+            target.last_name, target.position, target.status
+        )
+
+@event.listens_for(Employee, 'after_insert')
+def _index_employee_insert(mapper, connection, target):
+    _queue_change(target, 'upsert')
+
+@event.listens_for(Employee, 'after_update')
+def _index_employee_update(mapper, connection, target):
+    _queue_change(target, 'upsert')
+
+@event.listens_for(Employee, 'after_delete')
+def _index_employee_delete(mapper, connection, target):
+    _queue_change(target, 'remove')
+
+@event.listens_for(Session, 'after_commit')
+def _apply_pending_changes(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    if not pending:
+        return
+    for emp_id, record in pending.items():
+        if record is None:
+            employee_index.remove(emp_id)
+        else:
+            employee_index.upsert(record)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_changes(session):
+    session.info.pop(PENDING_KEY, None)
@@ -1,12 +1,16 @@
 # app/main/routes.py
 
-from flask import render_template, redirect, url_for, flash, current_app, send_from_directory, abort
+from flask import render_template, redirect, url_for, flash, current_app, send_file, abort, request, jsonify
 from flask_login import login_required, current_user
 from app.main import bp
-from app.models.user import User, Employee, LeaveRequest, AuditLog # Import AuditLog
-from app import db
+from app.models.user import User, Employee, AuditLog # Import AuditLog
+from app import db, cache, refdata
+from app.hr.leave_queue import leave_queue_query, get_pending_leave_count
+from app.timezone import local_timestamps
 from sqlalchemy import func
+import mimetypes
 import os
+import re
 
 @bp.route('/')
 @bp.route('/welcome')
@@ -20,6 +24,18 @@ def welcome():
     return render_template('welcome.html')
 
 
+# Dashboard aggregates, recomputed when an employee is saved (or after the TTL)
+dashboard_cache = cache.namespace('dashboard', ttl=300)
+
+
+def _active_salary_aggregates():
+    """(count, total, average) salary of Active employees, in one query."""
+    count, total, average = db.session.query(
+        func.count(Employee.id), func.sum(Employee.salary_rate), func.avg(Employee.salary_rate)
+    ).filter(Employee.status == 'Active').one()
+    return count, total or 0, average or 0
+
+
 @bp.route('/dashboard')
 @login_required
 def admin_dashboard(): # RENAMED from dashboard()
@@ -27,16 +43,15 @@ def admin_dashboard(): # RENAMED from dashboard()
     if current_user.role != 'Admin':
         return redirect(url_for('employee.dashboard'))
         
-    active_employees = Employee.query.filter_by(status='Active')
-    total_salary_query = active_employees.with_entities(func.sum(Employee.salary_rate)).scalar()
-    total_monthly_salary = total_salary_query if total_salary_query else 0
-    avg_salary_query = active_employees.with_entities(func.avg(Employee.salary_rate)).scalar()
-    average_monthly_salary = avg_salary_query if avg_salary_query else 0
-    employee_count = active_employees.count()
+    employee_count, total_monthly_salary, average_monthly_salary = dashboard_cache.get_or_set(
+        'active_salaries', _active_salary_aggregates, tags=('employees',)
+    )
     
     recent_hires = Employee.query.order_by(Employee.date_hired.desc()).limit(5).all()
     
-    pending_leave_requests = LeaveRequest.query.filter_by(status='Pending').order_by(LeaveRequest.requested_on).all()
+    # Only a preview of the queue is shown here; the badge uses the cached total
+    pending_leave_requests = leave_queue_query('Pending').limit(5).all()
+    pending_leave_count = get_pending_leave_count()
     
     dashboard_data = {
         'total_employees': employee_count,
@@ -45,43 +60,88 @@ def admin_dashboard(): # RENAMED from dashboard()
         'recent_payments': 0, 
         'username': current_user.full_name,
         'recent_hires': recent_hires,
-        'pending_leave_requests': pending_leave_requests
+        'pending_leave_requests': pending_leave_requests,
+        'pending_leave_count': pending_leave_count
     }
 
     # FIX: Explicitly use 'dashboard.html' path for TemplateNotFound fix.
     return render_template('dashboard.html', data=dashboard_data)
 
 
+# Plain "name.ext" with no path separators or leading dots; cheaper than secure_filename().
+SAFE_UPLOAD_NAME = re.compile(r'^[A-Za-z0-9_-]+\.([A-Za-z0-9]+)$')
+# Photos saved by hr.save_picture() are named after the SHA-256 of their bytes.
+CONTENT_HASH_NAME = re.compile(r'^([0-9a-f]{64})\.[a-z0-9]+$')
+
+
+def _send_upload(upload_folder, filename, stat_result):
+    """Builds the file response, honoring the X-Accel-Redirect / X-Sendfile settings."""
+    accel_prefix = current_app.config.get('UPLOAD_ACCEL_REDIRECT_PREFIX')
+    if accel_prefix:
+        # Let nginx stream the file from its internal location
+        response = current_app.response_class(status=200)
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + filename
+        response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        return response
+    # send_file() emits X-Sendfile on its own when USE_X_SENDFILE is enabled
+    return send_file(
+        os.path.join(upload_folder, filename),
+        etag=False,
+        conditional=False,
+        last_modified=stat_result.st_mtime
+    )
+
+
 @bp.route('/uploads/profile_pics/<filename>')
 @login_required
 def get_uploaded_file(filename):
-    """Securely serves files from the upload folder."""
-    from werkzeug.utils import secure_filename
-    
-    # Sanitize filename to prevent path traversal
-    safe_filename = secure_filename(filename)
-    if not safe_filename or safe_filename != filename:
-        abort(404)
-    
-    # Validate file extension
-    _, ext = os.path.splitext(safe_filename)
+    """
+    Serves profile photos with validators and long-lived caching.
+    Content-addressed photos never change, so their hash is the ETag and they are cached as immutable.
+    """
+    match = SAFE_UPLOAD_NAME.match(filename)
     allowed_extensions = current_app.config.get('ALLOWED_EXTENSIONS', {'png', 'jpg', 'jpeg', 'gif'})
-    if ext.lower().lstrip('.') not in allowed_extensions:
+    if not match or match.group(1).lower() not in allowed_extensions:
         abort(404)
     
     upload_folder = current_app.config.get('UPLOAD_FOLDER')
-    file_path = os.path.join(upload_folder, safe_filename)
     
-    # If file doesn't exist, try to serve default.png
-    if not os.path.exists(file_path):
-        if safe_filename != 'default.png':
-            # Try to serve default.png instead
-            default_path = os.path.join(upload_folder, 'default.png')
-            if os.path.exists(default_path):
-                return send_from_directory(upload_folder, 'default.png')
-        abort(404)
+    hash_match = CONTENT_HASH_NAME.match(filename)
+    if hash_match and request.if_none_match.contains(hash_match.group(1)):
+        # The URL pins the content, so a matching ETag is enough: no disk access at all
+        response = current_app.response_class(status=304)
+        response.set_etag(hash_match.group(1))
+        response.headers['Cache-Control'] = f"private, max-age={current_app.config['PHOTO_CACHE_MAX_AGE']}, immutable"
+        return response
+    
+    try:
+        stat_result = os.stat(os.path.join(upload_folder, filename))
+    except OSError:
+        # If file doesn't exist, fall back to default.png
+        if filename == 'default.png':
+            abort(404)
+        filename = 'default.png'
+        hash_match = None
+        try:
+            stat_result = os.stat(os.path.join(upload_folder, filename))
+        except OSError:
+            abort(404)
+    
+    if hash_match:
+        etag = hash_match.group(1)
+        cache_control = f"private, max-age={current_app.config['PHOTO_CACHE_MAX_AGE']}, immutable"
+    else:
+        # Legacy/default names can be overwritten in place, so clients must revalidate
+        etag = f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"
+        cache_control = 'private, no-cache'
     
-    return send_from_directory(upload_folder, safe_filename)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = _send_upload(upload_folder, filename, stat_result)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
 
 
 # --- NEW ROUTE: View Audit Logs ---
@@ -95,7 +155,16 @@ def view_audit_logs():
         
     logs = AuditLog.query.order_by(AuditLog.timestamp.desc()).all()
     
-    return render_template('audit_logs.html', logs=logs)
+    return render_template('audit_logs.html', logs=local_timestamps(logs))
+
+# --- Cache statistics (per namespace, this worker) ---
+@bp.route('/cache/stats')
+@login_required
+def cache_stats():
+    """Hit/miss/eviction counters of this worker's cache, tier sizes and the reference data segment, as JSON."""
+    if current_user.role != 'Admin':
+        abort(403)
+    return jsonify(dict(cache.stats(), refdata=refdata.stats()))
 
 # --- NEW ROUTE: Delete Audit Logs Utility ---
 @bp.route('/audit_logs/delete_all', methods=['POST'])
@@ -1,6 +1,6 @@
 # app/models/user.py
 
-from app import db, login
+from app import db, login, cache
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin 
 from flask import url_for
@@ -8,6 +8,7 @@ from datetime import datetime, time, timedelta
 from decimal import Decimal 
 from sqlalchemy import event, select, func
 from sqlalchemy.orm.attributes import get_history
+from app.timezone import local_date
 
 class User(UserMixin, db.Model): 
     __tablename__ = 'user'
@@ -35,11 +36,11 @@ class Employee(db.Model):
     employee_id_number = db.Column(db.String(20), index=True, unique=True) 
     first_name = db.Column(db.String(64), nullable=False)
     last_name = db.Column(db.String(64), nullable=False)
-    position = db.Column(db.String(64))
+    position = db.Column(db.String(64), index=True)
     date_hired = db.Column(db.Date)
     photo_filename = db.Column(db.String(128), default='default.png')
     salary_rate = db.Column(db.Numeric(10, 2), nullable=False) 
-    status = db.Column(db.String(20), default='Active') 
+    status = db.Column(db.String(20), default='Active', index=True) 
     tin = db.Column(db.String(15)) 
     sss_num = db.Column(db.String(15))
     philhealth_num = db.Column(db.String(15))
@@ -53,12 +54,24 @@ class Employee(db.Model):
     attendance_logs = db.relationship('AttendanceLog', back_populates='employee', lazy='dynamic')
     leave_balances = db.relationship('LeaveBalance', back_populates='employee', lazy='select')
 
+    # Staff directory: default name ordering, and the case-insensitive prefix filter
+    # (range scans on lower(), see hr.routes.prefix_condition)
+    __table_args__ = (
+        db.Index('ix_employee_last_name_first_name', 'last_name', 'first_name'),
+        db.Index('ix_employee_lower_last_name', db.func.lower(last_name)),
+        db.Index('ix_employee_lower_first_name', db.func.lower(first_name)),
+        db.Index('ix_employee_lower_employee_id_number', db.func.lower(employee_id_number)),
+    )
+
     def __repr__(self):
         return f'<Employee {self.employee_id_number}>'
     
     @property
     def photo_url(self):
-        """Returns the URL for the employee's profile photo."""
+        """
+        Returns the URL for the employee's profile photo.
+        Uploaded photos are named by content hash, so the URL changes whenever the photo does.
+        """
         try:
             filename_to_use = self.photo_filename if self.photo_filename else 'default.png'
             return url_for('main.get_uploaded_file', filename=filename_to_use)
@@ -111,9 +124,13 @@ class AttendanceLog(db.Model):
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     event_type = db.Column(db.String(20), nullable=False) 
     source = db.Column(db.String(50), nullable=False, default='Manual') 
+    # Local (TIMEZONE) calendar date of the timestamp, kept in step by a trigger below
+    work_date = db.Column(db.Date, nullable=True, index=True)
     
     employee = db.relationship('Employee', back_populates='attendance_logs')
 
+    __table_args__ = (db.Index('ix_attendance_log_employee_work_date', 'employee_id', 'work_date'),)
+
     def __repr__(self):
         return f'<Log {self.event_type} at {self.timestamp} by {self.employee.employee_id_number}>'
 
@@ -128,12 +145,39 @@ class PayrollRun(db.Model):
     total_deductions = db.Column(db.Numeric(12, 2), default=0.00)
     total_net_pay = db.Column(db.Numeric(12, 2), default=0.00)
     status = db.Column(db.String(20), default='Pending') 
+    
+    # Resume point for chunked runs: last employee id whose chunk has been committed
+    checkpoint_employee_id = db.Column(db.Integer, nullable=True)
+    checkpoint_at = db.Column(db.DateTime, nullable=True)
 
     payslips = db.relationship('Payslip', back_populates='payroll_run', lazy='dynamic')
+    work_items = db.relationship('PayrollWorkItem', back_populates='payroll_run', lazy='dynamic')
     def __repr__(self):
         return f'<PayrollRun {self.pay_period_start}>'
 
 
+class PayrollWorkItem(db.Model):
+    """One chunk of a payroll run (a contiguous employee id range) claimed by a worker under a lease."""
+    __tablename__ = 'payroll_work_item'
+    id = db.Column(db.Integer, primary_key=True)
+    payroll_run_id = db.Column(db.Integer, db.ForeignKey('payroll_run.id'), nullable=False)
+    first_employee_id = db.Column(db.Integer, nullable=False)
+    last_employee_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='Pending')  # Pending / Claimed / Done / Failed
+    lease_owner = db.Column(db.String(64), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    payslip_count = db.Column(db.Integer, nullable=False, default=0)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    payroll_run = db.relationship('PayrollRun', back_populates='work_items')
+
+    __table_args__ = (db.Index('ix_payroll_work_item_run_status', 'payroll_run_id', 'status'),)
+
+    def __repr__(self):
+        return f'<PayrollWorkItem {self.id} run={self.payroll_run_id} {self.status}>'
+
+
 class Payslip(db.Model):
     __tablename__ = 'payslip'
     id = db.Column(db.Integer, primary_key=True)
@@ -155,11 +199,40 @@ class Payslip(db.Model):
     other_deductions = db.Column(db.Numeric(10, 2), default=0.00)
     total_deductions = db.Column(db.Numeric(10, 2), nullable=False)
     net_pay = db.Column(db.Numeric(10, 2), nullable=False)
+
+    # sha256 of everything the calculators read (see app/payroll/fingerprint.py)
+    input_fingerprint = db.Column(db.String(64), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_payslip_run_employee', 'payroll_run_id', 'employee_id'),
+    )
     
     def __repr__(self):
         return f'<Payslip for Employee ID {self.employee_id}>'
 
 
+class YtdLedger(db.Model):
+    """Year-to-date totals of an employee's Processed payslips (maintained by app/payroll/ytd.py)."""
+    __tablename__ = 'ytd_ledger'
+    id = db.Column(db.Integer, primary_key=True)
+    employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)  # calendar year of the run's pay date
+
+    gross_salary = db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+    sss_deduction = db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+    philhealth_deduction = db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+    pagibig_deduction = db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+    withholding_tax = db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+    total_deductions = db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+    net_pay = db.Column(db.Numeric(12, 2), nullable=False, default=0.00)
+    payslip_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('employee_id', 'year', name='_ytd_ledger_employee_year_uc'),)
+
+    def __repr__(self):
+        return f'<YtdLedger {self.year} for Employee ID {self.employee_id}>'
+
+
 class LeaveRequest(db.Model):
     __tablename__ = 'leave_request'
     
@@ -174,6 +247,9 @@ class LeaveRequest(db.Model):
     
     employee = db.relationship('Employee', back_populates='leave_requests')
 
+    # Backs the status-partitioned leave queues (filter by status, order by requested_on)
+    __table_args__ = (db.Index('ix_leave_request_status_requested_on', 'status', 'requested_on'),)
+
     def __repr__(self):
         return f'<LeaveRequest {self.id} by {self.employee.first_name}>'
 
@@ -269,6 +345,14 @@ def count_working_days(start_date, end_date, connection):
     )
     holidays = {row[0] for row in connection.execute(stmt)}
     
+    return count_working_days_excluding(start_date, end_date, holidays)
+
+
+def count_working_days_excluding(start_date, end_date, holidays):
+    """
+    Same count as count_working_days(), against an already-loaded set of holiday dates.
+    Lets batch callers fetch holidays once for many date ranges.
+    """
     total_days = 0
     current = start_date
     while current <= end_date:
@@ -337,4 +421,27 @@ def refund_balance_on_delete(mapper, connection, target):
             lb_table.update()
             .where((lb_table.c.employee_id == target.employee_id) & (lb_table.c.leave_type == target.leave_type))
             .values(used=lb_table.c.used - days_to_process)
-        )
\ No newline at end of file
+        )
+
+
+# =======================================================
+# 4. TRIGGER: ATTENDANCE LOG WORK DATE
+# =======================================================
+
+@event.listens_for(AttendanceLog, 'before_insert')
+@event.listens_for(AttendanceLog, 'before_update')
+def set_attendance_work_date(mapper, connection, target):
+    if target.timestamp is not None:
+        target.work_date = local_date(target.timestamp)
+
+
+# =======================================================
+# 5. CACHE INVALIDATION (see app/cache.py)
+# =======================================================
+# Cached values are tagged with what they were computed from; these tags are
+# invalidated when the session that changed such a row commits.
+
+cache.invalidate_on(Holiday, ('holidays',))
+cache.invalidate_on(Employee, ('employees',))
+cache.invalidate_on(EmployeeSchedule, ('schedules',))
+cache.invalidate_on(LeaveRequest, ('leave_requests',))
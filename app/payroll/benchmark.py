@@ -0,0 +1,184 @@
+# app/payroll/benchmark.py
+
+"""
+Payroll measurements on a synthetic workforce in a scratch SQLite database, so they can
+be reproduced anywhere and never touch the application's data.
+
+scratch_app() builds an app with the caller's configuration on a temporary database,
+and seed_workforce() bulk-inserts employees with a 09:00-18:00 schedule and a clock-in
+and clock-out on every weekday of the pay period.
+
+worker_speedup() processes the same queued run with one and with N local worker
+processes (`flask payroll bench-workers`). Every timed run computes all its payslips:
+the previous run's payslips are deleted first, so none are reused by fingerprint.
+
+payslip_write_memory() records the tracemalloc peak of write_run_payslips() at several
+workforce sizes (`flask payroll bench-memory`); with employees streamed in batches the
+peak should depend on the batch size, not on the number of employees.
+"""
+
+import os
+import shutil
+import tempfile
+import time as _time
+import tracemalloc
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from sqlalchemy import delete, insert
+
+from app import db
+from app.models.user import AttendanceLog, Employee, EmployeeSchedule, PayrollRun, Payslip
+from app.timezone import to_utc
+from .commands import run_worker_processes, worker_app_settings
+from .processing import EMPLOYEE_STREAM_BATCH_SIZE, write_run_payslips
+from .work_queue import enqueue_run
+
+PERIOD_START = date(2025, 3, 1)
+PERIOD_END = date(2025, 3, 15)
+PAY_DATE = date(2025, 3, 20)
+SEED_BATCH_SIZE = 1000
+
+
+def scratch_app(app, directory):
+    """
+    An app with app's configuration on a new SQLite database (and reference data files) in
+    directory. Like any create_app(), it re-initializes the process-wide cache and refdata,
+    so it is meant for one-shot commands and tests.
+    """
+    from app import create_app
+    config_name, overrides = worker_app_settings(app)
+    overrides.update({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'payroll-bench.db'),
+        'REFDATA_PATH': os.path.join(directory, 'refdata.bin'),
+        'CACHE_SHARED_PATH': None,
+    })
+    bench = create_app(config_name, overrides)
+    with bench.app_context():
+        db.create_all()
+    return bench
+
+
+def seed_workforce(count, pay_period_start=PERIOD_START, pay_period_end=PERIOD_END):
+    """
+    Inserts count active employees with schedules and weekday punches (Core inserts, in
+    batches) and commits. Returns their ids.
+    """
+    weekdays = [pay_period_start + timedelta(days=offset)
+                for offset in range((pay_period_end - pay_period_start).days + 1)
+                if (pay_period_start + timedelta(days=offset)).weekday() < 5]
+    employee_ids = []
+    for first in range(0, count, SEED_BATCH_SIZE):
+        numbers = range(first, min(first + SEED_BATCH_SIZE, count))
+        db.session.execute(insert(Employee.__table__), [{
+            'employee_id_number': f'BENCH{number:06d}', 'first_name': f'First{number}',
+            'last_name': f'Last{number}', 'position': 'Staff', 'date_hired': date(2020, 1, 1),
+            'salary_rate': Decimal(20000 + 10 * (number % 1000)), 'status': 'Active',
+        } for number in numbers])
+        ids = [row[0] for row in db.session.query(Employee.id)
+               .filter(Employee.employee_id_number.in_([f'BENCH{number:06d}' for number in numbers]))
+               .order_by(Employee.id)]
+        db.session.execute(insert(EmployeeSchedule.__table__), [{
+            'employee_id': employee_id, 'start_time': time(9), 'end_time': time(18),
+            'work_hours_per_day': Decimal('8.00'),
+        } for employee_id in ids])
+        # work_date is set by an ORM event, which Core inserts skip
+        logs = []
+        for position, employee_id in enumerate(ids):
+            for day in weekdays:
+                clock_in = datetime.combine(day, time(9)) + timedelta(minutes=position % 30)
+                clock_out = datetime.combine(day, time(18)) + timedelta(minutes=position % 45)
+                logs.append({'employee_id': employee_id, 'timestamp': to_utc(clock_in), 'event_type': 'IN',
+                             'source': 'Benchmark', 'work_date': day})
+                logs.append({'employee_id': employee_id, 'timestamp': to_utc(clock_out), 'event_type': 'OUT',
+                             'source': 'Benchmark', 'work_date': day})
+        db.session.execute(insert(AttendanceLog.__table__), logs)
+        db.session.commit()
+        employee_ids.extend(ids)
+    return employee_ids
+
+
+def queue_bench_run(chunk_size):
+    """A Processing run over the benchmark period, queued in chunk_size work items. Returns its id."""
+    run = PayrollRun(pay_period_start=PERIOD_START, pay_period_end=PERIOD_END, pay_date=PAY_DATE, status='Processing')
+    db.session.add(run)
+    db.session.flush()
+    enqueue_run(run, chunk_size)
+    db.session.commit()
+    return run.id
+
+
+def discard_run_payslips(run_id):
+    """Deletes a run's payslips, so the next run of the period computes every payslip again."""
+    db.session.execute(delete(Payslip).where(Payslip.payroll_run_id == run_id)
+                       .execution_options(synchronize_session=False))
+    db.session.commit()
+
+
+def worker_speedup(app, employees=2000, processes=2, chunk_size=50, lease_seconds=300):
+    """
+    Times the same queued run with 1 and with `processes` worker processes on a scratch
+    database of `employees` synthetic employees. Returns {'runs': {process count: {'seconds',
+    'payslips', 'payslips_per_second'}}, 'speedup': one-process time / N-process time}.
+    Process start-up is included in both timings.
+    """
+    directory = tempfile.mkdtemp(prefix='payroll-bench-')
+    try:
+        bench = scratch_app(app, directory)
+        runs = {}
+        with bench.app_context():
+            seed_workforce(employees)
+            for count in (1, processes):
+                run_id = queue_bench_run(chunk_size)
+                started = _time.perf_counter()
+                results = run_worker_processes(bench, count, lease_seconds, run_id)
+                elapsed = _time.perf_counter() - started
+                payslips = sum(result[1] for result in results)
+                runs[count] = {'seconds': round(elapsed, 3), 'payslips': payslips,
+                               'payslips_per_second': round(payslips / max(elapsed, 1e-9), 1)}
+                discard_run_payslips(run_id)
+            db.session.remove()
+        return {'runs': runs, 'speedup': round(runs[1]['seconds'] / max(runs[processes]['seconds'], 1e-9), 2)}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def write_run_peak_memory(app, employees, batch_size=EMPLOYEE_STREAM_BATCH_SIZE):
+    """
+    Seeds `employees` synthetic employees on a scratch database and runs write_run_payslips()
+    for a new run under tracemalloc (the writes are rolled back). Returns {'employees',
+    'payslips', 'peak_bytes', 'seconds'}; peak_bytes is the most Python memory allocated
+    at once during the write, over what was allocated when it started.
+    """
+    directory = tempfile.mkdtemp(prefix='payroll-bench-')
+    try:
+        bench = scratch_app(app, directory)
+        with bench.app_context():
+            seed_workforce(employees)
+            run = PayrollRun(pay_period_start=PERIOD_START, pay_period_end=PERIOD_END, pay_date=PAY_DATE,
+                             status='Processing')
+            db.session.add(run)
+            db.session.flush()
+            tracemalloc.start()
+            try:
+                baseline = tracemalloc.get_traced_memory()[0]
+                started = _time.perf_counter()
+                _, written, _, _ = write_run_payslips(run, batch_size)
+                elapsed = _time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1] - baseline
+            finally:
+                tracemalloc.stop()
+            db.session.rollback()
+            db.session.remove()
+        return {'employees': employees, 'payslips': written, 'peak_bytes': peak, 'seconds': round(elapsed, 3)}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def payslip_write_memory(app, sizes=(1000, 10000), batch_size=EMPLOYEE_STREAM_BATCH_SIZE):
+    """
+    write_run_peak_memory() at each workforce size. Returns the list of results and the
+    ratio of the largest size's peak to the smallest's.
+    """
+    results = [write_run_peak_memory(app, employees, batch_size) for employees in sorted(sizes)]
+    return results, round(results[-1]['peak_bytes'] / max(results[0]['peak_bytes'], 1), 2)
@@ -1,8 +1,14 @@
 # app/payroll/calculator.py
 
+from collections import namedtuple
 from decimal import Decimal
 from datetime import datetime, timedelta, time, date
-from sqlalchemy import func
+
+from app.refdata import refdata
+from app.timezone import local_tz, to_local
+
+# Bump whenever a change here alters computed payslips, so stored input fingerprints stop matching
+CALCULATOR_VERSION = '4'
 
 # --- PHILHEALTH CONTRIBUTION TABLE ---
 PHILHEALTH_RATE = Decimal('0.05')
@@ -99,6 +105,11 @@ def calculate_daily_attendance(logs, schedule, target_date):
                 in_time = None
             # If OUT without IN, ignore it (orphaned OUT) 
 
+    return attendance_metrics(total_time, first_in, scheduled_start, scheduled_hours)
+
+
+def attendance_metrics(total_time, first_in, scheduled_start, scheduled_hours):
+    """Hours, overtime and lateness for one day's (or shift's) worked time."""
     if total_time == timedelta(0):
         return {
             'total_hours': Decimal('0.00'), 'regular_hours': Decimal('0.00'),
@@ -120,15 +131,106 @@ def calculate_daily_attendance(logs, schedule, target_date):
         'late_minutes': late_minutes, 'is_present': True
     }
 
+# --- CORE LOGIC: SHIFT PAIRING (whole period, overnight shifts) ---
+# A punch belongs to the work date whose scheduled start is nearest (within 12 hours either way),
+# so a 22:00-06:00 shift is one shift of the day it starts on.
+SHIFT_ANCHOR_WINDOW = timedelta(hours=12)
+# An IN still open after this long is a forgotten clock-out: it is dropped rather than paired
+MAX_SHIFT_LENGTH = timedelta(hours=20)
+
+def shift_anchor_date(timestamp, start_time):
+    offset = timedelta(hours=start_time.hour, minutes=start_time.minute, seconds=start_time.second)
+    return (timestamp - offset + SHIFT_ANCHOR_WINDOW).date()
+
+def shift_log_window(pay_period_start, pay_period_end):
+    """Work dates of the logs that can belong to shifts of the period (one day of slack each side)."""
+    return pay_period_start - timedelta(days=1), pay_period_end + timedelta(days=1)
+
+# A punch in local time: schedules are local, logs are stored in UTC
+Punch = namedtuple('Punch', 'timestamp event_type')
+
+def local_punches(logs, tz=None):
+    tz = tz or local_tz()
+    return [Punch(to_local(log.timestamp, tz), log.event_type) for log in logs]
+
+def iter_shifts(logs, schedule):
+    """
+    Pairs one employee's punches in a single pass and yields (work_date, metrics) per shift.
+
+    logs must be in time order. An IN opens a pair and the next OUT closes it, whichever
+    calendar day it falls on; the shift is dated by the IN that started it (see
+    shift_anchor_date). Several pairs on the same work date add up, as with breaks. An IN
+    while one is open restarts the pair if it anchors to the same work date (a duplicate
+    IN); an IN anchored to another date starts that date's shift, and the open IN is a
+    forgotten clock-out. Orphan OUTs, duplicate INs and INs never closed (or left open past
+    MAX_SHIFT_LENGTH) are not paid and are counted in metrics['orphan_punches'].
+    Metrics are those of calculate_daily_attendance(), plus first_in / last_out.
+    """
+    start_time = schedule.start_time if schedule else time(9, 0, 0)
+    scheduled_hours = schedule.work_hours_per_day if schedule else Decimal('8.00')
+
+    work_date = None
+    first_in = last_out = in_time = None
+    total_time = timedelta(0)
+    orphans = 0
+
+    def finish():
+        metrics = attendance_metrics(total_time, first_in, datetime.combine(work_date, start_time), scheduled_hours)
+        metrics.update(first_in=first_in, last_out=last_out, orphan_punches=orphans + (1 if in_time else 0))
+        return work_date, metrics
+
+    for log in logs:
+        timestamp = log.timestamp
+        if in_time and timestamp - in_time > MAX_SHIFT_LENGTH:
+            orphans += 1
+            in_time = None
+
+        if log.event_type == 'IN':
+            anchor = shift_anchor_date(timestamp, start_time)
+            if anchor != work_date:
+                if in_time is not None:
+                    orphans += 1  # forgotten clock-out on the previous work date
+                    in_time = None
+                if work_date is not None:
+                    yield finish()
+                work_date, first_in, last_out = anchor, None, None
+                total_time, orphans = timedelta(0), 0
+            elif in_time is not None:
+                orphans += 1  # duplicate IN: pay from the latest one
+            first_in = first_in or timestamp
+            in_time = timestamp
+        elif log.event_type == 'OUT':
+            if in_time:
+                total_time += timestamp - in_time
+                last_out = timestamp
+                in_time = None
+            else:
+                anchor = shift_anchor_date(timestamp, start_time)
+                if anchor != work_date:
+                    # An OUT alone on another day still marks that day as having punches
+                    if work_date is not None:
+                        yield finish()
+                    work_date, first_in, last_out = anchor, None, None
+                    total_time, orphans = timedelta(0), 0
+                orphans += 1
+
+    if work_date is not None:
+        yield finish()
+
+# --- HOLIDAYS ---
+def period_holiday_map(start, end):
+    """{date: holiday type} for the holidays in [start, end], from the shared reference data."""
+    return refdata.current().holidays_between(start, end)
+
 # --- UPDATED FUNCTION: PERIOD CALCULATION (Includes Holidays) ---
 def calculate_payroll_time_for_period(employee, pay_period_start, pay_period_end):
-    from app.models.user import AttendanceLog, LeaveRequest, Holiday 
+    from app.models.user import AttendanceLog, LeaveRequest
     
+    window_start, window_end = shift_log_window(pay_period_start, pay_period_end)
     all_logs = AttendanceLog.query.filter(
         AttendanceLog.employee_id == employee.id,
-        func.date(AttendanceLog.timestamp) >= pay_period_start,
-        func.date(AttendanceLog.timestamp) <= pay_period_end
-    ).all()
+        AttendanceLog.work_date.between(window_start, window_end)
+    ).order_by(AttendanceLog.timestamp, AttendanceLog.id).all()
     
     approved_leaves = LeaveRequest.query.filter(
         LeaveRequest.employee_id == employee.id,
@@ -137,17 +239,13 @@ def calculate_payroll_time_for_period(employee, pay_period_start, pay_period_end
         LeaveRequest.end_date >= pay_period_start
     ).all()
 
-    period_holidays = Holiday.query.filter(
-        Holiday.date >= pay_period_start,
-        Holiday.date <= pay_period_end
-    ).all()
-    holiday_map = {h.date: h.type for h in period_holidays}
+    holiday_map = period_holiday_map(pay_period_start, pay_period_end)
 
-    daily_logs = {}
-    for log in all_logs:
-        d = log.timestamp.date()
-        if d not in daily_logs: daily_logs[d] = []
-        daily_logs[d].append(log)
+    # Shifts are dated by their start, so an overnight shift is not split at midnight
+    shifts = {}
+    for work_date, metrics in iter_shifts(local_punches(all_logs), employee.schedules):
+        if pay_period_start <= work_date <= pay_period_end:
+            shifts[work_date] = metrics
 
     total_reg_hours = Decimal('0.00')
     total_ot_hours = Decimal('0.00')
@@ -170,10 +268,9 @@ def calculate_payroll_time_for_period(employee, pay_period_start, pay_period_end
                 break
         
         holiday_type = holiday_map.get(current_date)
-        logs = daily_logs.get(current_date, [])
+        metrics = shifts.get(current_date)
         
-        if logs:
-            metrics = calculate_daily_attendance(logs, employee.schedules, current_date)
+        if metrics:
             total_reg_hours += metrics['regular_hours']
             total_ot_hours += metrics['overtime_hours']
             total_late_minutes += metrics['late_minutes']
@@ -0,0 +1,323 @@
+# app/payroll/commands.py
+
+import multiprocessing
+import os
+import time as _time
+
+import click
+from flask import current_app
+
+from app.payroll import bp
+from app import db
+from app.models.user import PayrollRun
+from .processing import (EMPLOYEE_STREAM_BATCH_SIZE, active_employee_chunk, process_chunk, recalculate_run_totals,
+                         find_resumable_run)
+from .work_queue import (MAX_ATTEMPTS, enqueue_run, run_worker, finalize_run_if_complete, queue_status,
+                         requeue_failed_items)
+from .documents import generate_payslip_archive
+from .ytd import LEDGER_FIELDS, check_ledger, rebuild_ledger
+
+DATE = click.DateTime(formats=['%Y-%m-%d'])
+
+
+@bp.cli.command('run')
+@click.option('--start', 'pay_period_start', type=DATE, help='Pay period start (YYYY-MM-DD).')
+@click.option('--end', 'pay_period_end', type=DATE, help='Pay period end (YYYY-MM-DD).')
+@click.option('--pay-date', 'pay_date', type=DATE, help='Payment date (YYYY-MM-DD).')
+@click.option('--chunk-size', default=500, show_default=True, type=click.IntRange(min=1),
+              help='Employees processed (and committed) per chunk.')
+@click.option('--run-id', type=int, help='Resume this payroll run instead of looking one up by period.')
+@click.option('--new', 'force_new', is_flag=True,
+              help='Start a fresh run even if an unfinished one exists for the same period.')
+def run_payroll_command(pay_period_start, pay_period_end, pay_date, chunk_size, run_id, force_new):
+    """Process a payroll run headlessly, committing a checkpoint after every chunk.
+
+    If the process dies, run the same command again: it resumes the unfinished
+    run after the last committed chunk instead of starting over.
+    """
+    if run_id is not None:
+        run = db.session.get(PayrollRun, run_id)
+        if run is None:
+            raise click.ClickException(f'Payroll run #{run_id} not found.')
+        if run.status == 'Processed':
+            raise click.ClickException(f'Payroll run #{run_id} is already processed.')
+    else:
+        if not (pay_period_start and pay_period_end and pay_date):
+            raise click.UsageError('--start, --end and --pay-date are required unless --run-id is given.')
+        pay_period_start, pay_period_end, pay_date = pay_period_start.date(), pay_period_end.date(), pay_date.date()
+        if pay_period_end < pay_period_start:
+            raise click.UsageError('Pay period end date must be on or after start date.')
+        if pay_date < pay_period_end:
+            click.echo('Warning: Payment date is before pay period end. Please verify.')
+        run = None if force_new else find_resumable_run(pay_period_start, pay_period_end, pay_date)
+
+    if run is None:
+        run = PayrollRun(
+            pay_period_start=pay_period_start,
+            pay_period_end=pay_period_end,
+            pay_date=pay_date,
+            status='Processing'
+        )
+        db.session.add(run)
+        db.session.commit()
+        click.echo(f'Started payroll run #{run.id} ({run.pay_period_start} to {run.pay_period_end}).')
+    else:
+        already_saved = run.payslips.count()
+        click.echo(f'Resuming payroll run #{run.id} after employee id {run.checkpoint_employee_id} '
+                   f'({already_saved} payslips already saved).')
+
+    processed = 0
+    reused = 0
+    started = _time.perf_counter()
+    try:
+        while True:
+            chunk_started = _time.perf_counter()
+            employees = active_employee_chunk(run.checkpoint_employee_id, chunk_size)
+            if not employees:
+                break
+            _, skipped, chunk_reused = process_chunk(run, employees)
+            db.session.commit()
+
+            processed += len(employees)
+            reused += chunk_reused
+            for emp in skipped:
+                click.echo(f'  Skipped {emp.first_name} {emp.last_name} ({emp.employee_id_number}): invalid salary rate.')
+            chunk_rate = len(employees) / max(_time.perf_counter() - chunk_started, 1e-9)
+            overall_rate = processed / max(_time.perf_counter() - started, 1e-9)
+            click.echo(f'  Checkpoint at employee id {run.checkpoint_employee_id}: {processed} employees this session '
+                       f'({chunk_rate:,.1f}/s chunk, {overall_rate:,.1f}/s overall).')
+    except (Exception, KeyboardInterrupt) as e:
+        db.session.rollback()
+        click.echo(f'Payroll run #{run.id} interrupted: {e!r}', err=True)
+        click.echo('Completed chunks are saved; re-run the same command to resume.', err=True)
+        raise SystemExit(1)
+
+    payslip_count = recalculate_run_totals(run)
+    run.status = 'Processed'
+    db.session.commit()
+
+    elapsed = _time.perf_counter() - started
+    click.echo(f'Payroll run #{run.id} processed: {payslip_count} payslips, '
+               f'gross {run.total_gross_pay:,.2f}, deductions {run.total_deductions:,.2f}, net {run.total_net_pay:,.2f}.')
+    click.echo(f'{processed} employees in {elapsed:,.1f}s ({processed / max(elapsed, 1e-9):,.1f} employees/s) this session; '
+               f'{reused} unchanged payslips reused from earlier runs of this period.')
+
+
+# --- SHARED WORK QUEUE (multiple processes / nodes per run) ---
+
+@bp.cli.command('enqueue')
+@click.option('--start', 'pay_period_start', type=DATE, required=True, help='Pay period start (YYYY-MM-DD).')
+@click.option('--end', 'pay_period_end', type=DATE, required=True, help='Pay period end (YYYY-MM-DD).')
+@click.option('--pay-date', 'pay_date', type=DATE, required=True, help='Payment date (YYYY-MM-DD).')
+@click.option('--chunk-size', default=200, show_default=True, type=click.IntRange(min=1),
+              help='Employees per work item.')
+def enqueue_payroll_command(pay_period_start, pay_period_end, pay_date, chunk_size):
+    """Create a payroll run split into work items for 'flask payroll work' to process."""
+    if pay_period_end < pay_period_start:
+        raise click.UsageError('Pay period end date must be on or after start date.')
+    run = PayrollRun(
+        pay_period_start=pay_period_start.date(),
+        pay_period_end=pay_period_end.date(),
+        pay_date=pay_date.date(),
+        status='Processing'
+    )
+    db.session.add(run)
+    db.session.flush()
+    item_count = enqueue_run(run, chunk_size)
+    if not item_count:
+        db.session.rollback()
+        raise click.ClickException('No active employees found. Payroll run cancelled.')
+    db.session.commit()
+    click.echo(f'Payroll run #{run.id} queued as {item_count} work items of up to {chunk_size} employees.')
+    click.echo(f'Start workers with: flask payroll work --run-id {run.id} [--processes N]')
+
+
+# Settings a worker child must share with its parent (they can differ from what the environment gives),
+# including the files the processes of one host share
+WORKER_CONFIG_KEYS = ('SQLALCHEMY_DATABASE_URI', 'SQLALCHEMY_ENGINE_OPTIONS', 'TIMEZONE',
+                      'REFDATA_PATH', 'CACHE_SHARED_PATH', 'JINJA_BYTECODE_CACHE_DIR')
+
+
+def worker_app_settings(app):
+    """(config name, overrides) that rebuild app's configuration in a worker child."""
+    overrides = {key: app.config[key] for key in WORKER_CONFIG_KEYS if key in app.config}
+    return app.config['CONFIG_NAME'], overrides
+
+
+def _work_in_subprocess(config_name, config_overrides, lease_seconds, run_id):
+    """Entry point for --processes children: each builds its own app and DB connections."""
+    from app import create_app
+    app = create_app(config_name, config_overrides)
+    with app.app_context():
+        return run_worker(lease_seconds, run_id)
+
+
+def run_worker_processes(app, processes, lease_seconds, run_id=None):
+    """Runs run_worker() in `processes` spawned children with app's settings; returns their results."""
+    config_name, config_overrides = worker_app_settings(app)
+    # spawn: children must not share the parent's database connections
+    with multiprocessing.get_context('spawn').Pool(processes) as pool:
+        return pool.starmap(_work_in_subprocess, [(config_name, config_overrides, lease_seconds, run_id)] * processes)
+
+
+@bp.cli.command('work')
+@click.option('--run-id', type=int, help='Only work on this payroll run (default: any queued run).')
+@click.option('--lease-seconds', default=300, show_default=True, type=click.IntRange(min=1),
+              help='How long a claimed item is reserved before other workers may reclaim it.')
+@click.option('--processes', default=1, show_default=True, type=click.IntRange(min=1),
+              help='Local worker processes to start on this machine.')
+def work_payroll_command(run_id, lease_seconds, processes):
+    """Claim and process queued payroll work items until the queue is empty.
+
+    Safe to start on any number of machines against the same database.
+    """
+    started = _time.perf_counter()
+    if processes == 1:
+        items_done, payslips_written, reused = run_worker(lease_seconds, run_id, log=click.echo)
+    else:
+        results = run_worker_processes(current_app._get_current_object(), processes, lease_seconds, run_id)
+        items_done = sum(result[0] for result in results)
+        payslips_written = sum(result[1] for result in results)
+        reused = sum(result[2] for result in results)
+        if run_id is not None and finalize_run_if_complete(run_id):
+            click.echo(f'Finalized payroll run #{run_id}.')
+    elapsed = _time.perf_counter() - started
+    click.echo(f'{processes} process(es) completed {items_done} work items, {payslips_written} payslips '
+               f'in {elapsed:,.1f}s ({payslips_written / max(elapsed, 1e-9):,.1f} payslips/s); '
+               f'{reused} unchanged payslips reused from earlier runs of this period.')
+
+
+@bp.cli.command('queue-status')
+@click.argument('run_id', type=int)
+def queue_status_command(run_id):
+    """Show work item progress for a queued payroll run (and finalize it if complete)."""
+    run = db.session.get(PayrollRun, run_id)
+    if run is None:
+        raise click.ClickException(f'Payroll run #{run_id} not found.')
+    counts = queue_status(run_id)
+    click.echo(f'Payroll run #{run_id}: {run.status}')
+    for status in ('Pending', 'Claimed', 'Done', 'Failed'):
+        click.echo(f'  {status:<8} {counts.get(status, 0)}')
+    if counts.get('Expired'):
+        click.echo(f"  ({counts['Expired']} claimed item(s) have an expired lease; the next worker reclaims them)")
+    if run.status == 'Processing' and finalize_run_if_complete(run_id):
+        click.echo(f'All work items are done; payroll run #{run_id} finalized.')
+    elif run.status == 'Processing' and counts.get('Failed'):
+        click.echo(f"Stuck: {counts['Failed']} work item(s) failed {MAX_ATTEMPTS} times, so the run cannot be "
+                   f'finalized. Fix the cause (see the worker logs), then run '
+                   f"'flask payroll requeue-failed {run_id}' and start workers again.")
+
+
+@bp.cli.command('requeue-failed')
+@click.argument('run_id', type=int)
+def requeue_failed_command(run_id):
+    """Put a run's Failed work items back in the queue with a fresh attempt count."""
+    run = db.session.get(PayrollRun, run_id)
+    if run is None:
+        raise click.ClickException(f'Payroll run #{run_id} not found.')
+    if run.status != 'Processing':
+        raise click.ClickException(f'Payroll run #{run_id} is {run.status}, not Processing.')
+    requeued = requeue_failed_items(run_id)
+    db.session.commit()
+    click.echo(f'Requeued {requeued} failed work item(s) of payroll run #{run_id}.')
+    if requeued:
+        click.echo(f'Start workers with: flask payroll work --run-id {run_id} [--processes N]')
+
+
+@bp.cli.command('bench-workers')
+@click.option('--employees', default=2000, show_default=True, type=click.IntRange(min=1),
+              help='Synthetic employees in the scratch database.')
+@click.option('--processes', default=2, show_default=True, type=click.IntRange(min=2),
+              help='Worker processes to compare with a single one.')
+@click.option('--chunk-size', default=50, show_default=True, type=click.IntRange(min=1),
+              help='Employees per work item.')
+def bench_workers_command(employees, processes, chunk_size):
+    """Time one queued run with 1 and with N worker processes on a scratch database."""
+    from .benchmark import worker_speedup
+    result = worker_speedup(current_app._get_current_object(), employees, processes, chunk_size)
+    for count, run in result['runs'].items():
+        click.echo(f"{count} process(es): {run['payslips']} payslips in {run['seconds']:,.2f}s "
+                   f"({run['payslips_per_second']:,.1f} payslips/s)")
+    click.echo(f"Speedup with {processes} processes: {result['speedup']:.2f}x on {os.cpu_count()} CPU(s).")
+
+
+@bp.cli.command('bench-memory')
+@click.option('--employees', multiple=True, type=click.IntRange(min=1),
+              help='Workforce size to measure (repeatable; default: 1000 and 10000).')
+@click.option('--batch-size', default=EMPLOYEE_STREAM_BATCH_SIZE, show_default=True, type=click.IntRange(min=1),
+              help='Employees streamed per batch.')
+def bench_memory_command(employees, batch_size):
+    """Peak Python memory of writing a run's payslips, at several workforce sizes, on scratch databases."""
+    from .benchmark import payslip_write_memory
+    results, ratio = payslip_write_memory(current_app._get_current_object(), employees or (1000, 10000), batch_size)
+    for result in results:
+        click.echo(f"{result['employees']:>8,} employees: peak {result['peak_bytes'] / 1024 / 1024:,.2f} MiB, "
+                   f"{result['payslips']:,} payslips in {result['seconds']:,.2f}s")
+    click.echo(f'Largest / smallest peak: {ratio:.2f}x')
+
+
+# --- PRINTABLE PAYSLIPS ---
+
+@bp.cli.command('documents')
+@click.argument('run_id', type=int)
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True),
+              help='Zip file to write (default: payslips-run-<id>.zip).')
+@click.option('--processes', type=click.IntRange(min=1), help='Rendering processes (default: CPU count).')
+@click.option('--batch-size', default=200, show_default=True, type=click.IntRange(min=1),
+              help='Payslips read and rendered per batch.')
+def payslip_documents_command(run_id, output, processes, batch_size):
+    """Render every payslip of a payroll run to PDF and bundle them in one zip archive."""
+    run = db.session.get(PayrollRun, run_id)
+    if run is None:
+        raise click.ClickException(f'Payroll run #{run_id} not found.')
+    output = output or f'payslips-run-{run_id}.zip'
+    total = run.payslips.count()
+    if not total:
+        raise click.ClickException(f'Payroll run #{run_id} has no payslips.')
+    click.echo(f'Rendering {total} payslips for run #{run_id} into {output}...')
+
+    reported = [0]
+
+    def progress(written, elapsed):
+        # Roughly every 5000 documents, plus the last batch
+        if written - reported[0] >= 5000 or written == total:
+            reported[0] = written
+            click.echo(f'  {written}/{total} documents ({written / max(elapsed, 1e-9):,.1f} docs/s)')
+
+    written, elapsed = generate_payslip_archive(run_id, output, processes, batch_size, log=progress)
+    click.echo(f'Wrote {written} payslips to {output} in {elapsed:,.1f}s '
+               f'({written / max(elapsed, 1e-9):,.1f} docs/s, {os.path.getsize(output) / 1e6:,.1f} MB).')
+
+
+@bp.cli.command('ytd-check')
+@click.option('--year', type=int, help='Only check this calendar year.')
+@click.option('--fix', is_flag=True, help='Replace the ledger with the rebuilt totals when they differ.')
+@click.option('--limit', default=20, show_default=True, type=click.IntRange(min=0),
+              help='Differences to print.')
+def ytd_check_command(year, fix, limit):
+    """Rebuild the year-to-date ledger from the payslips and diff it with the stored one."""
+    started = _time.perf_counter()
+    differences = check_ledger(year)
+    scope = f'year {year}' if year else 'all years'
+    if not differences:
+        click.echo(f'YTD ledger is consistent ({scope}, checked in {_time.perf_counter() - started:,.1f}s).')
+        return
+
+    click.echo(f'YTD ledger differs from the payslips for {len(differences)} employee-year(s) ({scope}):')
+    for (employee_id, row_year), stored, expected in differences[:limit]:
+        click.echo(f'  employee #{employee_id} {row_year}:')
+        stored_amounts, stored_count = stored or ((0,) * len(LEDGER_FIELDS), 0)
+        expected_amounts, expected_count = expected or ((0,) * len(LEDGER_FIELDS), 0)
+        if stored_count != expected_count:
+            click.echo(f'    payslips: ledger {stored_count}, payslips {expected_count}')
+        for name, have, want in zip(LEDGER_FIELDS, stored_amounts, expected_amounts):
+            if have != want:
+                click.echo(f'    {name}: ledger {have:,.2f}, payslips {want:,.2f}')
+    if len(differences) > limit:
+        click.echo(f'  ... and {len(differences) - limit} more.')
+
+    if not fix:
+        raise click.ClickException('Run again with --fix to rebuild the ledger.')
+    rows = rebuild_ledger(year)
+    db.session.commit()
+    click.echo(f'Rebuilt the YTD ledger ({rows} rows).')
@@ -0,0 +1,219 @@
+# app/payroll/documents.py
+
+"""
+Printable payslips for a whole payroll run.
+
+Each payslip is rendered to a small self-contained PDF (one page, built-in
+Helvetica/Courier fonts, Flate-compressed content) by a dependency-free writer.
+Rendering runs in a process pool; the parent streams payslip rows from the
+database in batches, keeps only a fixed number of batches in flight and appends
+finished documents to a zip archive on disk, so memory stays flat however large
+the run is.
+"""
+
+import os
+import time as _time
+import zlib
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.models.user import Employee, PayrollRun, Payslip
+
+# Columns copied into each (picklable) payslip record sent to the workers
+DOCUMENT_COLUMNS = (
+    Payslip.id, Employee.employee_id_number, Employee.first_name, Employee.last_name,
+    Employee.position, Employee.salary_rate,
+    PayrollRun.pay_period_start, PayrollRun.pay_period_end, PayrollRun.pay_date,
+    Payslip.regular_hours, Payslip.overtime_hours, Payslip.late_deductions, Payslip.gross_salary,
+    Payslip.sss_deduction, Payslip.philhealth_deduction, Payslip.pagibig_deduction,
+    Payslip.withholding_tax, Payslip.total_deductions, Payslip.net_pay
+)
+
+PAGE_WIDTH = 612   # US Letter, points
+PAGE_HEIGHT = 792
+MARGIN = 56
+
+
+# --- MINIMAL PDF WRITER ---
+
+def _pdf_text(text):
+    """Literal string for a PDF content stream (WinAnsi encoded, delimiters escaped)."""
+    raw = str(text).encode('cp1252', errors='replace')
+    return b'(' + raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def build_pdf(lines):
+    """
+    One-page PDF from [(font, size, x, y, text)], font being 'F1' (Helvetica),
+    'F2' (Helvetica-Bold) or 'F3' (Courier). Returns the file as bytes.
+    """
+    content = bytearray()
+    for font, size, x, y, text in lines:
+        content += b'BT /%s %d Tf %.2f %.2f Td %s Tj ET\n' % (font.encode(), size, x, y, _pdf_text(text))
+    stream = zlib.compress(bytes(content), 6)
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+        b'/Resources << /Font << /F1 4 0 R /F2 5 0 R /F3 6 0 R >> >> /Contents 7 0 R >>' % (PAGE_WIDTH, PAGE_HEIGHT),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>',
+        b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(stream) + stream + b'\nendstream',
+    ]
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref_at = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_at)
+    return bytes(out)
+
+
+# --- PAYSLIP LAYOUT ---
+
+def _money(value):
+    return f"PHP {value or 0:,.2f}"
+
+
+def _date(value, fmt='%b %d, %Y'):
+    return value.strftime(fmt) if value else 'N/A'
+
+
+def render_payslip_pdf(record):
+    """PDF bytes for one payslip record (a row of DOCUMENT_COLUMNS)."""
+    (slip_id, id_number, first_name, last_name, position, salary_rate,
+     period_start, period_end, pay_date, regular_hours, overtime_hours, late_deductions, gross_salary,
+     sss, philhealth, pagibig, tax, total_deductions, net_pay) = record
+    overtime_pay = float(overtime_hours or 0) * (float(salary_rate or 0) / 160) * 1.25
+    right = PAGE_WIDTH - MARGIN
+
+    lines = []
+    y = PAGE_HEIGHT - MARGIN
+
+    def text(value, font='F1', size=10, x=MARGIN):
+        lines.append((font, size, x, y, value))
+
+    def row(label, amount, font='F1'):
+        nonlocal y
+        text(label, font)
+        # Courier is monospaced (0.6 em per glyph), so amounts can be right-aligned exactly
+        text(amount, 'F3', 10, right - len(amount) * 6.0)
+        y -= 16
+
+    text(f'Payslip #{slip_id}', 'F2', 18)
+    y -= 26
+    text(f'{first_name} {last_name}', 'F2', 12)
+    y -= 16
+    text(f'Employee ID: {id_number} | Position: {position}')
+    y -= 16
+    text(f'Period: {_date(period_start, "%b %d")} - {_date(period_end)} | Paid Date: {_date(pay_date, "%Y-%m-%d")}')
+    y -= 30
+
+    text('Earnings', 'F2', 12)
+    y -= 18
+    row('Basic Monthly Salary', _money(salary_rate))
+    row(f'Overtime Pay ({overtime_hours or 0:,.2f} hrs)', _money(overtime_pay))
+    row('Total Gross Pay (Adjusted)', _money(gross_salary), 'F2')
+    y -= 14
+
+    text('Deductions', 'F2', 12)
+    y -= 18
+    row('SSS Contribution', _money(sss))
+    row('PhilHealth Contribution', _money(philhealth))
+    row('Pag-IBIG Contribution', _money(pagibig))
+    row('Withholding Tax (BIR)', _money(tax))
+    row('Late Deduction Penalty', _money(late_deductions))
+    row('Total Deductions', _money(total_deductions), 'F2')
+    y -= 14
+
+    row('NET PAY', _money(net_pay), 'F2')
+    return build_pdf(lines)
+
+
+def document_name(record):
+    slip_id, id_number = record[0], record[1]
+    pay_date = record[8]
+    return secure_filename(f"{id_number}_{_date(pay_date, '%Y-%m-%d')}_payslip-{slip_id}.pdf")
+
+
+def render_payslip_batch(records):
+    """Worker entry point: [(zip member name, PDF bytes)] for a batch of records."""
+    return [(document_name(record), render_payslip_pdf(record)) for record in records]
+
+
+# --- BATCH GENERATION ---
+
+def payslip_record_batches(run_id, batch_size):
+    """Yields lists of payslip records for a run, read with a server-side cursor."""
+    query = db.session.query(*DOCUMENT_COLUMNS)\
+        .join(Employee, Payslip.employee_id == Employee.id)\
+        .join(PayrollRun, Payslip.payroll_run_id == PayrollRun.id)\
+        .filter(Payslip.payroll_run_id == run_id)\
+        .order_by(Payslip.id)\
+        .execution_options(yield_per=batch_size)
+    batch = []
+    for row in query:
+        batch.append(tuple(row))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _write_archive(run_id, path, processes, batch_size, started, log):
+    max_in_flight = processes * 2
+    written = 0
+    # PDFs are already compressed, so members are stored rather than deflated again
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED) as archive:
+        def drain(future):
+            nonlocal written
+            for name, data in future.result():
+                archive.writestr(name, data)
+                written += 1
+            if log:
+                log(written, _time.perf_counter() - started)
+
+        with ProcessPoolExecutor(max_workers=processes,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            in_flight = deque()
+            for batch in payslip_record_batches(run_id, batch_size):
+                if len(in_flight) >= max_in_flight:
+                    drain(in_flight.popleft())
+                in_flight.append(pool.submit(render_payslip_batch, batch))
+            while in_flight:
+                drain(in_flight.popleft())
+    return written
+
+
+def generate_payslip_archive(run_id, output_path, processes=None, batch_size=200, log=None):
+    """
+    Renders every payslip of a run into a zip of PDFs at output_path.
+
+    At most two batches per worker are in flight, so memory does not grow with the
+    run size. The archive is written to '<output_path>.part' and renamed when complete.
+    log(documents written, seconds elapsed) is called after every batch.
+    Returns (documents written, seconds elapsed).
+    """
+    processes = processes or os.cpu_count() or 1
+    partial_path = output_path + '.part'
+    started = _time.perf_counter()
+    try:
+        written = _write_archive(run_id, partial_path, processes, batch_size, started, log)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    os.replace(partial_path, output_path)
+    return written, _time.perf_counter() - started
@@ -0,0 +1,79 @@
+# app/payroll/fingerprint.py
+
+"""
+Input fingerprints for payslips.
+
+A fingerprint hashes everything calculate_payroll_time_for_period() and
+calculate_payroll_for_employee() read for one employee and period: salary rate,
+schedule, the attendance logs its shifts can use (ids, timestamps, event types), approved
+leaves overlapping the period, the period's holidays, the timezone and CALCULATOR_VERSION.
+If none of those changed, a previous payslip for the same period is still correct.
+"""
+
+import hashlib
+from collections import defaultdict
+
+from app import db
+from app.models.user import AttendanceLog, LeaveRequest
+from app.timezone import configured_timezone_name
+from .calculator import CALCULATOR_VERSION, period_holiday_map, shift_log_window
+
+
+def _period_holidays_key(pay_period_start, pay_period_end):
+    holidays = period_holiday_map(pay_period_start, pay_period_end)
+    return ';'.join(f'{day.isoformat()}:{holiday_type}' for day, holiday_type in sorted(holidays.items()))
+
+
+def _schedule_key(employee):
+    schedule = employee.schedules
+    if schedule is None:
+        return 'no-schedule'
+    return f'{schedule.start_time}-{schedule.end_time}/{schedule.work_hours_per_day}'
+
+
+def chunk_fingerprints(employees, pay_period_start, pay_period_end):
+    """
+    Fingerprint (sha256 hex) per employee id for a chunk of employees.
+    Uses one query for the chunk's logs, one for its approved leaves and the period holidays from the shared reference data,
+    with the same filters the calculator applies.
+    """
+    ids = [emp.id for emp in employees]
+    if not ids:
+        return {}
+
+    window_start, window_end = shift_log_window(pay_period_start, pay_period_end)
+    logs = defaultdict(list)
+    for emp_id, log_id, timestamp, event_type in db.session.query(
+        AttendanceLog.employee_id, AttendanceLog.id, AttendanceLog.timestamp, AttendanceLog.event_type
+    ).filter(
+        AttendanceLog.employee_id.in_(ids),
+        AttendanceLog.work_date.between(window_start, window_end)
+    ).order_by(AttendanceLog.employee_id, AttendanceLog.id):
+        logs[emp_id].append(f'{log_id}@{timestamp.isoformat()}:{event_type}')
+
+    leaves = defaultdict(list)
+    for emp_id, leave_id, start_date, end_date in db.session.query(
+        LeaveRequest.employee_id, LeaveRequest.id, LeaveRequest.start_date, LeaveRequest.end_date
+    ).filter(
+        LeaveRequest.employee_id.in_(ids),
+        LeaveRequest.status == 'Approved',
+        LeaveRequest.start_date <= pay_period_end,
+        LeaveRequest.end_date >= pay_period_start
+    ).order_by(LeaveRequest.employee_id, LeaveRequest.id):
+        leaves[emp_id].append(f'{leave_id}:{start_date.isoformat()}..{end_date.isoformat()}')
+
+    holidays_key = _period_holidays_key(pay_period_start, pay_period_end)
+    fingerprints = {}
+    for emp in employees:
+        parts = (
+            CALCULATOR_VERSION,
+            configured_timezone_name(),
+            f'{pay_period_start.isoformat()}..{pay_period_end.isoformat()}',
+            str(emp.salary_rate),
+            _schedule_key(emp),
+            holidays_key,
+            '|'.join(logs[emp.id]),
+            '|'.join(leaves[emp.id]),
+        )
+        fingerprints[emp.id] = hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+    return fingerprints
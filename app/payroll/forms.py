@@ -9,4 +9,5 @@ class RunPayrollForm(FlaskForm):
     pay_period_start = DateField('Pay Period Start', format='%Y-%m-%d', validators=[DataRequired()])
     pay_period_end = DateField('Pay Period End', format='%Y-%m-%d', validators=[DataRequired()])
     pay_date = DateField('Payment Date', format='%Y-%m-%d', validators=[DataRequired()])
-    submit = SubmitField('Generate Payroll')
\ No newline at end of file
+    submit = SubmitField('Generate Payroll')
+    preview = SubmitField('Preview (Dry Run)')
\ No newline at end of file
@@ -0,0 +1,221 @@
+# app/payroll/processing.py
+
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import event, func, insert, select, text
+from sqlalchemy.orm import selectinload
+
+from app import db
+from app.models.user import Employee, PayrollRun, Payslip
+from . import calculator
+from .fingerprint import chunk_fingerprints
+
+# Payslip columns filled from calculate_payroll_for_employee()
+PAYSLIP_FIELDS = (
+    'regular_hours', 'overtime_hours', 'late_deductions', 'gross_salary',
+    'sss_deduction', 'philhealth_deduction', 'pagibig_deduction', 'withholding_tax',
+    'other_deductions', 'total_deductions', 'net_pay'
+)
+
+# Active employees read (and calculated) per yield_per batch when a whole run is streamed
+EMPLOYEE_STREAM_BATCH_SIZE = 500
+
+
+def has_valid_salary(employee):
+    return bool(employee.salary_rate) and employee.salary_rate > 0
+
+
+def compute_payslip_values(employee, pay_period_start, pay_period_end):
+    """Runs the time and money calculators for one employee; returns the Payslip column values."""
+    time_data = calculator.calculate_payroll_time_for_period(employee, pay_period_start, pay_period_end)
+    calculations = calculator.calculate_payroll_for_employee(employee, time_data)
+    values = {field: calculations[field] for field in PAYSLIP_FIELDS}
+    values['employee_id'] = employee.id
+    return values
+
+
+def active_employee_chunk(after_employee_id, chunk_size):
+    """Next chunk of active employees in primary-key order, schedules preloaded."""
+    query = Employee.query.filter(Employee.status == 'Active')\
+        .options(selectinload(Employee.schedules))\
+        .order_by(Employee.id)
+    if after_employee_id is not None:
+        query = query.filter(Employee.id > after_employee_id)
+    return query.limit(chunk_size).all()
+
+
+def previous_payslip_values(pay_period_start, pay_period_end, employee_ids, exclude_run_id=None):
+    """Latest fingerprinted payslip values per employee from earlier runs of the same period."""
+    run_ids = db.session.query(PayrollRun.id).filter(
+        PayrollRun.pay_period_start == pay_period_start,
+        PayrollRun.pay_period_end == pay_period_end
+    )
+    if exclude_run_id is not None:
+        run_ids = run_ids.filter(PayrollRun.id != exclude_run_id)
+    run_ids = [row[0] for row in run_ids]
+    if not run_ids or not employee_ids:
+        return {}
+    columns = ('employee_id', 'input_fingerprint') + PAYSLIP_FIELDS
+    rows = db.session.query(*(getattr(Payslip, column) for column in columns)).filter(
+        Payslip.payroll_run_id.in_(run_ids),
+        Payslip.employee_id.in_(employee_ids),
+        Payslip.input_fingerprint.isnot(None)
+    ).order_by(Payslip.payroll_run_id.desc())
+    previous = {}
+    for row in rows:
+        previous.setdefault(row.employee_id, dict(zip(columns, row)))
+    return previous
+
+
+def compute_chunk_values(employees, pay_period_start, pay_period_end, exclude_run_id=None):
+    """
+    Payslip values for a chunk of employees. A previous payslip for the same period is
+    reused when its input fingerprint still matches; the rest go through the calculators.
+    Returns (values list, employees skipped for an invalid salary rate, number reused).
+    """
+    payable = [emp for emp in employees if has_valid_salary(emp)]
+    skipped = [emp for emp in employees if not has_valid_salary(emp)]
+    fingerprints = chunk_fingerprints(payable, pay_period_start, pay_period_end)
+    previous = previous_payslip_values(pay_period_start, pay_period_end,
+                                       [emp.id for emp in payable], exclude_run_id)
+    rows = []
+    reused = 0
+    for emp in payable:
+        fingerprint = fingerprints[emp.id]
+        earlier = previous.get(emp.id)
+        if earlier is not None and earlier['input_fingerprint'] == fingerprint:
+            values = dict(earlier)
+            reused += 1
+        else:
+            values = compute_payslip_values(emp, pay_period_start, pay_period_end)
+            values['input_fingerprint'] = fingerprint
+        rows.append(values)
+    return rows, skipped, reused
+
+
+def insert_payslips(run_id, rows):
+    """
+    Writes payslip values with one Core executemany INSERT. No ORM objects are built and no
+    per-row events fire, so the caller sets the run totals once with recalculate_run_totals().
+    """
+    if not rows:
+        return 0
+    for values in rows:
+        values['payroll_run_id'] = run_id
+    db.session.execute(insert(Payslip.__table__), rows)
+    return len(rows)
+
+
+def process_chunk(run, employees):
+    """
+    Inserts payslips for one chunk and moves the run's checkpoint past it.
+    The caller commits, so the payslips and the checkpoint land atomically.
+    Returns (payslips written, employees skipped for an invalid salary rate, payslips reused).
+    """
+    rows, skipped, reused = compute_chunk_values(employees, run.pay_period_start, run.pay_period_end, run.id)
+    written = insert_payslips(run.id, rows)
+    if employees:
+        run.checkpoint_employee_id = employees[-1].id
+        run.checkpoint_at = datetime.utcnow()
+    return written, skipped, reused
+
+
+def stream_active_employees(batch_size=EMPLOYEE_STREAM_BATCH_SIZE):
+    """Active employees in primary-key order, as lists of batch_size read with yield_per (schedules preloaded)."""
+    query = select(Employee).where(Employee.status == 'Active')\
+        .options(selectinload(Employee.schedules))\
+        .order_by(Employee.id)\
+        .execution_options(yield_per=batch_size)
+    yield from db.session.scalars(query).partitions()
+
+
+def write_run_payslips(run, batch_size=EMPLOYEE_STREAM_BATCH_SIZE):
+    """
+    Computes and inserts the payslips of every active employee for the run, in one pass.
+    Employees are streamed in batches and each batch's payslips go out in one executemany
+    INSERT, so memory stays flat however large the workforce; nothing is committed.
+    Returns (active employees, payslips written, payslips reused, labels of the employees
+    skipped for an invalid salary rate).
+    """
+    employees = written = reused = 0
+    skipped = []
+    for batch in stream_active_employees(batch_size):
+        rows, batch_skipped, batch_reused = compute_chunk_values(
+            batch, run.pay_period_start, run.pay_period_end, run.id
+        )
+        written += insert_payslips(run.id, rows)
+        employees += len(batch)
+        reused += batch_reused
+        skipped.extend(f'{emp.first_name} {emp.last_name} ({emp.employee_id_number})' for emp in batch_skipped)
+    return employees, written, reused, skipped
+
+
+def recalculate_run_totals(run):
+    """Sets the run totals from a single SUM over its payslips."""
+    totals = db.session.query(
+        func.coalesce(func.sum(Payslip.gross_salary), 0),
+        func.coalesce(func.sum(Payslip.total_deductions), 0),
+        func.coalesce(func.sum(Payslip.net_pay), 0),
+        func.count(Payslip.id)
+    ).filter(Payslip.payroll_run_id == run.id).one()
+    run.total_gross_pay = Decimal(totals[0])
+    run.total_deductions = Decimal(totals[1])
+    run.total_net_pay = Decimal(totals[2])
+    return totals[3]
+
+
+def find_resumable_run(pay_period_start, pay_period_end, pay_date):
+    """An unfinished checkpointed run for the same period (queue-based runs are resumed by workers instead)."""
+    return PayrollRun.query.filter_by(
+        pay_period_start=pay_period_start,
+        pay_period_end=pay_period_end,
+        pay_date=pay_date,
+        status='Processing'
+    ).filter(~PayrollRun.work_items.any())\
+        .order_by(PayrollRun.id.desc()).first()
+
+
+# --- DRY-RUN PREVIEW ---
+
+@event.listens_for(db.session, 'before_flush')
+def _refuse_read_only_flush(session, flush_context, instances):
+    if session.info.get('read_only'):
+        raise RuntimeError('Attempted to write during a read-only payroll preview.')
+
+
+@contextmanager
+def read_only_session():
+    """
+    Runs the block on db.session with writes refused; everything is rolled back on exit.
+    On PostgreSQL the transaction itself is also declared READ ONLY.
+    """
+    db.session.rollback()
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(text('SET TRANSACTION READ ONLY'))
+    db.session.info['read_only'] = True
+    try:
+        yield db.session
+    finally:
+        db.session.info.pop('read_only', None)
+        db.session.rollback()
+
+
+def preview_payroll_rows(pay_period_start, pay_period_end, chunk_size=200):
+    """
+    Computes every active employee's payslip for a period without creating a run.
+    Yields (employee, values) in employee id order; values is None for an invalid salary rate.
+    Call inside read_only_session().
+    """
+    last_id = None
+    while True:
+        employees = active_employee_chunk(last_id, chunk_size)
+        if not employees:
+            return
+        for emp in employees:
+            if not has_valid_salary(emp):
+                yield emp, None
+                continue
+            yield emp, compute_payslip_values(emp, pay_period_start, pay_period_end)
+        last_id = employees[-1].id
@@ -0,0 +1,139 @@
+# app/payroll/remittance.py
+
+import calendar
+import csv
+import io
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import func
+
+from app import db, cache
+from app.models.user import Employee, PayrollRun, Payslip
+
+# agency key -> (label, employee membership number column, payslip contribution column)
+AGENCIES = OrderedDict([
+    ('sss', ('SSS', Employee.sss_num, Payslip.sss_deduction)),
+    ('philhealth', ('PhilHealth', Employee.philhealth_num, Payslip.philhealth_deduction)),
+    ('pagibig', ('Pag-IBIG', Employee.pagibig_num, Payslip.pagibig_deduction)),
+])
+
+CENT = Decimal('0.01')
+
+
+# Years a remittance report can be asked for
+MIN_YEAR, MAX_YEAR = 1900, 9999
+
+
+def is_valid_month(year, month):
+    return MIN_YEAR <= year <= MAX_YEAR and 1 <= month <= 12
+
+
+def month_bounds(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _month_runs_filter(year, month):
+    first_day, last_day = month_bounds(year, month)
+    return (PayrollRun.pay_date >= first_day, PayrollRun.pay_date <= last_day)
+
+
+def remittance_rows(year, month):
+    """
+    Per-employee contribution totals for every Processed run paid in the month:
+    a single GROUP BY over payslip joined to employee and payroll_run.
+    """
+    return db.session.query(
+        Employee.employee_id_number, Employee.last_name, Employee.first_name,
+        *(number for _, number, _ in AGENCIES.values()),
+        func.count(Payslip.id),
+        *(func.coalesce(func.sum(amount), 0) for _, _, amount in AGENCIES.values())
+    ).join(Employee, Payslip.employee_id == Employee.id)\
+        .join(PayrollRun, Payslip.payroll_run_id == PayrollRun.id)\
+        .filter(PayrollRun.status == 'Processed', *_month_runs_filter(year, month))\
+        .group_by(Employee.id, Employee.employee_id_number, Employee.last_name, Employee.first_name,
+                  *(number for _, number, _ in AGENCIES.values()))\
+        .order_by(Employee.last_name, Employee.first_name, Employee.employee_id_number)\
+        .execution_options(yield_per=500)
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue()
+
+
+def iter_remittance_csv(year, month, agency=None):
+    """
+    CSV lines for the month's remittance: one row per employee, then a TOTAL row.
+    With agency ('sss', 'philhealth' or 'pagibig') only that agency's columns are included.
+    """
+    keys = [agency] if agency else list(AGENCIES)
+    header = ['Employee ID', 'Last Name', 'First Name']
+    header += [f'{AGENCIES[key][0]} No.' for key in keys]
+    header += ['Payslips']
+    header += [f'{AGENCIES[key][0]} Contribution' for key in keys]
+    yield _csv_line(header)
+
+    positions = list(AGENCIES)
+    totals = {key: Decimal('0.00') for key in keys}
+    employees = 0
+    for row in remittance_rows(year, month):
+        id_number, last_name, first_name = row[0], row[1], row[2]
+        numbers = dict(zip(positions, row[3:6]))
+        payslip_count = row[6]
+        amounts = {key: Decimal(str(value)).quantize(CENT) for key, value in zip(positions, row[7:10])}
+        employees += 1
+        for key in keys:
+            totals[key] += amounts[key]
+        yield _csv_line([id_number, last_name, first_name]
+                        + [numbers[key] or '' for key in keys]
+                        + [payslip_count]
+                        + [amounts[key] for key in keys])
+
+    yield _csv_line(['TOTAL', f'{employees} employees', ''] + [''] * len(keys) + ['']
+                    + [totals[key] for key in keys])
+
+
+# --- CACHE FOR CLOSED MONTHS ---
+# A month is closed once it has ended and none of its runs is still being processed.
+# The key includes the month's processed-run signature, so a late (backdated) run
+# makes other workers regenerate instead of serving a stale file. Entries are tagged
+# 'employees': editing a name or membership number drops them (in other workers within
+# CACHE_SYNC_INTERVAL with a shared cache tier, else within the namespace TTL).
+
+remittance_cache = cache.namespace('remittance')
+
+
+def month_signature(year, month):
+    """(closed?, processed run count, highest processed run id) in one small query."""
+    _, last_day = month_bounds(year, month)
+    processed = func.sum(db.case((PayrollRun.status == 'Processed', 1), else_=0))
+    total, processed_count, max_processed_id = db.session.query(
+        func.count(PayrollRun.id),
+        func.coalesce(processed, 0),
+        func.max(db.case((PayrollRun.status == 'Processed', PayrollRun.id)))
+    ).filter(*_month_runs_filter(year, month)).one()
+    closed = last_day < date.today() and total == processed_count
+    return closed, processed_count, max_processed_id
+
+
+def remittance_csv(year, month, agency=None):
+    """
+    Returns (iterable of CSV chunks, served_from_cache).
+    Open months are streamed; closed months are generated once and then served from the cache.
+    """
+    closed, processed_count, max_run_id = month_signature(year, month)
+    if not closed:
+        return iter_remittance_csv(year, month, agency), False
+
+    key = f"{year}-{month:02d}:{agency or 'all'}:{processed_count}:{max_run_id}"
+    generated = []
+
+    def generate():
+        generated.append(True)
+        return ''.join(iter_remittance_csv(year, month, agency))
+
+    text = remittance_cache.get_or_set(key, generate, tags=('employees',))
+    return [text], not generated
@@ -1,21 +1,27 @@
 # app/payroll/routes.py
 
-from flask import render_template, redirect, url_for, flash
+import json
+from datetime import datetime, timedelta
+
+from flask import render_template, redirect, url_for, flash, request, abort, Response, stream_with_context, jsonify
 from flask_login import login_required
 from app.payroll import bp
 from app.payroll.forms import RunPayrollForm
-from app.models.user import Employee, PayrollRun, Payslip
+from app.models.user import PayrollRun, Payslip
 from app.hr.routes import role_required
 from app import db
-from . import calculator
+from app.streaming import StreamedQuery, stream_page
+from .processing import read_only_session, preview_payroll_rows, recalculate_run_totals, write_run_payslips
+from .remittance import AGENCIES, is_valid_month, month_signature, remittance_csv
+from .ytd import get_ytd, get_ytd_many
+from .simulator import MAX_RULES, RESULT_FIELDS, latest_processed_run, parse_scenario, simulate
+from . import comparison
+from sqlalchemy.orm import joinedload
 from decimal import Decimal
 
 @bp.route('/run', methods=['GET', 'POST'])
 @role_required('Payroll_Admin')
 def run_payroll():
-    # Dynamic import to avoid circular dependency
-    from .calculator import calculate_payroll_time_for_period as calculate_time_for_period 
-
     form = RunPayrollForm()
     
     if form.validate_on_submit():
@@ -30,6 +36,12 @@ def run_payroll():
         
         if pay_date < pay_period_end:
             flash('Warning: Payment date is before pay period end. Please verify.', 'warning')
+
+        if form.preview.data:
+            return redirect(url_for('payroll.preview_payroll',
+                                    start=pay_period_start.isoformat(),
+                                    end=pay_period_end.isoformat(),
+                                    pay_date=pay_date.isoformat()))
         
         new_run = PayrollRun(
             pay_period_start=pay_period_start,
@@ -40,59 +52,24 @@ def run_payroll():
         db.session.add(new_run)
         db.session.flush()
         
-        active_employees = Employee.query.filter_by(status='Active').all()
-        
-        if not active_employees:
-            flash('No active employees found. Payroll run cancelled.', 'warning')
-            db.session.rollback()
-            return redirect(url_for('payroll.run_payroll'))
-            
-        total_gross = Decimal('0.00')
-        total_deduct = Decimal('0.00')
-        total_net = Decimal('0.00')
-
         try:
-            for emp in active_employees:
-                # Validate employee has salary rate
-                if not emp.salary_rate or emp.salary_rate <= 0:
-                    flash(f'Warning: Employee {emp.first_name} {emp.last_name} ({emp.employee_id_number}) has invalid salary rate. Skipping.', 'warning')
-                    continue
-                
-                # Calculate Time (Includes Holidays & Leave now)
-                time_data = calculate_time_for_period(emp, pay_period_start, pay_period_end)
-                
-                # Calculate Money
-                calculations = calculator.calculate_payroll_for_employee(emp, time_data) 
-                
-                payslip = Payslip(
-                    employee_id=emp.id,
-                    payroll_run_id=new_run.id,
-                    regular_hours=calculations['regular_hours'],
-                    overtime_hours=calculations['overtime_hours'],
-                    late_deductions=calculations['late_deductions'],
-                    gross_salary=calculations['gross_salary'],
-                    sss_deduction=calculations['sss_deduction'],
-                    philhealth_deduction=calculations['philhealth_deduction'],
-                    pagibig_deduction=calculations['pagibig_deduction'],
-                    withholding_tax=calculations['withholding_tax'],
-                    other_deductions=calculations['other_deductions'],
-                    total_deductions=calculations['total_deductions'],
-                    net_pay=calculations['net_pay']
-                )
-                db.session.add(payslip)
-                
-                total_gross += calculations['gross_salary']
-                total_deduct += calculations['total_deductions']
-                total_net += calculations['net_pay']
-
-            new_run.total_gross_pay = total_gross
-            new_run.total_deductions = total_deduct
-            new_run.total_net_pay = total_net
+            # Calculate Time (Includes Holidays & Leave now) and Money, reusing unchanged payslips
+            employee_count, _, total_reused, skipped = write_run_payslips(new_run)
+            if not employee_count:
+                flash('No active employees found. Payroll run cancelled.', 'warning')
+                db.session.rollback()
+                return redirect(url_for('payroll.run_payroll'))
+            for label in skipped:
+                flash(f'Warning: Employee {label} has invalid salary rate. Skipping.', 'warning')
+
+            recalculate_run_totals(new_run)
             new_run.status = 'Processed'
             
             db.session.commit()
             
-            flash(f'Payroll processed successfully for {len(active_employees)} employees.', 'success')
+            flash(f'Payroll processed successfully for {employee_count} employees.', 'success')
+            if total_reused:
+                flash(f'{total_reused} payslips were unchanged since an earlier run of this period and were reused.', 'info')
             return redirect(url_for('payroll.payroll_summary', run_id=new_run.id))
 
         except Exception as e:
@@ -102,6 +79,81 @@ def run_payroll():
     return render_template('payroll/run_payroll.html', form=form)
 
 
+def get_preview_period(args):
+    """(start, end, pay_date) from the preview query string, or None if missing/invalid."""
+    try:
+        start, end, pay_date = (datetime.strptime(args.get(key, ''), '%Y-%m-%d').date()
+                                for key in ('start', 'end', 'pay_date'))
+    except ValueError:
+        return None
+    if end < start:
+        return None
+    return start, end, pay_date
+
+
+@bp.route('/preview')
+@role_required('Payroll_Admin')
+def preview_payroll():
+    """Dry run: the page streams rows from preview_payroll_stream; nothing is saved unless committed."""
+    period = get_preview_period(request.args)
+    if period is None:
+        flash('Error: Invalid pay period for preview.', 'danger')
+        return redirect(url_for('payroll.run_payroll'))
+    start, end, pay_date = period
+    # Committing the preview re-submits the same period through the normal run form
+    form = RunPayrollForm(formdata=None, pay_period_start=start, pay_period_end=end, pay_date=pay_date)
+    return render_template('payroll/preview_payroll.html', form=form,
+                           pay_period_start=start, pay_period_end=end, pay_date=pay_date)
+
+
+@bp.route('/preview/stream')
+@role_required('Payroll_Admin')
+def preview_payroll_stream():
+    """Newline-delimited JSON: one message per employee with running totals, then a final 'done' message."""
+    period = get_preview_period(request.args)
+    if period is None:
+        return Response(json.dumps({'type': 'error', 'message': 'Invalid pay period.'}) + '\n',
+                        status=400, mimetype='application/x-ndjson')
+    start, end, _ = period
+
+    def generate():
+        totals = {'gross_salary': Decimal('0.00'), 'total_deductions': Decimal('0.00'), 'net_pay': Decimal('0.00')}
+        computed = 0
+        skipped = 0
+        try:
+            with read_only_session():
+                for emp, values in preview_payroll_rows(start, end):
+                    row = {
+                        'employee_id_number': emp.employee_id_number,
+                        'name': f"{emp.first_name} {emp.last_name}",
+                    }
+                    if values is None:
+                        skipped += 1
+                        row['type'] = 'skipped'
+                    else:
+                        computed += 1
+                        for key in totals:
+                            totals[key] += values[key]
+                        row['type'] = 'row'
+                        row.update({key: str(values[key]) for key in (
+                            'regular_hours', 'overtime_hours', 'late_deductions',
+                            'gross_salary', 'total_deductions', 'net_pay')})
+                    row['totals'] = {key: str(value) for key, value in totals.items()}
+                    yield json.dumps(row) + '\n'
+        except Exception as e:
+            yield json.dumps({'type': 'error', 'message': str(e)}) + '\n'
+            return
+        yield json.dumps({
+            'type': 'done', 'computed': computed, 'skipped': skipped,
+            'totals': {key: str(value) for key, value in totals.items()}
+        }) + '\n'
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'  # let nginx pass rows through as they are computed
+    return response
+
+
 @bp.route('/summary/<int:run_id>')
 @role_required('Payroll_Admin')
 def payroll_summary(run_id):
@@ -110,8 +162,9 @@ def payroll_summary(run_id):
         flash('Payroll run not found.', 'danger')
         return redirect(url_for('main.admin_dashboard'))
     
-    payslips = Payslip.query.filter_by(payroll_run_id=run.id).all()
-    return render_template('payroll/payroll_summary.html', run=run, payslips=payslips)
+    payslips = Payslip.query.filter_by(payroll_run_id=run.id)\
+        .options(joinedload(Payslip.employee)).order_by(Payslip.id)
+    return stream_page('payroll/payroll_summary.html', run=run, payslips=StreamedQuery(payslips))
 
 
 @bp.route('/payslip/delete/<int:slip_id>/<int:run_id>', methods=['POST'])
@@ -153,5 +206,127 @@ def delete_payslip(slip_id, run_id):
 @bp.route('/history')
 @role_required('Payroll_Admin')
 def payroll_history():
-    all_runs = PayrollRun.query.order_by(PayrollRun.pay_date.desc()).all()
-    return render_template('payroll/payroll_history.html', all_runs=all_runs)
\ No newline at end of file
+    all_runs = PayrollRun.query.order_by(PayrollRun.pay_date.desc())
+    return stream_page('payroll/payroll_history.html', all_runs=StreamedQuery(all_runs))
+
+
+# --- GOVERNMENT REMITTANCE REPORTS ---
+
+@bp.route('/remittance')
+@role_required('Payroll_Admin')
+def remittance_reports():
+    """Monthly SSS / PhilHealth / Pag-IBIG contribution reports (defaults to last month)."""
+    try:
+        year, month = (int(part) for part in request.args.get('month', '').split('-'))
+        month_start = datetime(year, month, 1).date()
+    except ValueError:
+        today = datetime.today().date()
+        month_start = (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+    closed, processed_count, _ = month_signature(month_start.year, month_start.month)
+    return render_template('payroll/remittance.html', month_start=month_start, agencies=AGENCIES,
+                           closed=closed, processed_count=processed_count)
+
+
+@bp.route('/remittance/<int:year>/<int:month>.csv')
+@role_required('Payroll_Admin')
+def remittance_csv_download(year, month):
+    agency = request.args.get('agency') or None
+    if not is_valid_month(year, month) or (agency is not None and agency not in AGENCIES):
+        abort(404)
+    chunks, _ = remittance_csv(year, month, agency)
+    filename = f"remittance-{year}-{month:02d}-{agency or 'all'}.csv"
+    response = Response(stream_with_context(chunks), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+# --- YEAR-TO-DATE LEDGER ---
+
+def _ytd_json(totals):
+    return {name: (str(value) if isinstance(value, Decimal) else value) for name, value in totals.items()}
+
+
+@bp.route('/ytd/<int:year>/<int:employee_id>')
+@role_required('Payroll_Admin')
+def ytd_totals(year, employee_id):
+    """Year-to-date totals of one employee, read from the YTD ledger."""
+    return jsonify(_ytd_json(get_ytd(employee_id, year)))
+
+
+@bp.route('/ytd/<int:year>')
+@role_required('Payroll_Admin')
+def ytd_totals_many(year):
+    """Year-to-date totals for ?employee_id=..&employee_id=.. (at most 1000 per request)."""
+    employee_ids = request.args.getlist('employee_id', type=int)[:1000]
+    return jsonify([_ytd_json(totals) for totals in get_ytd_many(employee_ids, year).values()])
+
+
+# --- WHAT-IF COMPENSATION SIMULATOR ---
+
+def _simulation_from_args(args):
+    """(run, scenario, errors) for the simulator views; run defaults to the latest Processed run."""
+    run_id = args.get('run_id', type=int)
+    run = db.session.get(PayrollRun, run_id) if run_id else latest_processed_run()
+    scenario, errors = parse_scenario(args)
+    if run is None or run.status != 'Processed':
+        errors.append('Choose a processed payroll run as the baseline.')
+        run = None
+    return run, scenario, errors
+
+
+@bp.route('/simulate')
+@role_required('Payroll_Admin')
+def simulate_compensation():
+    """What-if page: salary rules and overtime rate evaluated against a processed run. Never saves anything."""
+    run, scenario, errors = _simulation_from_args(request.args)
+    for error in errors:
+        flash(error, 'danger')
+    result = simulate(run.id, scenario) if run is not None and not errors else None
+    runs = PayrollRun.query.filter_by(status='Processed')\
+        .order_by(PayrollRun.pay_date.desc(), PayrollRun.id.desc()).limit(24).all()
+    return render_template('payroll/simulate.html', runs=runs, run=run, result=result, fields=RESULT_FIELDS,
+                           max_rules=MAX_RULES, args=request.args)
+
+
+@bp.route('/simulate/data')
+@role_required('Payroll_Admin')
+def simulate_compensation_data():
+    """Same simulation as JSON (same query string as the page)."""
+    run, scenario, errors = _simulation_from_args(request.args)
+    if errors:
+        return jsonify({'errors': errors}), 400
+    return jsonify(dict(simulate(run.id, scenario), scenario=scenario))
+
+
+# --- RUN-TO-RUN COMPARISON ---
+
+def _threshold(args, name, default, minimum=0.0):
+    value = args.get(name, type=float)
+    return default if value is None or value < minimum else value
+
+
+@bp.route('/compare/<int:run_id>')
+@role_required('Payroll_Admin')
+def compare_runs(run_id):
+    """Differences and anomalies between a run and a base run (defaults to the previous processed run)."""
+    run = db.session.get(PayrollRun, run_id)
+    if not run:
+        flash('Payroll run not found.', 'danger')
+        return redirect(url_for('payroll.payroll_history'))
+    base_id = request.args.get('base', type=int)
+    base = db.session.get(PayrollRun, base_id) if base_id else comparison.previous_run(run)
+    if base is None or base.id == run.id:
+        flash('There is no earlier processed run to compare with. Choose one from the history.', 'warning')
+        return redirect(url_for('payroll.payroll_summary', run_id=run.id))
+
+    thresholds = {
+        'net_swing_percent': _threshold(request.args, 'net_swing_percent', comparison.NET_SWING_PERCENT),
+        'net_swing_min': _threshold(request.args, 'net_swing_min', comparison.NET_SWING_MIN_AMOUNT),
+        'ot_factor': _threshold(request.args, 'ot_factor', comparison.OT_SPIKE_FACTOR, minimum=1.0),
+        'ot_min_hours': _threshold(request.args, 'ot_min_hours', comparison.OT_SPIKE_MIN_HOURS),
+    }
+    result = comparison.compare_runs(base.id, run.id, **thresholds)
+    runs = PayrollRun.query.filter(PayrollRun.id != run.id)\
+        .order_by(PayrollRun.pay_date.desc(), PayrollRun.id.desc()).limit(24).all()
+    return render_template('payroll/compare_runs.html', run=run, base=base, runs=runs, result=result,
+                           thresholds=thresholds, kinds=comparison.ANOMALY_KINDS, max_listed=comparison.MAX_LISTED)
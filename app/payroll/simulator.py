@@ -0,0 +1,268 @@
+# app/payroll/simulator.py
+
+"""
+What-if compensation simulator.
+
+Loads every active employee's salary and the time data of a baseline payroll
+run (regular hours, overtime hours, late minutes) into NumPy arrays once, then
+re-evaluates gross pay, SSS / PhilHealth / Pag-IBIG, withholding tax and net
+pay for the whole workforce with array arithmetic, using the same rules as
+calculator.calculate_payroll_for_employee(). A scenario is a list of salary
+rules plus an overtime multiplier; its totals are compared with the baseline
+evaluated on the same data. Nothing is ever written to the database.
+
+Amounts are computed in float64 and rounded to the cent at the same steps as
+the calculator, so a figure can differ from the Decimal result by a cent.
+"""
+
+import threading
+import time as _time
+
+import numpy as np
+
+from app import db
+from app.models.user import Employee, PayrollRun, Payslip
+from . import calculator
+from .processing import read_only_session
+
+HOURS_PER_MONTH = 160.0
+DEFAULT_OT_MULTIPLIER = 1.25
+MAX_RULES = 3
+RULE_KINDS = ('percent', 'amount')
+RESULT_FIELDS = (
+    'gross_salary', 'sss_deduction', 'philhealth_deduction', 'pagibig_deduction',
+    'withholding_tax', 'late_deductions', 'total_deductions', 'net_pay'
+)
+
+# Loaded arrays are reused for this long (seconds) while an admin tries scenarios
+WORKFORCE_CACHE_TTL = 60
+
+_SSS_LIMITS = np.array([float(limit) for limit, _ in calculator.SSS_TABLE])
+_SSS_AMOUNTS = np.array([float(amount) for _, amount in calculator.SSS_TABLE])
+_TAX_LIMITS = np.array([float(row[0]) for row in calculator.TAX_TABLE])
+_TAX_EXCESS_OVER = np.array([float(row[1]) for row in calculator.TAX_TABLE])
+_TAX_BASE = np.array([float(row[2]) for row in calculator.TAX_TABLE])
+_TAX_RATE = np.array([row[3] / 100 for row in calculator.TAX_TABLE])
+
+
+def _cents(values):
+    return np.round(values, 2)
+
+
+# --- VECTORIZED CALCULATOR ---
+
+def evaluate(salary, regular_hours, overtime_hours, late_minutes, ot_multiplier=DEFAULT_OT_MULTIPLIER):
+    """
+    calculate_payroll_for_employee() over whole arrays. Returns {field: array}.
+    """
+    salary = np.maximum(salary, 0.0)
+    hourly = salary / HOURS_PER_MONTH
+
+    late = np.where((hourly > 0) & (late_minutes > 0), _cents(late_minutes * (hourly / 60)), 0.0)
+    overtime = np.where((hourly > 0) & (overtime_hours > 0), _cents(overtime_hours * hourly * ot_multiplier), 0.0)
+    prorated = np.where(regular_hours >= HOURS_PER_MONTH, salary, _cents(salary * (regular_hours / HOURS_PER_MONTH)))
+    gross = _cents(prorated + overtime)
+
+    # Statutory contributions are based on the monthly rate, not on the prorated pay
+    sss_bracket = np.minimum(np.searchsorted(_SSS_LIMITS, salary, side='left'), len(_SSS_AMOUNTS) - 1)
+    sss = _SSS_AMOUNTS[sss_bracket]
+    philhealth = _cents(np.clip(salary, float(calculator.PHILHEALTH_FLOOR), float(calculator.PHILHEALTH_CEILING))
+                        * float(calculator.PHILHEALTH_RATE) / 2)
+    pagibig = _cents(np.minimum(np.where(salary <= 1500, salary * 0.01, salary * 0.02), 100.0))
+
+    taxable = gross - (sss + philhealth + pagibig)
+    tax_bracket = np.minimum(np.searchsorted(_TAX_LIMITS, taxable, side='left'), len(_TAX_LIMITS) - 1)
+    tax = np.where(
+        taxable <= _TAX_LIMITS[0], 0.0,
+        _cents(_TAX_BASE[tax_bracket] + (taxable - _TAX_EXCESS_OVER[tax_bracket]) * _TAX_RATE[tax_bracket])
+    )
+
+    total_deductions = sss + philhealth + pagibig + tax + late
+    net = gross - total_deductions
+    negative = net < 0
+    return {
+        'gross_salary': gross,
+        'sss_deduction': sss,
+        'philhealth_deduction': philhealth,
+        'pagibig_deduction': pagibig,
+        'withholding_tax': tax,
+        'late_deductions': late,
+        'total_deductions': np.where(negative, gross, total_deductions),
+        'net_pay': np.where(negative, 0.0, net),
+    }
+
+
+def apply_rules(salary, positions, rules):
+    """
+    New salary array after the scenario's rules, applied in order. Each rule matches on
+    the salary as left by the previous rules (min_salary <= salary < max_salary, optional
+    position) and raises it by a percentage or a fixed amount.
+    """
+    salary = salary.copy()
+    for rule in rules:
+        mask = np.ones(salary.shape, dtype=bool)
+        if rule.get('min_salary') is not None:
+            mask &= salary >= rule['min_salary']
+        if rule.get('max_salary') is not None:
+            mask &= salary < rule['max_salary']
+        if rule.get('position'):
+            mask &= positions == rule['position']
+        if rule['kind'] == 'percent':
+            salary[mask] = _cents(salary[mask] * (1 + rule['value'] / 100))
+        else:
+            salary[mask] = salary[mask] + rule['value']
+    return salary
+
+
+# --- WORKFORCE ARRAYS ---
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def latest_processed_run():
+    return PayrollRun.query.filter_by(status='Processed')\
+        .order_by(PayrollRun.pay_date.desc(), PayrollRun.id.desc()).first()
+
+
+def _load_workforce(run_id):
+    rows = db.session.query(
+        Employee.id, Employee.employee_id_number, Employee.first_name, Employee.last_name,
+        Employee.position, Employee.salary_rate,
+        Payslip.regular_hours, Payslip.overtime_hours, Payslip.late_deductions
+    ).join(Payslip, (Payslip.employee_id == Employee.id) & (Payslip.payroll_run_id == run_id))\
+        .filter(Employee.status == 'Active', Employee.salary_rate > 0)\
+        .order_by(Employee.id)\
+        .execution_options(yield_per=2000)
+
+    columns = list(zip(*rows)) or [()] * 9
+    ids, id_numbers, first_names, last_names, positions, salary, regular, overtime, late = columns
+    salary = np.array(salary, dtype=float)
+    late = np.array([float(value or 0) for value in late])
+    hourly = salary / HOURS_PER_MONTH
+    return {
+        'run_id': run_id,
+        'ids': np.array(ids, dtype=np.int64),
+        'id_numbers': np.array(id_numbers, dtype=object),
+        'names': np.array([f'{first} {last}' for first, last in zip(first_names, last_names)], dtype=object),
+        'positions': np.array([position or '' for position in positions], dtype=object),
+        'salary': salary,
+        'regular_hours': np.array([float(value or 0) for value in regular]),
+        'overtime_hours': np.array([float(value or 0) for value in overtime]),
+        # The payslip keeps the late deduction, not the minutes: recover them from the hourly rate
+        'late_minutes': np.round(np.divide(late * 60, hourly, out=np.zeros_like(late), where=hourly > 0)),
+    }
+
+
+def load_workforce(run_id):
+    """
+    Arrays for the active employees with a payslip in the baseline run, read in one
+    read-only query and cached for WORKFORCE_CACHE_TTL seconds per process.
+    """
+    now = _time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(run_id)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+    with read_only_session():
+        workforce = _load_workforce(run_id)
+    with _cache_lock:
+        _cache.clear()
+        _cache[run_id] = (now + WORKFORCE_CACHE_TTL, workforce)
+    return workforce
+
+
+# --- SCENARIOS ---
+
+def _number(value):
+    value = (value or '').strip().replace(',', '')
+    return float(value) if value else None
+
+
+def parse_scenario(args):
+    """
+    Scenario from a query string: ot_multiplier, plus rule1..rule3 given as
+    ruleN_kind ('percent' / 'amount'), ruleN_value, ruleN_min, ruleN_max, ruleN_position.
+    Returns (scenario, errors).
+    """
+    errors = []
+    scenario = {'ot_multiplier': DEFAULT_OT_MULTIPLIER, 'rules': []}
+    try:
+        multiplier = _number(args.get('ot_multiplier'))
+        if multiplier is not None:
+            if not 0 <= multiplier <= 5:
+                raise ValueError
+            scenario['ot_multiplier'] = multiplier
+    except ValueError:
+        errors.append('Overtime multiplier must be a number between 0 and 5.')
+
+    for n in range(1, MAX_RULES + 1):
+        try:
+            value = _number(args.get(f'rule{n}_value'))
+            if value is None:
+                continue
+            rule = {
+                'kind': args.get(f'rule{n}_kind') if args.get(f'rule{n}_kind') in RULE_KINDS else 'percent',
+                'value': value,
+                'min_salary': _number(args.get(f'rule{n}_min')),
+                'max_salary': _number(args.get(f'rule{n}_max')),
+                'position': (args.get(f'rule{n}_position') or '').strip() or None,
+            }
+        except ValueError:
+            errors.append(f'Rule {n}: amounts must be numbers.')
+            continue
+        if rule['kind'] == 'percent' and not -100 <= value <= 1000:
+            errors.append(f'Rule {n}: percentage must be between -100 and 1000.')
+            continue
+        scenario['rules'].append(rule)
+    return scenario, errors
+
+
+def _totals(values):
+    return {field: round(float(values[field].sum()), 2) for field in RESULT_FIELDS}
+
+
+def simulate(run_id, scenario, top=25):
+    """
+    Evaluates the scenario against the baseline (current salaries, 1.25x overtime) on the
+    time data of the given run. Returns totals for both, their difference, the number of
+    employees affected and the largest individual net-pay changes.
+    """
+    workforce = load_workforce(run_id)
+    started = _time.perf_counter()
+
+    args = (workforce['regular_hours'], workforce['overtime_hours'], workforce['late_minutes'])
+    baseline = evaluate(workforce['salary'], *args)
+    new_salary = apply_rules(workforce['salary'], workforce['positions'], scenario['rules'])
+    result = evaluate(new_salary, *args, ot_multiplier=scenario['ot_multiplier'])
+
+    baseline_totals = _totals(baseline)
+    scenario_totals = _totals(result)
+    net_change = result['net_pay'] - baseline['net_pay']
+    gross_change = result['gross_salary'] - baseline['gross_salary']
+    changed = np.flatnonzero((np.abs(gross_change) >= 0.005) | (np.abs(net_change) >= 0.005))
+    largest = changed[np.argsort(-np.abs(net_change[changed]), kind='stable')[:top]]
+
+    return {
+        'run_id': run_id,
+        'employees': int(workforce['ids'].size),
+        'affected': int(changed.size),
+        'baseline': baseline_totals,
+        'scenario': scenario_totals,
+        'difference': {field: round(scenario_totals[field] - baseline_totals[field], 2) for field in RESULT_FIELDS},
+        'monthly_salary': {
+            'baseline': round(float(workforce['salary'].sum()), 2),
+            'scenario': round(float(new_salary.sum()), 2),
+        },
+        'largest_changes': [{
+            'employee_id': int(workforce['ids'][i]),
+            'employee_id_number': workforce['id_numbers'][i],
+            'name': workforce['names'][i],
+            'position': workforce['positions'][i],
+            'salary': round(float(workforce['salary'][i]), 2),
+            'new_salary': round(float(new_salary[i]), 2),
+            'gross_change': round(float(gross_change[i]), 2),
+            'net_change': round(float(net_change[i]), 2),
+        } for i in largest],
+        'elapsed_ms': round((_time.perf_counter() - started) * 1000, 2),
+    }
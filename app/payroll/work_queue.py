@@ -0,0 +1,246 @@
+# app/payroll/work_queue.py
+
+"""
+Database-backed work queue so several processes (or app servers) can share one payroll run.
+
+A run is split into PayrollWorkItem rows, each covering a contiguous range of active
+employee ids. Workers claim one item at a time under a lease:
+
+* PostgreSQL: SELECT ... FOR UPDATE SKIP LOCKED picks an item no other worker is looking at.
+* SQLite (and anything else): an optimistic compare-and-set UPDATE on the lease columns.
+
+Payslips for an item and the item's 'Done' flag commit in one transaction, guarded by the
+lease owner, so a worker whose lease expired (and was reclaimed) cannot double-insert.
+Whichever worker completes the last item recomputes the run totals and marks it Processed.
+"""
+
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, func, insert, or_, select, update
+from sqlalchemy.orm import selectinload
+
+from app import db
+from app.models.user import Employee, PayrollRun, PayrollWorkItem, Payslip
+from .processing import compute_chunk_values
+from .ytd import post_run
+
+# A work item that raised this many times is parked as 'Failed' instead of being retried;
+# the run then stays Processing until 'flask payroll requeue-failed' puts them back
+MAX_ATTEMPTS = 3
+
+
+def make_worker_id():
+    """Lease owner tag: host, pid and a random suffix (unique per worker loop)."""
+    return f"{socket.gethostname()[:32]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def enqueue_run(run, chunk_size):
+    """Splits the active workforce into employee id ranges of chunk_size and stores them as work items."""
+    ids = [row[0] for row in db.session.query(Employee.id)
+           .filter(Employee.status == 'Active').order_by(Employee.id)]
+    items = [
+        {
+            'payroll_run_id': run.id,
+            'first_employee_id': ids[pos],
+            'last_employee_id': ids[min(pos + chunk_size, len(ids)) - 1],
+            'status': 'Pending',
+            'attempts': 0,
+            'payslip_count': 0,
+        }
+        for pos in range(0, len(ids), chunk_size)
+    ]
+    if items:
+        db.session.execute(insert(PayrollWorkItem), items)
+    return len(items)
+
+
+def _claimable(run_id, now):
+    condition = or_(
+        PayrollWorkItem.status == 'Pending',
+        and_(PayrollWorkItem.status == 'Claimed', PayrollWorkItem.lease_expires_at < now)
+    )
+    if run_id is not None:
+        condition = and_(PayrollWorkItem.payroll_run_id == run_id, condition)
+    return condition
+
+
+def claim_work_item(worker_id, lease_seconds, run_id=None):
+    """
+    Atomically claims the next pending (or lease-expired) work item.
+    Returns the claimed item's id, or None when nothing is claimable.
+    """
+    is_postgres = db.session.get_bind().dialect.name == 'postgresql'
+    while True:
+        now = datetime.utcnow()
+        candidate = select(PayrollWorkItem.id)\
+            .where(_claimable(run_id, now))\
+            .order_by(PayrollWorkItem.id)\
+            .limit(1)
+        if is_postgres:
+            candidate = candidate.with_for_update(skip_locked=True)
+        item_id = db.session.execute(candidate).scalar()
+        if item_id is None:
+            db.session.rollback()
+            return None
+
+        # Compare-and-set: only succeeds if the item is still claimable
+        result = db.session.execute(
+            update(PayrollWorkItem)
+            .where(PayrollWorkItem.id == item_id, _claimable(run_id, now))
+            .values(
+                status='Claimed',
+                lease_owner=worker_id,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                attempts=PayrollWorkItem.attempts + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return item_id
+        # Another worker won the race for this item; try the next one
+
+
+def process_work_item(item_id, worker_id):
+    """
+    Computes (or reuses, when the input fingerprint is unchanged) and stores the payslips for one claimed item.
+    Returns (payslips written, payslips reused), or None if the lease was lost meanwhile.
+    """
+    item = db.session.get(PayrollWorkItem, item_id)
+    run = db.session.get(PayrollRun, item.payroll_run_id)
+    employees = Employee.query.filter(
+        Employee.status == 'Active',
+        Employee.id >= item.first_employee_id,
+        Employee.id <= item.last_employee_id
+    ).options(selectinload(Employee.schedules)).order_by(Employee.id).all()
+
+    rows, _, reused = compute_chunk_values(employees, run.pay_period_start, run.pay_period_end, run.id)
+    for values in rows:
+        values['payroll_run_id'] = run.id
+
+    # Core insert: run totals are computed once at finalization rather than per row
+    if rows:
+        db.session.execute(insert(Payslip.__table__), rows)
+    result = db.session.execute(
+        update(PayrollWorkItem)
+        .where(
+            PayrollWorkItem.id == item_id,
+            PayrollWorkItem.status == 'Claimed',
+            PayrollWorkItem.lease_owner == worker_id
+        )
+        .values(status='Done', completed_at=datetime.utcnow(), payslip_count=len(rows))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        return None
+    db.session.commit()
+    return len(rows), reused
+
+
+def release_failed_item(item_id, worker_id):
+    """Hands a failed item back to the queue, or parks it as Failed after MAX_ATTEMPTS tries."""
+    db.session.execute(
+        update(PayrollWorkItem)
+        .where(PayrollWorkItem.id == item_id, PayrollWorkItem.lease_owner == worker_id)
+        .values(
+            status=case((PayrollWorkItem.attempts >= MAX_ATTEMPTS, 'Failed'), else_='Pending'),
+            lease_owner=None,
+            lease_expires_at=None
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def finalize_run_if_complete(run_id):
+    """Marks the run Processed (with fresh totals) once every work item is Done. Returns True if this call finalized it."""
+    remaining = db.session.query(func.count(PayrollWorkItem.id)).filter(
+        PayrollWorkItem.payroll_run_id == run_id,
+        PayrollWorkItem.status != 'Done'
+    ).scalar()
+    if remaining:
+        db.session.rollback()
+        return False
+    totals = db.session.query(
+        func.coalesce(func.sum(Payslip.gross_salary), 0),
+        func.coalesce(func.sum(Payslip.total_deductions), 0),
+        func.coalesce(func.sum(Payslip.net_pay), 0)
+    ).filter(Payslip.payroll_run_id == run_id).one()
+    result = db.session.execute(
+        update(PayrollRun)
+        .where(PayrollRun.id == run_id, PayrollRun.status == 'Processing')
+        .values(total_gross_pay=totals[0], total_deductions=totals[1], total_net_pay=totals[2], status='Processed')
+        .execution_options(synchronize_session=False)
+    )
+    finalized = result.rowcount == 1
+    if finalized:
+        # Core update: the ORM events never see this status change, so post the run to the YTD ledger here
+        pay_date = db.session.query(PayrollRun.pay_date).filter(PayrollRun.id == run_id).scalar()
+        if pay_date is not None:
+            post_run(db.session.connection(), run_id, pay_date.year)
+    db.session.commit()
+    return finalized
+
+
+def run_worker(lease_seconds, run_id=None, log=print):
+    """Claims and processes work items until none are left. Returns (items done, payslips written, payslips reused)."""
+    worker_id = make_worker_id()
+    items_done = 0
+    payslips_written = 0
+    payslips_reused = 0
+    touched_runs = set()
+    while True:
+        item_id = claim_work_item(worker_id, lease_seconds, run_id)
+        if item_id is None:
+            break
+        item_run_id = db.session.get(PayrollWorkItem, item_id).payroll_run_id
+        touched_runs.add(item_run_id)
+        try:
+            result = process_work_item(item_id, worker_id)
+        except Exception as e:
+            db.session.rollback()
+            release_failed_item(item_id, worker_id)
+            log(f'[{worker_id}] item #{item_id} failed: {e!r}')
+            continue
+        if result is None:
+            log(f'[{worker_id}] lost the lease on item #{item_id}; discarded its results.')
+            continue
+        items_done += 1
+        payslips_written += result[0]
+        payslips_reused += result[1]
+    if run_id is not None:
+        touched_runs.add(run_id)
+    for touched_run_id in touched_runs:
+        if finalize_run_if_complete(touched_run_id):
+            log(f'[{worker_id}] finalized payroll run #{touched_run_id}.')
+    return items_done, payslips_written, payslips_reused
+
+
+def queue_status(run_id):
+    """Item counts per status for one run, plus 'Expired': claimed items whose lease has run out."""
+    rows = db.session.query(PayrollWorkItem.status, func.count(PayrollWorkItem.id))\
+        .filter(PayrollWorkItem.payroll_run_id == run_id)\
+        .group_by(PayrollWorkItem.status).all()
+    counts = dict(rows)
+    if counts.get('Claimed'):
+        counts['Expired'] = db.session.query(func.count(PayrollWorkItem.id)).filter(
+            PayrollWorkItem.payroll_run_id == run_id,
+            PayrollWorkItem.status == 'Claimed',
+            PayrollWorkItem.lease_expires_at < datetime.utcnow()
+        ).scalar()
+    return counts
+
+
+def requeue_failed_items(run_id):
+    """Puts a run's Failed items back to Pending with a fresh attempt count (caller commits). Returns how many."""
+    result = db.session.execute(
+        update(PayrollWorkItem)
+        .where(PayrollWorkItem.payroll_run_id == run_id, PayrollWorkItem.status == 'Failed')
+        .values(status='Pending', attempts=0, lease_owner=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
@@ -0,0 +1,356 @@
+# app/payroll/ytd.py
+
+"""
+Year-to-date earnings and tax ledger.
+
+ytd_ledger holds one row per (employee, year) with the running totals of that
+employee's payslips in Processed runs, the year being that of the run's pay
+date. Instead of re-summing every payslip of the year, each flush turns its
+payslip and payroll run changes into per-(employee, year) deltas and adds them
+to the ledger in one batched upsert:
+
+- payslips inserted, edited or deleted in a Processed run add their difference;
+- a run becoming Processed adds all its payslips, a run leaving Processed
+  (un-finalized) or deleted subtracts them, a Processed run whose pay date moves
+  to another year is moved along with it.
+
+Payslips written with Core statements (every run path inserts them that way) are
+not seen by the ORM events; they are picked up when the run becomes Processed,
+which posts the whole run. Core paths that change a run's status call post_run()
+themselves.
+check_ledger() rebuilds the totals from the payslips and reports any difference.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlalchemy import event, select, func, extract
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.attributes import get_history
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app import db
+from app.models.user import PayrollRun, Payslip, YtdLedger
+
+# Payslip amounts accumulated in the ledger (same column names on both tables)
+LEDGER_FIELDS = (
+    'gross_salary', 'sss_deduction', 'philhealth_deduction', 'pagibig_deduction',
+    'withholding_tax', 'total_deductions', 'net_pay'
+)
+PENDING_KEY = 'ytd_ledger_pending'
+CENT = Decimal('0.01')
+# Employees upserted per statement when a whole run is posted or removed
+POST_BATCH_SIZE = 1000
+
+
+def _amount(value):
+    return Decimal(str(value or 0))
+
+
+def _add(deltas, employee_id, year, amounts, count, sign=1):
+    entry = deltas[(employee_id, year)]
+    for i, value in enumerate(amounts):
+        entry[i] += sign * _amount(value)
+    entry[-1] += sign * count
+
+
+def _new_deltas():
+    return defaultdict(lambda: [Decimal('0')] * len(LEDGER_FIELDS) + [0])
+
+
+# --- WRITING DELTAS ---
+
+def _upsert_statement(connection):
+    table = YtdLedger.__table__
+    dialect = connection.dialect.name
+    columns = LEDGER_FIELDS + ('payslip_count',)
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        return insert.on_conflict_do_update(
+            index_elements=['employee_id', 'year'],
+            set_={name: table.c[name] + insert.excluded[name] for name in columns}
+        )
+    if dialect in ('mysql', 'mariadb'):
+        insert = mysql.insert(table)
+        return insert.on_duplicate_key_update(
+            {name: table.c[name] + insert.inserted[name] for name in columns}
+        )
+    return None
+
+
+def apply_deltas(connection, deltas):
+    """Adds {(employee_id, year): [amounts..., payslip count]} to the ledger in one statement."""
+    rows = []
+    for (employee_id, year), entry in deltas.items():
+        if year is None or not any(entry):
+            continue
+        row = {'employee_id': employee_id, 'year': year, 'payslip_count': entry[-1]}
+        row.update(zip(LEDGER_FIELDS, entry))
+        rows.append(row)
+    if not rows:
+        return 0
+
+    statement = _upsert_statement(connection)
+    if statement is not None:
+        connection.execute(statement, rows)
+        return len(rows)
+
+    # Databases without an upsert: update, then insert the keys that had no row yet
+    table = YtdLedger.__table__
+    for row in rows:
+        result = connection.execute(
+            table.update()
+            .where(table.c.employee_id == row['employee_id'], table.c.year == row['year'])
+            .values({name: table.c[name] + row[name] for name in LEDGER_FIELDS + ('payslip_count',)})
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
+    return len(rows)
+
+
+def _run_totals(connection, run_id):
+    """
+    Batches of (employee_id, payslip count, amounts...) for one run, POST_BATCH_SIZE employees
+    at a time (keyset pages over ix_payslip_run_employee, so memory does not grow with the run).
+    """
+    table = Payslip.__table__
+    statement = select(table.c.employee_id, func.count(table.c.id),
+                       *(func.coalesce(func.sum(table.c[name]), 0) for name in LEDGER_FIELDS))\
+        .group_by(table.c.employee_id)\
+        .order_by(table.c.employee_id)\
+        .limit(POST_BATCH_SIZE)
+    last_id = None
+    while True:
+        conditions = [table.c.payroll_run_id == run_id]
+        if last_id is not None:
+            conditions.append(table.c.employee_id > last_id)
+        batch = connection.execute(statement.where(*conditions)).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+def post_run(connection, run_id, year, sign=1):
+    """
+    Adds (sign=1) or removes (sign=-1) every payslip of a run to/from the ledger,
+    POST_BATCH_SIZE employees per upsert. Also used by Core code paths that change
+    a run's status without going through the ORM.
+    """
+    posted = 0
+    for batch in _run_totals(connection, run_id):
+        deltas = _new_deltas()
+        for row in batch:
+            _add(deltas, row[0], year, row[2:], row[1], sign)
+        posted += apply_deltas(connection, deltas)
+    return posted
+
+
+# --- ORM EVENTS: collect changes during a flush, apply them once it is written ---
+
+def _pending(target):
+    session = object_session(target)
+    if session is None:
+        return None
+    return session.info.setdefault(PENDING_KEY, {'payslips': [], 'runs': {}})
+
+
+def _stored_row(connection, table, target, names):
+    # Attribute history has no old value when an expired attribute is simply assigned,
+    # so the row as it is before the UPDATE is read back from the database instead.
+    return connection.execute(
+        select(*(table.c[name] for name in names)).where(table.c.id == target.id)
+    ).first()
+
+
+@event.listens_for(Payslip, 'after_insert')
+def _payslip_inserted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending['payslips'].append((target.payroll_run_id, target.employee_id,
+                                    [getattr(target, name) for name in LEDGER_FIELDS], 1))
+
+@event.listens_for(Payslip, 'before_update')
+def _payslip_updated(mapper, connection, target):
+    names = ('payroll_run_id', 'employee_id') + LEDGER_FIELDS
+    if not any(get_history(target, name).has_changes() for name in names):
+        return
+    pending = _pending(target)
+    if pending is None:
+        return
+    old = _stored_row(connection, Payslip.__table__, target, names)
+    pending['payslips'].append((old[0], old[1], [-_amount(value) for value in old[2:]], -1))
+    pending['payslips'].append((target.payroll_run_id, target.employee_id,
+                                [getattr(target, name) for name in LEDGER_FIELDS], 1))
+
+@event.listens_for(Payslip, 'before_delete')
+def _payslip_deleted(mapper, connection, target):
+    # before_delete: the amounts can still be loaded if they were expired
+    pending = _pending(target)
+    if pending is not None:
+        pending['payslips'].append((target.payroll_run_id, target.employee_id,
+                                    [-_amount(getattr(target, name)) for name in LEDGER_FIELDS], -1))
+
+@event.listens_for(PayrollRun, 'after_insert')
+def _run_inserted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending['runs'].setdefault(target.id, (None, None))
+
+@event.listens_for(PayrollRun, 'before_update')
+def _run_updated(mapper, connection, target):
+    if not (get_history(target, 'status').has_changes() or get_history(target, 'pay_date').has_changes()):
+        return
+    pending = _pending(target)
+    if pending is not None and target.id not in pending['runs']:
+        pending['runs'][target.id] = tuple(_stored_row(connection, PayrollRun.__table__, target, ('status', 'pay_date')))
+
+@event.listens_for(PayrollRun, 'before_delete')
+def _run_deleted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None and target.id not in pending['runs']:
+        pending['runs'][target.id] = tuple(_stored_row(connection, PayrollRun.__table__, target, ('status', 'pay_date')))
+
+
+def _year(pay_date):
+    return pay_date.year if pay_date else None
+
+
+@event.listens_for(Session, 'after_flush')
+def _apply_pending_changes(session, flush_context):
+    pending = session.info.pop(PENDING_KEY, None)
+    if not pending:
+        return
+    connection = session.connection()
+    changed_runs = pending['runs']
+
+    run_ids = {run_id for run_id, _, _, _ in pending['payslips']} | set(changed_runs)
+    run_table = PayrollRun.__table__
+    current = {
+        row.id: (row.status, row.pay_date)
+        for row in connection.execute(
+            select(run_table.c.id, run_table.c.status, run_table.c.pay_date)
+            .where(run_table.c.id.in_(run_ids))
+        )
+    } if run_ids else {}
+
+    deltas = _new_deltas()
+    in_changed_runs = defaultdict(list)
+    for run_id, employee_id, amounts, count in pending['payslips']:
+        if run_id in changed_runs:
+            in_changed_runs[run_id].append((employee_id, amounts, count))
+            continue
+        status, pay_date = current.get(run_id, (None, None))
+        if status == 'Processed':
+            _add(deltas, employee_id, _year(pay_date), amounts, count)
+
+    for run_id, (old_status, old_pay_date) in changed_runs.items():
+        new_status, new_pay_date = current.get(run_id, (None, None))
+        was_posted = old_status == 'Processed'
+        is_posted = new_status == 'Processed'
+        if not (was_posted or is_posted):
+            continue
+        if was_posted and is_posted and _year(old_pay_date) == _year(new_pay_date):
+            for employee_id, amounts, count in in_changed_runs[run_id]:
+                _add(deltas, employee_id, _year(new_pay_date), amounts, count)
+            continue
+        # The run enters, leaves or changes year: move its whole contribution.
+        # What was posted before this flush = its payslips now, minus this flush's payslip changes.
+        if is_posted:
+            post_run(connection, run_id, _year(new_pay_date))
+        if was_posted:
+            post_run(connection, run_id, _year(old_pay_date), -1)
+            for employee_id, amounts, count in in_changed_runs[run_id]:
+                _add(deltas, employee_id, _year(old_pay_date), amounts, count)
+
+    apply_deltas(connection, deltas)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_changes(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+# --- LOOKUP ---
+
+def _as_dict(employee_id, year, row):
+    totals = {'employee_id': employee_id, 'year': year}
+    if row is None:
+        totals.update({name: Decimal('0.00') for name in LEDGER_FIELDS}, payslip_count=0)
+    else:
+        totals.update({name: _amount(getattr(row, name)).quantize(CENT) for name in LEDGER_FIELDS},
+                      payslip_count=row.payslip_count)
+    return totals
+
+
+def get_ytd(employee_id, year):
+    """Year-to-date totals of one employee: a single indexed row read (zeros if nothing was paid yet)."""
+    row = db.session.query(YtdLedger).filter_by(employee_id=employee_id, year=year).first()
+    return _as_dict(employee_id, year, row)
+
+
+def get_ytd_many(employee_ids, year):
+    """{employee_id: totals} for many employees in one query."""
+    employee_ids = list(employee_ids)
+    rows = {row.employee_id: row for row in db.session.query(YtdLedger)
+            .filter(YtdLedger.year == year, YtdLedger.employee_id.in_(employee_ids))} if employee_ids else {}
+    return {employee_id: _as_dict(employee_id, year, rows.get(employee_id)) for employee_id in employee_ids}
+
+
+# --- CONSISTENCY CHECK ---
+
+def _expected_totals(year=None):
+    """The ledger as it should be, rebuilt from the payslips of Processed runs in one GROUP BY."""
+    pay_year = extract('year', PayrollRun.pay_date)
+    query = db.session.query(
+        Payslip.employee_id, pay_year, func.count(Payslip.id),
+        *(func.coalesce(func.sum(getattr(Payslip, name)), 0) for name in LEDGER_FIELDS)
+    ).join(PayrollRun, Payslip.payroll_run_id == PayrollRun.id)\
+        .filter(PayrollRun.status == 'Processed', PayrollRun.pay_date.isnot(None))
+    if year is not None:
+        query = query.filter(pay_year == year)
+    query = query.group_by(Payslip.employee_id, pay_year)
+    return {(row[0], int(row[1])): (tuple(_amount(v).quantize(CENT) for v in row[3:]), row[2])
+            for row in query}
+
+
+def _ledger_totals(year=None):
+    query = db.session.query(YtdLedger)
+    if year is not None:
+        query = query.filter(YtdLedger.year == year)
+    return {(row.employee_id, row.year): (tuple(_amount(getattr(row, name)).quantize(CENT) for name in LEDGER_FIELDS),
+                                          row.payslip_count)
+            for row in query}
+
+
+def check_ledger(year=None):
+    """
+    Rebuilds the ledger from scratch and diffs it with the stored one.
+    Returns [((employee_id, year), stored totals or None, expected totals or None)] for
+    every key that differs; ledger rows that net to zero count as absent.
+    """
+    zero = (tuple(Decimal('0.00') for _ in LEDGER_FIELDS), 0)
+    expected = _expected_totals(year)
+    stored = _ledger_totals(year)
+    differences = []
+    for key in sorted(set(expected) | set(stored)):
+        have = stored.get(key)
+        want = expected.get(key)
+        if (have or zero) != (want or zero):
+            differences.append((key, have, want))
+    return differences
+
+
+def rebuild_ledger(year=None):
+    """Replaces the ledger (or one year of it) with totals recomputed from the payslips. Caller commits."""
+    query = db.session.query(YtdLedger)
+    if year is not None:
+        query = query.filter(YtdLedger.year == year)
+    query.delete(synchronize_session=False)
+    rows = []
+    for (employee_id, row_year), (amounts, count) in _expected_totals(year).items():
+        row = {'employee_id': employee_id, 'year': row_year, 'payslip_count': count}
+        row.update(zip(LEDGER_FIELDS, amounts))
+        rows.append(row)
+    if rows:
+        db.session.execute(YtdLedger.__table__.insert(), rows)
+    return len(rows)
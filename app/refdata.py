@@ -0,0 +1,345 @@
+# app/refdata.py
+
+"""
+Reference data shared by every worker process through one memory-mapped file.
+
+Holidays and employee schedules are encoded as flat arrays in a single file
+(REFDATA_PATH; a tmpfs path such as /dev/shm keeps it off disk). Every worker
+maps the same file, and lookups read numpy views of the mapping directly, so
+the data exists once in the page cache however many workers there are.
+
+Freshness is tracked by a generation counter in a small control file next to
+it. Committing a change to a holiday or schedule bumps the counter (through
+the cache tags 'holidays' and 'schedules'). Each segment
+records the generation it was built from. The first worker to notice that its
+segment is older rebuilds the file under an exclusive lock and atomically
+replaces it; the others wait for that lock and then map the new file.
+REFDATA_MAX_AGE bounds how long changes made outside the application (SQL,
+migrations) go unseen. The file's directory is created on first use; if it cannot
+be (a read-only instance folder, say), each process keeps a private in-memory
+segment instead, rebuilt when this process sees a change.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time as _time
+from bisect import bisect_left
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import date, time
+from decimal import Decimal
+
+import numpy as np
+
+from app.cache import cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development server, no lock needed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+MAGIC = b'IMREFDAT'
+# magic, format version, header length, generation built from. Arrays are stored in native
+# byte order: the file is only ever shared between processes of one host.
+HEADER = struct.Struct('=8sIIQ')
+GENERATION = struct.Struct('=Q')
+ALIGNMENT = 8
+INVALIDATING_TAGS = ('holidays', 'schedules')
+
+Schedule = namedtuple('Schedule', 'start_time end_time work_hours_per_day')
+
+
+def _seconds(value):
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _time_of(seconds):
+    seconds = int(seconds)
+    return time(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def _cents(value):
+    return int((Decimal(value) * 100).to_integral_value())
+
+
+# --- ENCODING ---
+
+def _reference_arrays():
+    """Reads the reference tables into the arrays stored in a segment, plus the holiday type names."""
+    from app import db
+    from app.models.user import EmployeeSchedule, Holiday
+
+    holidays = {}
+    for day, holiday_type in db.session.query(Holiday.date, Holiday.type).order_by(Holiday.date, Holiday.type):
+        holidays[day] = holiday_type   # one type per date: the last in (date, type) order
+    type_names = sorted({name for name in holidays.values() if name is not None}) + [None]
+    type_index = {name: index for index, name in enumerate(type_names)}
+
+    schedules = db.session.query(
+        EmployeeSchedule.employee_id, EmployeeSchedule.start_time,
+        EmployeeSchedule.end_time, EmployeeSchedule.work_hours_per_day
+    ).order_by(EmployeeSchedule.employee_id).all()
+
+    arrays = {
+        'holiday_days': np.array([day.toordinal() for day in holidays], dtype='i4'),
+        'holiday_types': np.array([type_index[name] for name in holidays.values()], dtype='u1'),
+        'schedule_employees': np.array([row[0] for row in schedules], dtype='i4'),
+        'schedule_starts': np.array([_seconds(row[1]) for row in schedules], dtype='i4'),
+        'schedule_ends': np.array([_seconds(row[2]) for row in schedules], dtype='i4'),
+        'schedule_hours': np.array([_cents(row[3]) for row in schedules], dtype='i8'),
+    }
+    return arrays, type_names
+
+
+def encode_segment(generation, database_key):
+    """Builds a segment from the database and returns its bytes."""
+    arrays, type_names = _reference_arrays()
+    sections = {}
+    offset = 0
+    for name, array in arrays.items():
+        sections[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({
+        'database': database_key,
+        'built_at': _time.time(),
+        'holiday_type_names': type_names,
+        'sections': sections,
+    }).encode('utf-8')
+    data_start = -(-(HEADER.size + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    segment = bytearray(data_start + offset)
+    HEADER.pack_into(segment, 0, MAGIC, FORMAT_VERSION, len(header), generation)
+    segment[HEADER.size:HEADER.size + len(header)] = header
+    for name, array in arrays.items():
+        start = data_start + sections[name]['offset']
+        segment[start:start + array.nbytes] = array.tobytes()
+    return bytes(segment)
+
+
+def write_segment(path, generation, database_key):
+    """Builds a segment from the database and atomically replaces the file at path."""
+    segment = encode_segment(generation, database_key)
+    fd, temp_path = tempfile.mkstemp(prefix='.refdata-', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(segment)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+# --- READING ---
+
+class ReferenceData:
+    """
+    Read-only views of one segment, mapped from path (or given as bytes). Lookups copy
+    out only the values they return.
+    """
+
+    def __init__(self, path=None, segment=None):
+        if segment is None:
+            with open(path, 'rb') as f:
+                segment = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._map = segment
+        magic, version, header_length, self.generation = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f'{path or "segment"} is not a reference data segment of format {FORMAT_VERSION}')
+        header = json.loads(self._map[HEADER.size:HEADER.size + header_length])
+        self.database = header['database']
+        self.built_at = header['built_at']
+        self._type_names = header['holiday_type_names']
+        data_start = -(-(HEADER.size + header_length) // ALIGNMENT) * ALIGNMENT
+        for name, section in header['sections'].items():
+            dtype = np.dtype(section['dtype'])
+            count = int(np.prod(section['shape']))
+            view = np.frombuffer(self._map, dtype=dtype, count=count, offset=data_start + section['offset'])
+            setattr(self, name, view.reshape(section['shape']))
+        # Single-value lookups bisect memoryviews of the same bytes: much cheaper per call than numpy
+        self._holiday_days = self.holiday_days.data
+        self._schedule_employees = self.schedule_employees.data
+
+    def holidays_between(self, start, end):
+        """{date: holiday type} for [start, end]."""
+        low = bisect_left(self._holiday_days, start.toordinal())
+        high = bisect_left(self._holiday_days, end.toordinal() + 1, low)
+        return {
+            date.fromordinal(day): self._type_names[kind]
+            for day, kind in zip(self._holiday_days[low:high], self.holiday_types.data[low:high])
+        }
+
+    def schedule(self, employee_pk):
+        """Schedule(start_time, end_time, work_hours_per_day) of an employee, or None."""
+        keys = self._schedule_employees
+        index = bisect_left(keys, employee_pk)
+        if index == len(keys) or keys[index] != employee_pk:
+            return None
+        return Schedule(_time_of(self.schedule_starts.data[index]), _time_of(self.schedule_ends.data[index]),
+                        Decimal(self.schedule_hours.data[index]).scaleb(-2))
+
+    def stats(self):
+        return {
+            'generation': self.generation,
+            'built_at': self.built_at,
+            'bytes': len(self._map),
+            'holidays': len(self.holiday_days),
+            'schedules': len(self.schedule_employees),
+        }
+
+
+class SharedReferenceData:
+    """
+    The segment of the application's database, rebuilt when the generation counter
+    moves past the one it was built from (or after REFDATA_MAX_AGE seconds).
+    Falls back to a private in-memory segment when the file cannot be used.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()   # flock() does not exclude threads sharing the descriptor
+        self._current = None
+        self._control = None
+        self.path = None
+        self.max_age = 300
+        self.database_key = None
+        self.private = False              # the file is unusable: this process keeps its own segment
+        self._private_generation = 0
+
+    def init_app(self, app):
+        app.config.setdefault('REFDATA_PATH', None)
+        app.config.setdefault('REFDATA_MAX_AGE', 300)
+        # Named after the database, so apps on different databases never share a segment
+        self.database_key = hashlib.sha1(app.config['SQLALCHEMY_DATABASE_URI'].encode('utf-8')).hexdigest()[:12]
+        self.path = app.config['REFDATA_PATH'] or os.path.join(app.instance_path, f'refdata-{self.database_key}.bin')
+        self.max_age = app.config['REFDATA_MAX_AGE']
+        self._current = None
+        self._control = None
+        self.private = False
+        self._private_generation = 0
+        app.extensions['refdata'] = self
+
+    # --- Generation counter (control file) ---
+
+    def _control_map(self):
+        # flock() locks are shared by descriptors inherited across fork(): each process opens its own
+        if self._control is None or self._control[2] != os.getpid():
+            path = self.path + '.gen'
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size < GENERATION.size:
+                    os.ftruncate(fd, GENERATION.size)
+                self._control = (fd, mmap.mmap(fd, GENERATION.size), os.getpid())
+            except BaseException:
+                os.close(fd)
+                raise
+        return self._control
+
+    def _use_private(self, error):
+        if not self.private:
+            logger.warning('Reference data file %s unavailable, keeping a private copy per process: %s',
+                           self.path, error)
+            self.private = True
+
+    def requested_generation(self):
+        if not self.private:
+            try:
+                return GENERATION.unpack_from(self._control_map()[1])[0]
+            except OSError as e:
+                self._use_private(e)
+        return self._private_generation
+
+    @contextmanager
+    def _exclusive(self):
+        with self._file_lock:
+            fd = self._control_map()[0]
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def invalidate(self):
+        """Marks every worker's segment stale: the next lookup anywhere rebuilds it."""
+        if self.path is None:
+            return
+        if not self.private:
+            try:
+                with self._exclusive():
+                    control = self._control_map()[1]
+                    GENERATION.pack_into(control, 0, GENERATION.unpack_from(control)[0] + 1)
+                return
+            except OSError as e:
+                self._use_private(e)
+        with self._lock:
+            self._private_generation += 1
+            self._current = None
+
+    # --- Segment ---
+
+    def _is_fresh(self, data, requested):
+        return (data is not None and data.database == self.database_key and data.generation >= requested
+                and (not self.max_age or _time.time() - data.built_at < self.max_age))
+
+    def _open(self):
+        if self.private:
+            return None
+        try:
+            return ReferenceData(self.path)
+        except (OSError, ValueError):
+            return None
+
+    def current(self):
+        """The ReferenceData to read; maps (or builds) the newest segment when this one is stale."""
+        if self.path is None:
+            raise RuntimeError('refdata.init_app() has not been called')
+        requested = self.requested_generation()
+        data = self._current
+        if self._is_fresh(data, requested):
+            return data
+        with self._lock:
+            data = self._current
+            if self._is_fresh(data, requested):
+                return data
+            data = self._open()
+            if not self._is_fresh(data, requested):
+                data = self._rebuild()
+            self._current = data
+        return data
+
+    def _rebuild(self):
+        if not self.private:
+            try:
+                with self._exclusive():
+                    # Another worker may have rebuilt it while this one waited for the lock
+                    requested = self.requested_generation()
+                    data = self._open()
+                    if not self._is_fresh(data, requested):
+                        write_segment(self.path, requested, self.database_key)
+                        data = ReferenceData(self.path)
+                return data
+            except OSError as e:
+                self._use_private(e)
+        return ReferenceData(segment=encode_segment(self._private_generation, self.database_key))
+
+    def stats(self):
+        data = self._current
+        return dict(data.stats(), path=self.path, private=self.private,
+                    requested_generation=self.requested_generation()) \
+            if data is not None else {'path': self.path, 'private': self.private}
+
+
+refdata = SharedReferenceData()
+cache.subscribe(INVALIDATING_TAGS, refdata.invalidate)
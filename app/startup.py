@@ -0,0 +1,336 @@
+# app/startup.py
+
+"""
+Startup path: warming a freshly loaded app, and measuring what importing it costs.
+
+warm_up() does the work a worker would otherwise do on its first requests:
+compiling every template, mapping the shared reference data, building the
+employee search index and opening a database connection. gunicorn.conf.py
+runs it once in the master (preload_app), before the workers are forked, so
+they all start with the result.
+
+template_benchmark() times template compilation with and without the bytecode
+cache, and rendering a large attendance log table (`flask startup templates`).
+
+import_time_report() runs `python -X importtime -c "import run"` in a fresh
+interpreter and totals the per-module times; `flask startup importtime` prints
+it and fails when the total goes over a budget or regresses against a saved
+baseline.
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time as _time
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+
+import click
+from flask import render_template
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import text
+
+from app import db, refdata
+from app.timezone import local_timestamps
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TOLERANCE_PERCENT = 20
+# Per-package regressions below this are import-time noise
+MIN_REGRESSION_MS = 10.0
+
+logger = logging.getLogger(__name__)
+
+
+# --- BYTECODE CACHE ---
+
+class LazyBytecodeCache(FileSystemBytecodeCache):
+    """
+    FileSystemBytecodeCache that creates its directory on the first write. If the directory
+    cannot be created or written (e.g. a read-only deployment), templates are compiled in
+    memory as if there were no bytecode cache.
+    """
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.disabled = False
+
+    def load_bytecode(self, bucket):
+        if self.disabled:
+            return
+        try:
+            super().load_bytecode(bucket)
+        except OSError:
+            pass  # a miss: the template is compiled, and dump_bytecode() reports the problem
+
+    def dump_bytecode(self, bucket):
+        if self.disabled:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            super().dump_bytecode(bucket)
+        except OSError as e:
+            self.disabled = True
+            logger.warning('Jinja bytecode cache %s unavailable, compiling templates in memory: %s', self.directory, e)
+
+
+# --- WARMUP ---
+
+def compile_templates(app):
+    """Loads (and so compiles) every .html template; returns how many."""
+    names = app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html'))
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def prime_connection():
+    """Opens a pooled database connection and returns it to the pool."""
+    db.session.execute(text('SELECT 1'))
+    db.session.remove()
+
+
+def warm_up(app, connect=True):
+    """Runs the warmup steps in an app context; returns {step: seconds}."""
+    from app.hr.search import employee_index
+
+    steps = [
+        ('templates', lambda: compile_templates(app)),
+        ('reference_data', refdata.current),
+        ('employee_search', employee_index.build),
+    ]
+    if connect:
+        steps.append(('database', prime_connection))
+
+    timings = {}
+    with app.app_context():
+        for name, step in steps:
+            started = _time.perf_counter()
+            step()
+            timings[name] = round(_time.perf_counter() - started, 4)
+        db.session.remove()
+    return timings
+
+
+# --- TEMPLATES ---
+
+TIMESTAMP_FORMAT = '%b %d, %Y at %I:%M:%S %p'
+# The timestamp column of the log tables, converted per row and in batches
+PER_ROW_COLUMN = "{% for log in logs %}<td>{{ log.timestamp | localtime(format) }}</td>{% endfor %}"
+BULK_COLUMN = "{% for log, local_time in logs %}<td>{{ local_time | datetime_format(format) }}</td>{% endfor %}"
+
+BenchLog = namedtuple('BenchLog', 'id timestamp employee event_type source')
+BenchEmployee = namedtuple('BenchEmployee', 'first_name last_name employee_id_number')
+
+
+def bench_logs(count):
+    """count synthetic attendance log rows, a punch every 7 minutes going back from 2025-06-30."""
+    employee = BenchEmployee('Juan', 'Dela Cruz', 'EMP-00001')
+    latest = datetime(2025, 6, 30, 18, 0)
+    return [BenchLog(count - i, latest - timedelta(minutes=7 * i), employee,
+                     'IN' if i % 2 else 'OUT', 'Employee Self-Service')
+            for i in range(count)]
+
+
+def _best_of(repeat, function):
+    best = None
+    for _ in range(repeat):
+        started = _time.perf_counter()
+        function()
+        elapsed = _time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 4)
+
+
+def _compile_all(app, bytecode_cache):
+    env = app.create_jinja_environment()
+    env.filters.update(app.jinja_env.filters)  # filter names are checked at compile time
+    env.tests.update(app.jinja_env.tests)
+    env.bytecode_cache = bytecode_cache
+    for name in env.list_templates(filter_func=lambda name: name.endswith('.html')):
+        env.get_template(name)
+
+
+def template_benchmark(app, rows=10000, repeat=3):
+    """
+    Seconds (fastest of repeat) to compile every template from source and from a warm
+    bytecode cache, and to render a rows-long log table timestamp column per row and in
+    batches, and the full log_history.html page.
+    """
+    logs = bench_logs(rows)
+    timings = {}
+
+    directory = tempfile.mkdtemp(prefix='jinja-bench-')
+    try:
+        bytecode_cache = FileSystemBytecodeCache(directory)
+        timings['compile_from_source'] = _best_of(repeat, lambda: _compile_all(app, None))
+        _compile_all(app, bytecode_cache)
+        timings['compile_from_bytecode_cache'] = _best_of(repeat, lambda: _compile_all(app, bytecode_cache))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    with app.test_request_context():
+        per_row = app.jinja_env.from_string(PER_ROW_COLUMN)
+        bulk = app.jinja_env.from_string(BULK_COLUMN)
+        timings['column_per_row'] = _best_of(
+            repeat, lambda: per_row.render(logs=logs, format=TIMESTAMP_FORMAT))
+        timings['column_batched'] = _best_of(
+            repeat, lambda: bulk.render(logs=local_timestamps(logs), format=TIMESTAMP_FORMAT))
+        timings['log_history_page'] = _best_of(
+            repeat, lambda: render_template('log_history.html', logs=local_timestamps(logs)))
+    return timings
+
+
+# --- IMPORT TIME ---
+
+def parse_importtime(output):
+    """
+    [(module, self_us, cumulative_us, depth)] from the stderr of `python -X importtime`,
+    in the order the imports finished.
+    """
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the column header
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        rows.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return rows
+
+
+def measure_imports(module='run', repeat=3):
+    """
+    Imports module in `repeat` fresh interpreters and keeps each module's fastest time, which
+    filters out most scheduling and disk-cache noise. Returns {module: (self_us, cumulative_us)}.
+    """
+    best = {}
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=ROOT, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise click.ClickException(f'import {module} failed:\n{result.stderr[-2000:]}')
+        run = {}
+        for name, self_us, cumulative_us, _ in parse_importtime(result.stderr):
+            # A module can be listed twice (an import that failed once, then succeeded)
+            previous_self, previous_cumulative = run.get(name, (0, 0))
+            run[name] = (previous_self + self_us, max(previous_cumulative, cumulative_us))
+        for name, times in run.items():
+            if name not in best or times[1] < best[name][1]:
+                best[name] = times
+    return best
+
+
+def import_time_report(module='run', repeat=3):
+    """Total and per top-level package import time (ms) of module, slowest modules first."""
+    times = measure_imports(module, repeat)
+    packages = defaultdict(float)
+    for name, (self_us, _) in times.items():
+        packages[name.split('.')[0]] += self_us / 1000
+    return {
+        'module': module,
+        'total_ms': round(times[module][1] / 1000, 1) if module in times else 0.0,
+        'packages': {name: round(ms, 1) for name, ms in sorted(packages.items(), key=lambda item: -item[1])},
+        'modules': sorted(((name, round(cumulative / 1000, 1), round(self_us / 1000, 1))
+                           for name, (self_us, cumulative) in times.items()), key=lambda row: -row[1]),
+    }
+
+
+def check_budget(report, budget_ms=None, baseline=None, tolerance_percent=DEFAULT_TOLERANCE_PERCENT):
+    """Messages for every budget or baseline the report goes over (empty when within budget)."""
+    problems = []
+    if budget_ms is not None and report['total_ms'] > budget_ms:
+        problems.append(f"total {report['total_ms']} ms is over the {budget_ms} ms budget")
+    if baseline:
+        factor = 1 + tolerance_percent / 100
+        if report['total_ms'] > baseline['total_ms'] * factor:
+            problems.append(f"total {report['total_ms']} ms regressed from {baseline['total_ms']} ms "
+                            f"(more than {tolerance_percent}%)")
+        for name, ms in report['packages'].items():
+            before = baseline['packages'].get(name, 0.0)
+            if ms - before > MIN_REGRESSION_MS and ms > before * factor:
+                problems.append(f'{name}: {ms} ms, was {before} ms')
+    return problems
+
+
+# --- CLI ---
+
+@click.group('startup')
+def startup_cli():
+    """Startup warmup, template and import-time measurements."""
+
+
+@startup_cli.command('warmup')
+@with_appcontext
+def warmup_command():
+    """Run the warmup steps once and print how long each took."""
+    from flask import current_app
+    for name, seconds in warm_up(current_app._get_current_object()).items():
+        click.echo(f'{name:16} {seconds * 1000:8.1f} ms')
+
+
+@startup_cli.command('templates')
+@click.option('--rows', default=10000, show_default=True, type=click.IntRange(min=1), help='Log table rows to render.')
+@click.option('--repeat', default=3, show_default=True, type=click.IntRange(min=1), help='Runs per step (fastest is kept).')
+@with_appcontext
+def templates_command(rows, repeat):
+    """Time template compilation and rendering a large log table."""
+    from flask import current_app
+    for name, seconds in template_benchmark(current_app._get_current_object(), rows, repeat).items():
+        click.echo(f'{name:28} {seconds * 1000:8.1f} ms')
+
+
+@startup_cli.command('importtime')
+@click.option('--module', default='run', show_default=True, help='Module to import.')
+@click.option('--repeat', default=3, show_default=True, type=click.IntRange(min=1),
+              help='Fresh interpreters to import it in (fastest time per module is kept).')
+@click.option('--top', default=20, show_default=True, type=click.IntRange(min=0), help='Slowest modules to list.')
+@click.option('--budget-ms', type=float,
+              help='Fail when the total import time is over this (default: IMPORT_TIME_BUDGET_MS).')
+@click.option('--baseline', type=click.Path(dir_okay=False),
+              help='JSON report to compare against (default: IMPORT_TIME_BASELINE, when the file exists).')
+@click.option('--tolerance', default=DEFAULT_TOLERANCE_PERCENT, show_default=True, type=float,
+              help='Allowed regression against the baseline, in percent.')
+@click.option('--save-baseline', type=click.Path(dir_okay=False), help='Write this report as the new baseline.')
+@with_appcontext
+def importtime_command(module, repeat, top, budget_ms, baseline, tolerance, save_baseline):
+    """Measure `import run` with -X importtime and check it against a budget."""
+    from flask import current_app
+    if budget_ms is None and baseline is None:
+        budget_ms = current_app.config['IMPORT_TIME_BUDGET_MS']
+        if os.path.exists(current_app.config['IMPORT_TIME_BASELINE']):
+            baseline = current_app.config['IMPORT_TIME_BASELINE']
+    report = import_time_report(module, repeat)
+    click.echo(f"import {module}: {report['total_ms']} ms (fastest of {repeat})")
+    if top:
+        click.echo('\nBy package (self time):')
+        for name, ms in list(report['packages'].items())[:top]:
+            click.echo(f'  {ms:8.1f} ms  {name}')
+        click.echo('\nSlowest modules (cumulative / self):')
+        for name, cumulative, self_ms in report['modules'][:top]:
+            click.echo(f'  {cumulative:8.1f} ms {self_ms:8.1f} ms  {name}')
+
+    if save_baseline:
+        with open(save_baseline, 'w') as f:
+            json.dump({key: report[key] for key in ('module', 'total_ms', 'packages')}, f, indent=2)
+        click.echo(f'\nBaseline written to {save_baseline}.')
+
+    previous = None
+    if baseline:
+        with open(baseline) as f:
+            previous = json.load(f)
+    problems = check_budget(report, budget_ms, previous, tolerance)
+    if problems:
+        raise click.ClickException('Import time over budget:\n  ' + '\n  '.join(problems))
+    if budget_ms is not None or previous:
+        checked = [f'{budget_ms} ms budget'] if budget_ms is not None else []
+        checked += [f'baseline {baseline}'] if previous else []
+        click.echo(f"\nWithin budget ({', '.join(checked)}).")
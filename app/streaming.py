@@ -0,0 +1,67 @@
+# app/streaming.py
+
+"""
+Streamed rendering for large admin tables.
+
+stream_page() renders the same bytes as render_template(), but sends them while the
+rows are still being fetched, so time-to-first-byte and peak memory stay flat as the
+table grows. Pass row sets as StreamedQuery so they are read in yield_per() batches.
+"""
+
+from flask import get_flashed_messages, stream_template
+
+from app import db
+
+# Rows fetched per round trip while a page is streaming
+STREAM_BATCH_SIZE = 500
+# Template output is coalesced into chunks of roughly this many characters
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+class StreamedQuery:
+    """
+    Wraps a query for templates: iterating uses yield_per() (a server-side cursor on
+    PostgreSQL), while len() and truth tests run a COUNT / EXISTS instead of loading rows.
+    """
+
+    def __init__(self, query, batch_size=STREAM_BATCH_SIZE):
+        self.query = query
+        self.batch_size = batch_size
+        self._count = None
+
+    def __iter__(self):
+        return iter(self.query.yield_per(self.batch_size))
+
+    def __len__(self):
+        if self._count is None:
+            self._count = self.query.order_by(None).count()
+        return self._count
+
+    def __bool__(self):
+        if self._count is not None:
+            return self._count > 0
+        return db.session.query(self.query.order_by(None).exists()).scalar()
+
+
+def _coalesce(chunks, size):
+    buffer = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_page(template_name, **context):
+    """
+    Drop-in replacement for render_template() on pages with very large tables.
+    Flashed messages are popped before streaming starts: the session cookie goes out
+    with the headers, before base.html gets to read them.
+    """
+    get_flashed_messages()
+    return _coalesce(stream_template(template_name, **context), STREAM_CHUNK_SIZE)
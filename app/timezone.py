@@ -0,0 +1,120 @@
+# app/timezone.py
+
+"""
+Local time helpers. Timestamps are stored as naive UTC; the business operates in
+the TIMEZONE from the config (Asia/Manila by default).
+"""
+
+from bisect import bisect_right
+from datetime import timedelta
+from functools import lru_cache
+from itertools import islice
+
+import pytz
+from flask import current_app, has_app_context
+
+DEFAULT_TIMEZONE = 'Asia/Manila'
+# Rows converted together by local_timestamps(), e.g. one streaming batch
+LOCAL_TIME_BATCH_SIZE = 500
+
+
+@lru_cache(maxsize=None)
+def get_timezone(name):
+    """pytz timezone for a name, looked up once per process."""
+    return pytz.UTC if name == 'UTC' else pytz.timezone(name)
+
+
+def configured_timezone_name():
+    if has_app_context():
+        return current_app.config.get('TIMEZONE', DEFAULT_TIMEZONE)
+    return DEFAULT_TIMEZONE
+
+
+def local_tz():
+    return get_timezone(configured_timezone_name())
+
+
+def to_local(timestamp, tz=None):
+    """Naive local datetime for a naive-UTC (or aware) timestamp."""
+    tz = tz or local_tz()
+    if timestamp.tzinfo is None:
+        return tz.fromutc(timestamp.replace(tzinfo=tz)).replace(tzinfo=None)
+    return timestamp.astimezone(tz).replace(tzinfo=None)
+
+
+def to_utc(timestamp, tz=None):
+    """Naive UTC datetime (the stored form) for a naive local (or aware) timestamp, e.g. form input."""
+    tz = tz or local_tz()
+    if timestamp.tzinfo is None:
+        timestamp = tz.localize(timestamp)
+    return timestamp.astimezone(pytz.UTC).replace(tzinfo=None)
+
+
+def localize(timestamp, tz=None):
+    """Aware local datetime for a naive-UTC (or aware) timestamp, for formatting with %Z/%z."""
+    tz = tz or local_tz()
+    if timestamp.tzinfo is None:
+        return tz.fromutc(timestamp.replace(tzinfo=tz))
+    return timestamp.astimezone(tz)
+
+
+def local_date(timestamp, tz=None):
+    """Local calendar date of a timestamp (the attendance work date)."""
+    return to_local(timestamp, tz).date()
+
+
+def fixed_offset(start, end, tz=None):
+    """
+    The UTC offset if it is the same all through the naive-UTC range [start, end]
+    (checked hourly), else None. Lets bulk conversions add a timedelta per row.
+    """
+    tz = tz or local_tz()
+    offset = to_local(start, tz) - start
+    transitions = getattr(tz, '_utc_transition_times', None)
+    if transitions is not None:
+        # pytz zones list their UTC transition times: only those inside the range can change the offset
+        moments = transitions[bisect_right(transitions, start):bisect_right(transitions, end)]
+    elif isinstance(tz, (pytz.tzinfo.StaticTzInfo, type(pytz.UTC))):
+        moments = ()
+    else:
+        moments = _hourly(start, end)
+    for moment in moments:
+        if to_local(moment, tz) - moment != offset:
+            return None
+    return offset
+
+
+def _hourly(start, end):
+    moment = start
+    while moment < end:
+        moment = min(moment + timedelta(hours=1), end)
+        yield moment
+
+
+def to_local_many(timestamps, tz=None):
+    """
+    to_local() for a list of naive-UTC timestamps (None stays None). When the offset is the
+    same across the list's range, which is almost always, it is added to every row instead
+    of converting them one by one.
+    """
+    tz = tz or local_tz()
+    present = [timestamp for timestamp in timestamps if timestamp is not None]
+    if not present:
+        return list(timestamps)
+    offset = None
+    if all(timestamp.tzinfo is None for timestamp in present):
+        offset = fixed_offset(min(present), max(present), tz)
+    if offset is None:
+        return [None if timestamp is None else to_local(timestamp, tz) for timestamp in timestamps]
+    return [None if timestamp is None else timestamp + offset for timestamp in timestamps]
+
+
+def local_timestamps(rows, attribute='timestamp', batch_size=LOCAL_TIME_BATCH_SIZE, tz=None):
+    """
+    Yields (row, local timestamp) for list pages, converting batch_size rows at a time with
+    to_local_many(). Rows are pulled lazily, so a streamed query keeps streaming.
+    """
+    tz = tz or local_tz()
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        yield from zip(batch, to_local_many([getattr(row, attribute) for row in batch], tz))
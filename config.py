@@ -23,6 +23,51 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     
+    # Photo serving: content-addressed photos are cached by browsers for this long (seconds)
+    PHOTO_CACHE_MAX_AGE = int(os.environ.get('PHOTO_CACHE_MAX_AGE', 31536000))
+    # Offload file transfer to the front-end server (Apache/lighttpd X-Sendfile or nginx X-Accel-Redirect)
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+    UPLOAD_ACCEL_REDIRECT_PREFIX = os.environ.get('UPLOAD_ACCEL_REDIRECT_PREFIX')  # e.g. '/protected/profile_pics'
+    
+    # Pagination for the staff directory / schedule pages
+    STAFF_PER_PAGE = 50
+    STAFF_MAX_PER_PAGE = 200
+    
+    # Leave request queue
+    LEAVE_REQUESTS_PER_PAGE = 25
+    PENDING_LEAVE_COUNT_TTL = int(os.environ.get('PENDING_LEAVE_COUNT_TTL', 60))
+    
+    # Employee typeahead index: rebuild after this many seconds to pick up other workers' edits
+    EMPLOYEE_SEARCH_TTL = int(os.environ.get('EMPLOYEE_SEARCH_TTL', 300))
+
+    # Rendered payslip pages (employee self-service), per worker process
+    PAYSLIP_CACHE_MAX_ENTRIES = int(os.environ.get('PAYSLIP_CACHE_MAX_ENTRIES', 2048))
+    PAYSLIP_CACHE_MAX_BYTES = int(os.environ.get('PAYSLIP_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    PAYSLIP_CACHE_TTL = int(os.environ.get('PAYSLIP_CACHE_TTL', 3600))
+
+    # Application cache (app/cache.py): per-worker LRU tier
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+    CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+    # Optional SQLite file shared by every worker on the host (unset: per-worker tier only)
+    CACHE_SHARED_PATH = os.environ.get('CACHE_SHARED_PATH')
+    CACHE_SHARED_MAX_BYTES = int(os.environ.get('CACHE_SHARED_MAX_BYTES', 256 * 1024 * 1024))
+    # How often (seconds) a worker replays invalidations logged by the others
+    CACHE_SYNC_INTERVAL = float(os.environ.get('CACHE_SYNC_INTERVAL', 1.0))
+
+    # Reference data shared by all workers through one mapped file (app/refdata.py).
+    # Unset: instance/refdata-<database hash>.bin; a tmpfs path (/dev/shm/...) keeps it in memory.
+    REFDATA_PATH = os.environ.get('REFDATA_PATH')
+    # Rebuild after this many seconds even without a change seen by the app (0: never)
+    REFDATA_MAX_AGE = int(os.environ.get('REFDATA_MAX_AGE', 300))
+    
+    # Compiled Jinja templates, shared by every process (unset: instance/jinja-bytecode)
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')
+    
+    # `flask startup importtime` checks against these when given no --budget-ms / --baseline
+    IMPORT_TIME_BUDGET_MS = float(os.environ.get('IMPORT_TIME_BUDGET_MS', 1500))
+    IMPORT_TIME_BASELINE = os.environ.get('IMPORT_TIME_BASELINE') or os.path.join(basedir, 'importtime-baseline.json')
+    
     # Logging
     LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT')
     
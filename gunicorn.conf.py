@@ -0,0 +1,84 @@
+# gunicorn.conf.py
+
+"""
+Gunicorn deployment profile: `gunicorn -c gunicorn.conf.py run:app` (see Procfile).
+
+The app is imported once in the master (preload_app) and warmed up there
+(app/startup.py: templates compiled, reference data mapped, search index
+built) before the workers are forked, so every worker, including the ones
+that replace recycled workers, starts warm. Each worker then opens its own
+database connection before taking requests; connections are never shared
+across fork().
+
+Sizing follows the CPUs actually available to the process (affinity and cgroup
+quota): 2 x cores + 1 workers with GUNICORN_THREADS threads each (requests
+mostly wait on the database). WEB_CONCURRENCY overrides the worker count.
+"""
+
+import math
+import os
+
+
+def available_cores():
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # not Linux
+        cores = os.cpu_count() or 1
+    try:
+        # cgroup v2 CPU quota, e.g. "200000 100000" for two CPUs (containers, PaaS dynos)
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            cores = min(cores, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cores
+
+
+cores = available_cores()
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+workers = int(os.environ.get('WEB_CONCURRENCY', 2 * cores + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 2))
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = True
+
+# Web payroll runs and exports can take minutes on large workforces
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers to bound slow leaks; replacements fork from the warm master
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def when_ready(server):
+    """Master, app loaded, before the first fork: warm up once for every worker."""
+    from app import db
+    from app.startup import warm_up
+
+    app = server.app.wsgi()
+    timings = warm_up(app, connect=False)
+    server.log.info('Warmup: %s', ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, seconds in timings.items()))
+    with app.app_context():
+        db.engine.dispose()
+
+
+def post_fork(server, worker):
+    """Worker: drop any pooled connection inherited from the master without closing it."""
+    from app import db
+
+    with server.app.wsgi().app_context():
+        db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    """Worker: open its database connection before accepting requests."""
+    from app.startup import prime_connection
+
+    with worker.wsgi.app_context():
+        prime_connection()
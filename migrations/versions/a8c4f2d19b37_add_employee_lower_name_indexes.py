@@ -0,0 +1,35 @@
+"""add employee lower name indexes
+
+Revision ID: a8c4f2d19b37
+Revises: d7e3b9a41f06
+Create Date: 2026-10-20 10:04:52.118306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8c4f2d19b37'
+down_revision: Union[str, Sequence[str], None] = 'd7e3b9a41f06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('employee', schema=None) as batch_op:
+        batch_op.create_index('ix_employee_lower_last_name', [sa.text('lower(last_name)')], unique=False)
+        batch_op.create_index('ix_employee_lower_first_name', [sa.text('lower(first_name)')], unique=False)
+        batch_op.create_index('ix_employee_lower_employee_id_number', [sa.text('lower(employee_id_number)')],
+                              unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('employee', schema=None) as batch_op:
+        batch_op.drop_index('ix_employee_lower_employee_id_number')
+        batch_op.drop_index('ix_employee_lower_first_name')
+        batch_op.drop_index('ix_employee_lower_last_name')
@@ -0,0 +1,81 @@
+# tests/conftest.py
+
+import os
+from datetime import date, datetime, time
+from decimal import Decimal
+
+import pytest
+
+from app import create_app, db
+from app.models.user import AttendanceLog, Employee, EmployeeSchedule, User
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Factory for apps on their own SQLite file under tmp_path, with every generated file kept there too."""
+    # Read by config.py in spawned worker processes as well
+    monkeypatch.setenv('REFDATA_PATH', str(tmp_path / 'refdata.bin'))
+    monkeypatch.setenv('JINJA_BYTECODE_CACHE_DIR', str(tmp_path / 'jinja-bytecode'))
+
+    def make(name='app'):
+        app = create_app('default', {
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp_path, f'{name}.db'),
+            'REFDATA_PATH': str(tmp_path / f'refdata-{name}.bin'),
+            'JINJA_BYTECODE_CACHE_DIR': str(tmp_path / 'jinja-bytecode'),
+            'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+            'TESTING': True,
+            'WTF_CSRF_ENABLED': False,
+        })
+        with app.app_context():
+            db.create_all()
+        return app
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def seed_employees(count, start=date(2025, 3, 3), days=10):
+    """count active employees on a 09:00-18:00 schedule, each with a full week of punches from start."""
+    employees = []
+    for i in range(count):
+        user = User(username=f'employee{i}@example.com', role='Employee', full_name=f'Employee {i}')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.flush()
+        employee = Employee(user_id=user.id, employee_id_number=f'EMP{i:04d}', first_name=f'First{i}',
+                            last_name=f'Last{i}', date_hired=date(2024, 1, 1),
+                            salary_rate=Decimal(20000 + 750 * i), status='Active')
+        db.session.add(employee)
+        db.session.flush()
+        db.session.add(EmployeeSchedule(employee_id=employee.id, start_time=time(9), end_time=time(18),
+                                        work_hours_per_day=Decimal('8.00')))
+        for offset in range(days):
+            day = date.fromordinal(start.toordinal() + offset)
+            if day.weekday() < 5:
+                # Manila (UTC+8): 09:00 + i minutes late, out at 18:00 + i minutes
+                db.session.add(AttendanceLog(employee_id=employee.id, timestamp=datetime(day.year, day.month, day.day, 1, i % 30),
+                                             event_type='IN'))
+                db.session.add(AttendanceLog(employee_id=employee.id, timestamp=datetime(day.year, day.month, day.day, 10, i % 45),
+                                             event_type='OUT'))
+        employees.append(employee)
+    db.session.commit()
+    return employees
+
+
+def admin_client(app):
+    """A test client logged in as a new Admin user."""
+    admin = User(username='admin@example.com', role='Admin', full_name='Admin')
+    admin.set_password('password')
+    db.session.add(admin)
+    db.session.commit()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+        session['_fresh'] = True
+    return client
@@ -0,0 +1,73 @@
+# tests/test_daily_hours.py
+
+import random
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from app import db
+from app.attendance.daily_hours import METRIC_FIELDS, compare_with_python, daily_hours
+from app.models.user import AttendanceLog, Employee, EmployeeSchedule
+from app.payroll.calculator import iter_shifts, local_punches
+
+START = date(2025, 3, 3)
+END = date(2025, 3, 16)
+# Local (Manila) shift starts: day, late evening and graveyard schedules
+SHIFT_STARTS = (time(9), time(18), time(22))
+MANILA = timedelta(hours=8)
+
+
+def generate_punches(employee_id, start_time, rng):
+    """Two weeks of local punches around the schedule, with the usual mistakes mixed in."""
+    punches = []
+    for offset in range(-1, (END - START).days + 2):
+        day = START + timedelta(days=offset)
+        shift_start = datetime.combine(day, start_time) + timedelta(minutes=rng.randint(-30, 45))
+        shift_end = shift_start + timedelta(hours=rng.choice((8, 9, 10)), minutes=rng.randint(0, 59))
+        kind = rng.random()
+        if kind < 0.1:
+            continue  # absent
+        elif kind < 0.2:
+            punches.append((shift_start, 'IN'))  # forgotten clock-out
+        elif kind < 0.3:
+            punches.append((shift_end, 'OUT'))  # orphan clock-out
+        elif kind < 0.4:
+            punches += [(shift_start, 'IN'), (shift_start + timedelta(minutes=3), 'IN'), (shift_end, 'OUT')]
+        elif kind < 0.5:
+            lunch = shift_start + timedelta(hours=4)
+            punches += [(shift_start, 'IN'), (lunch, 'OUT'), (lunch + timedelta(hours=1), 'IN'), (shift_end, 'OUT')]
+        else:
+            punches += [(shift_start, 'IN'), (shift_end, 'OUT')]
+    return [AttendanceLog(employee_id=employee_id, timestamp=local - MANILA, event_type=event_type)
+            for local, event_type in punches]
+
+
+def test_sql_daily_hours_match_iter_shifts(app):
+    rng = random.Random(45)
+    schedules = {}
+    for i in range(12):
+        employee = Employee(employee_id_number=f'EMP{i:04d}', first_name=f'First{i}', last_name=f'Last{i}',
+                            date_hired=date(2024, 1, 1), salary_rate=Decimal('20000.00'), status='Active')
+        db.session.add(employee)
+        db.session.flush()
+        if i % 4 != 3:  # every fourth employee has no schedule (09:00 default)
+            schedules[employee.id] = EmployeeSchedule(
+                employee_id=employee.id, start_time=SHIFT_STARTS[i % 4], end_time=time(6),
+                work_hours_per_day=Decimal('8.00'))
+            db.session.add(schedules[employee.id])
+        db.session.add_all(generate_punches(employee.id, SHIFT_STARTS[i % 4] if i % 4 != 3 else time(9), rng))
+    db.session.commit()
+
+    expected = {}
+    for employee_id in {log.employee_id for log in AttendanceLog.query}:
+        logs = AttendanceLog.query.filter_by(employee_id=employee_id)\
+            .order_by(AttendanceLog.timestamp, AttendanceLog.id).all()
+        for work_date, metrics in iter_shifts(local_punches(logs), schedules.get(employee_id)):
+            if START <= work_date <= END:
+                expected[employee_id, work_date] = {name: metrics[name] for name in METRIC_FIELDS}
+
+    actual = {(employee_id, work_date): metrics for employee_id, work_date, metrics in daily_hours(START, END)}
+    assert actual == expected
+    assert compare_with_python(START, END) == []
+    # Graveyard shifts stay whole instead of being split at midnight
+    assert any(metrics['total_hours'] >= Decimal('8.00') for (employee_id, _), metrics in actual.items()
+               if schedules.get(employee_id) and schedules[employee_id].start_time == time(22))
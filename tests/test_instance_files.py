@@ -0,0 +1,51 @@
+# tests/test_instance_files.py
+
+import os
+from datetime import date
+
+from app import create_app, db, refdata
+from app.models.user import Holiday
+
+
+def test_generated_files_are_created_on_first_use(tmp_path):
+    bytecode_dir = tmp_path / 'jinja-bytecode'
+    refdata_path = tmp_path / 'refdata' / 'segment.bin'
+    app = create_app('default', {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp_path, 'app.db'),
+        'REFDATA_PATH': str(refdata_path),
+        'JINJA_BYTECODE_CACHE_DIR': str(bytecode_dir),
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+    })
+    assert not bytecode_dir.exists() and not refdata_path.parent.exists()
+
+    with app.app_context():
+        db.create_all()
+        app.jinja_env.get_template('base.html')
+        refdata.current()
+        db.session.remove()
+    assert any(bytecode_dir.iterdir())
+    assert refdata_path.exists()
+
+
+def test_unwritable_locations_fall_back_to_memory(tmp_path):
+    # A regular file where a directory should be: os.makedirs() fails even for root
+    blocker = tmp_path / 'read-only'
+    blocker.write_text('')
+    app = create_app('default', {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp_path, 'app.db'),
+        'REFDATA_PATH': str(blocker / 'refdata.bin'),
+        'JINJA_BYTECODE_CACHE_DIR': str(blocker / 'jinja-bytecode'),
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+    })
+
+    with app.app_context():
+        db.create_all()
+        assert app.jinja_env.get_template('base.html') is not None
+        assert app.jinja_env.bytecode_cache.disabled
+
+        assert refdata.current().holidays_between(date(2025, 1, 1), date(2025, 12, 31)) == {}
+        assert refdata.private
+        db.session.add(Holiday(name='New Year', date=date(2025, 1, 1), type='Regular'))
+        db.session.commit()
+        assert refdata.current().holidays_between(date(2025, 1, 1), date(2025, 12, 31)) == {date(2025, 1, 1): 'Regular'}
+        db.session.remove()
@@ -0,0 +1,47 @@
+# tests/test_manual_log.py
+
+from datetime import date, datetime
+
+from app import db
+from app.models.user import AttendanceLog
+
+from conftest import admin_client, seed_employees
+
+
+def post_punch(client, employee_id, when, event_type):
+    return client.post('/attendance/log/manual', data={
+        'employee_id': employee_id,
+        'timestamp': when,
+        'event_type': event_type,
+        'source': 'HR Manual',
+    })
+
+
+def test_manual_punches_are_entered_in_local_time(app):
+    employee = seed_employees(1, days=0)[0]
+    client = admin_client(app)
+    assert post_punch(client, employee.id, '2025-03-10 09:00:00', 'IN').status_code == 302
+    assert post_punch(client, employee.id, '2025-03-10 17:00:00', 'OUT').status_code == 302
+
+    punch_in, punch_out = AttendanceLog.query.order_by(AttendanceLog.timestamp).all()
+    # Asia/Manila is UTC+8
+    assert punch_in.timestamp == datetime(2025, 3, 10, 1, 0)
+    assert punch_out.timestamp == datetime(2025, 3, 10, 9, 0)
+    assert punch_in.work_date == punch_out.work_date == date(2025, 3, 10)
+
+    events = client.get('/attendance/events?start=2025-03-10&end=2025-03-11').get_json()
+    assert sorted(event['start'] for event in events) == ['2025-03-10T09:00:00', '2025-03-10T17:00:00']
+
+
+def test_edit_log_round_trips_local_time(app):
+    employee = seed_employees(1, days=0)[0]
+    client = admin_client(app)
+    post_punch(client, employee.id, '2025-03-10 09:00:00', 'IN')
+    log = AttendanceLog.query.one()
+
+    page = client.get(f'/attendance/log/edit/{log.id}').get_data(as_text=True)
+    assert '2025-03-10 09:00:00' in page
+
+    client.post(f'/attendance/log/edit/{log.id}', data={'timestamp': '2025-03-10 08:30:00', 'event_type': 'IN'})
+    db.session.expire_all()
+    assert db.session.get(AttendanceLog, log.id).timestamp == datetime(2025, 3, 10, 0, 30)
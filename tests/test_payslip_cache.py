@@ -0,0 +1,41 @@
+# tests/test_payslip_cache.py
+
+from datetime import date
+
+from app import db
+from app.employee import routes
+from app.employee.payslip_cache import payslip_page_cache
+from app.models.user import PayrollRun, Payslip
+from app.payroll.work_queue import enqueue_run, run_worker
+
+from conftest import seed_employees
+
+
+def test_payslip_pages_compute_their_cache_key_once_per_request(app, monkeypatch):
+    employee = seed_employees(1)[0]
+    run = PayrollRun(pay_period_start=date(2025, 3, 1), pay_period_end=date(2025, 3, 15),
+                     pay_date=date(2025, 3, 20), status='Processing')
+    db.session.add(run)
+    db.session.flush()
+    enqueue_run(run, 10)
+    db.session.commit()
+    run_worker(lease_seconds=300, run_id=run.id, log=lambda message: None)
+    slip_id = Payslip.query.filter_by(employee_id=employee.id).one().id
+
+    signatures = []
+    run_signature = routes._run_signature
+    monkeypatch.setattr(routes, '_run_signature', lambda rows: signatures.append(rows) or run_signature(rows))
+    payslip_page_cache.clear()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(employee.user_id)
+        session['_fresh'] = True
+
+    for url in ('/employee/my_payslips', f'/employee/my_payslips/{slip_id}'):
+        signatures.clear()
+        miss = client.get(url)
+        assert miss.status_code == 200 and miss.get_etag()[0]
+        assert len(signatures) == 1
+        hit = client.get(url, headers={'If-None-Match': miss.get_etag()[0]})
+        assert hit.status_code == 304
+        assert len(signatures) == 2
@@ -0,0 +1,10 @@
+# tests/test_payslip_memory.py
+
+from app.payroll.benchmark import payslip_write_memory
+
+
+def test_payslip_write_peak_memory_does_not_grow_with_the_workforce(app):
+    # Four times the employees in the same batch size: the peak must stay about the same
+    results, ratio = payslip_write_memory(app, sizes=(200, 800), batch_size=100)
+    assert [result['payslips'] for result in results] == [200, 800]
+    assert ratio < 1.25, results
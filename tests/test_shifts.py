@@ -0,0 +1,78 @@
+# tests/test_shifts.py
+
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from app.attendance.exceptions import scan_punches
+from app.payroll.calculator import Punch, iter_shifts
+from app.refdata import Schedule
+
+DAY_SHIFT = Schedule(time(9), time(18), Decimal('8.00'))
+GRAVEYARD = Schedule(time(22), time(6), Decimal('8.00'))
+NOW = datetime(2025, 4, 1)
+
+
+def punches(*events):
+    return [Punch(datetime.strptime(stamp, '%m-%d %H:%M').replace(year=2025), event_type)
+            for stamp, event_type in events]
+
+
+FORGOTTEN_OUT = punches(
+    ('03-03 09:00', 'IN'), ('03-03 12:00', 'OUT'),
+    ('03-03 13:00', 'IN'),                          # never clocked out
+    ('03-04 08:55', 'IN'), ('03-04 17:00', 'OUT'),
+)
+
+OVERNIGHT = punches(
+    ('03-03 22:00', 'IN'), ('03-04 02:00', 'OUT'),
+    ('03-04 02:30', 'IN'), ('03-04 06:30', 'OUT'),
+    ('03-04 22:10', 'IN'), ('03-05 06:00', 'OUT'),
+)
+
+
+def test_in_for_the_next_day_closes_the_forgotten_shift():
+    shifts = dict(iter_shifts(FORGOTTEN_OUT, DAY_SHIFT))
+    assert list(shifts) == [date(2025, 3, 3), date(2025, 3, 4)]
+
+    first = shifts[date(2025, 3, 3)]
+    assert first['total_hours'] == Decimal('3.00')
+    assert first['overtime_hours'] == Decimal('0.00')
+    assert first['orphan_punches'] == 1
+
+    second = shifts[date(2025, 3, 4)]
+    assert second['is_present']
+    assert second['total_hours'] == Decimal('8.08')
+    assert second['late_minutes'] == 0
+    assert second['orphan_punches'] == 0
+
+
+def test_same_day_in_while_clocked_in_is_a_duplicate():
+    shifts = dict(iter_shifts(punches(
+        ('03-03 09:00', 'IN'), ('03-03 09:05', 'IN'), ('03-03 17:05', 'OUT'),
+    ), DAY_SHIFT))
+    assert list(shifts) == [date(2025, 3, 3)]
+    assert shifts[date(2025, 3, 3)]['total_hours'] == Decimal('8.00')
+    assert shifts[date(2025, 3, 3)]['orphan_punches'] == 1
+
+
+def test_overnight_shifts_are_dated_by_their_start():
+    shifts = dict(iter_shifts(OVERNIGHT, GRAVEYARD))
+    assert list(shifts) == [date(2025, 3, 3), date(2025, 3, 4)]
+    assert shifts[date(2025, 3, 3)]['total_hours'] == Decimal('8.00')
+    assert shifts[date(2025, 3, 3)]['late_minutes'] == 0
+    assert shifts[date(2025, 3, 4)]['total_hours'] == Decimal('7.83')
+    assert shifts[date(2025, 3, 4)]['late_minutes'] == 10
+
+
+def test_exceptions_report_the_forgotten_out_on_its_own_day():
+    exceptions, punched = scan_punches(1, FORGOTTEN_OUT, DAY_SHIFT.start_time, 30, NOW)
+    assert [(e.kind, e.work_date, e.timestamp) for e in exceptions] == [
+        ('missing_out', date(2025, 3, 3), datetime(2025, 3, 3, 13, 0)),
+    ]
+    assert punched == {date(2025, 3, 3), date(2025, 3, 4)}
+
+
+def test_exceptions_accept_overnight_shifts():
+    exceptions, punched = scan_punches(1, OVERNIGHT, GRAVEYARD.start_time, 30, NOW)
+    assert exceptions == []
+    assert punched == {date(2025, 3, 3), date(2025, 3, 4)}
@@ -0,0 +1,17 @@
+# tests/test_staff_directory.py
+
+import re
+
+from conftest import admin_client, seed_employees
+
+
+def test_sort_and_page_links_keep_the_page_size(app):
+    seed_employees(12, days=0)
+    client = admin_client(app)
+    for url in ('/hr/manage_staff?per_page=5&q=first', '/attendance/schedule?per_page=5&q=first'):
+        html = client.get(url).get_data(as_text=True)
+        sort_links = re.findall(r'href="([^"]*sort=[^"]*)"', html)
+        page_links = re.findall(r'href="([^"]*[?&;]page=\d+[^"]*)"', html)
+        assert sort_links and page_links
+        assert all('per_page=5' in link for link in sort_links + page_links)
+        assert 'name="per_page" value="5"' in html
@@ -0,0 +1,112 @@
+# tests/test_work_queue.py
+
+import os
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app import db
+from app.models.user import PayrollRun, PayrollWorkItem, Payslip
+from app.payroll.benchmark import worker_speedup
+from app.payroll.commands import run_worker_processes
+from app.payroll.work_queue import (MAX_ATTEMPTS, enqueue_run, queue_status, release_failed_item,
+                                    requeue_failed_items, run_worker, claim_work_item, finalize_run_if_complete,
+                                    process_work_item)
+
+from conftest import seed_employees
+
+EMPLOYEES = 23
+CHUNK_SIZE = 2
+
+
+def _queued_run():
+    run = PayrollRun(pay_period_start=date(2025, 3, 1), pay_period_end=date(2025, 3, 15),
+                     pay_date=date(2025, 3, 20), status='Processing')
+    db.session.add(run)
+    db.session.flush()
+    enqueue_run(run, CHUNK_SIZE)
+    db.session.commit()
+    return run.id
+
+
+def _net_pay_by_employee(run_id):
+    return dict(db.session.query(Payslip.employee_id, Payslip.net_pay).filter(Payslip.payroll_run_id == run_id))
+
+
+def test_two_processes_claim_every_item_once_and_match_one_process(make_app):
+    single = make_app('single')
+    with single.app_context():
+        seed_employees(EMPLOYEES)
+        run_id = _queued_run()
+        run_worker(lease_seconds=300, run_id=run_id, log=lambda message: None)
+        expected = _net_pay_by_employee(run_id)
+        db.session.remove()
+
+    parallel = make_app('parallel')
+    with parallel.app_context():
+        seed_employees(EMPLOYEES)
+        run_id = _queued_run()
+        results = run_worker_processes(parallel, 2, 300, run_id)
+
+        items = PayrollWorkItem.query.filter_by(payroll_run_id=run_id).all()
+        assert len(items) == (EMPLOYEES + CHUNK_SIZE - 1) // CHUNK_SIZE
+        assert sum(result[0] for result in results) == len(items)
+        assert all(item.status == 'Done' and item.attempts == 1 for item in items)
+        assert sum(item.payslip_count for item in items) == EMPLOYEES
+
+        employee_ids = [row[0] for row in db.session.query(Payslip.employee_id).filter(Payslip.payroll_run_id == run_id)]
+        assert len(employee_ids) == len(set(employee_ids)) == EMPLOYEES
+        assert _net_pay_by_employee(run_id) == expected
+        assert db.session.get(PayrollRun, run_id).status == 'Processed'
+        db.session.remove()
+
+
+def test_failed_items_keep_the_run_open_until_requeued(app):
+    seed_employees(4)
+    run_id = _queued_run()
+    item_id = None
+    for _ in range(MAX_ATTEMPTS):
+        item_id = claim_work_item('worker', 300, run_id)
+        release_failed_item(item_id, 'worker')
+    assert db.session.get(PayrollWorkItem, item_id).status == 'Failed'
+
+    run_worker(lease_seconds=300, run_id=run_id, log=lambda message: None)
+    assert queue_status(run_id) == {'Done': 1, 'Failed': 1}
+    assert not finalize_run_if_complete(run_id)
+
+    assert requeue_failed_items(run_id) == 1
+    db.session.commit()
+    run_worker(lease_seconds=300, run_id=run_id, log=lambda message: None)
+    assert queue_status(run_id) == {'Done': 2}
+    assert db.session.get(PayrollRun, run_id).status == 'Processed'
+
+
+def test_expired_lease_is_reclaimed_without_duplicate_payslips(app):
+    seed_employees(4)
+    run_id = _queued_run()
+    stalled = claim_work_item('stalled-worker', 300, run_id)
+    # The worker holding the item stops responding until its lease runs out
+    db.session.execute(update(PayrollWorkItem).where(PayrollWorkItem.id == stalled)
+                       .values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+    assert queue_status(run_id) == {'Pending': 1, 'Claimed': 1, 'Expired': 1}
+
+    items_done, payslips_written, _ = run_worker(lease_seconds=300, run_id=run_id, log=lambda message: None)
+    assert (items_done, payslips_written) == (2, 4)
+    item = db.session.get(PayrollWorkItem, stalled)
+    assert item.status == 'Done' and item.attempts == 2 and item.lease_owner != 'stalled-worker'
+
+    # The stalled worker wakes up and finishes its copy: the results are discarded
+    assert process_work_item(stalled, 'stalled-worker') is None
+    employee_ids = [row[0] for row in db.session.query(Payslip.employee_id).filter(Payslip.payroll_run_id == run_id)]
+    assert len(employee_ids) == len(set(employee_ids)) == 4
+    assert db.session.get(PayrollRun, run_id).status == 'Processed'
+
+
+@pytest.mark.skipif((os.cpu_count() or 1) < 2, reason='two worker processes need two CPUs to run side by side')
+def test_two_processes_process_a_run_faster_than_one(app):
+    # Enough employees that the payroll calculation, not process start-up, dominates
+    result = worker_speedup(app, employees=2000, processes=2, chunk_size=50)
+    assert result['runs'][1]['payslips'] == result['runs'][2]['payslips'] == 2000
+    assert result['speedup'] > 1.25, result